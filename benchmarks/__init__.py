@@ -0,0 +1 @@
+# Need __init__.py file so benchmarks can be run with python -m.
@@ -0,0 +1,40 @@
+"""Compares SmartDevice.__api__ serialization through the precompiled accessor
+tables against the eval-based lookups they replaced.
+
+Run from the project root with:
+    python -m benchmarks.api_serialization
+"""
+from datetime import datetime
+
+from devices import NestThermostat, PhilipsHueLamp, SmartPlug
+from benchmarks.common import quiet_logger, time_per_call
+
+
+def eval_api(device) -> dict:
+    """The previous implementation of SmartDevice.__api__."""
+    device.set_last_connected(datetime.now().isoformat())
+    dictionary = {}
+    for parameter in device._api_return_parameters:
+        dictionary.update({parameter: eval(f"device.{parameter}")})
+    return dictionary
+
+
+def main(number: int = 10000):
+    logger = quiet_logger()
+    devices = [
+        NestThermostat(logger=logger),
+        PhilipsHueLamp(logger=logger),
+        SmartPlug(logger=logger)
+    ]
+
+    print(f"{'device':<16}{'eval (us)':>12}{'table (us)':>12}"
+          f"{'speedup':>10}")
+    for device in devices:
+        before = time_per_call(lambda: eval_api(device), number)
+        after = time_per_call(device.__api__, number)
+        print(f"{device.device_type:<16}{before:>12.2f}{after:>12.2f}"
+              f"{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Compares the Flask and ASGI servers as the number of concurrent
+clients grows: idle /devices/stream connections, which cost the Flask
+server one thread each, and bursts of concurrent GET polls.
+
+Both servers are driven in-process, so no HTTP server is needed.
+
+Run from the project root with:
+    python -m benchmarks.asgi_concurrency
+"""
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from webservers import HoneywellHome
+from webservers.asgi import AsyncHoneywellHome
+from benchmarks.common import quiet_logger, synthetic_config
+
+_light = "/devices/Light/00000001"
+
+
+def change_light(home: HoneywellHome):
+    """Renames the light watched by the streams, so that it changes."""
+    home.update_device("Light", "00000001", {"name": f"{time.time_ns()}"})
+
+
+def flask_streams(home: HoneywellHome, clients: int) -> tuple:
+    """Opens idle streams on threads and times one change reaching all
+    of them.
+
+    Returns:
+        tuple: Seconds to open the streams, seconds to fan out a change
+        and the peak number of threads.
+    """
+    connected = threading.Semaphore(0)
+    delivered = threading.Semaphore(0)
+
+    def client():
+        response = home.test_client().get(
+            "/devices/stream?device_type=Light", buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        connected.release()
+        next(chunks)
+        delivered.release()
+        response.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True)
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for _ in range(clients):
+        connected.acquire()
+    opened = time.perf_counter() - start
+    peak_threads = threading.active_count()
+
+    start = time.perf_counter()
+    change_light(home)
+    for _ in range(clients):
+        delivered.acquire()
+    fan_out = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    return opened, fan_out, peak_threads
+
+
+def asgi_streams(app: AsyncHoneywellHome, clients: int) -> tuple:
+    """Opens idle streams as coroutines and times one change reaching
+    all of them.
+
+    Returns:
+        tuple: Seconds to open the streams, seconds to fan out a change
+        and the peak number of threads.
+    """
+    async def run():
+        disconnect = asyncio.Event()
+        connected = asyncio.Semaphore(0)
+        delivered = asyncio.Semaphore(0)
+        scope = {"type": "http", "method": "GET", "path": "/devices/stream",
+                 "query_string": b"device_type=Light", "headers": []}
+
+        async def client():
+            chunks = 0
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                nonlocal chunks
+                if message["type"] == "http.response.body":
+                    chunks += 1
+                    (connected if chunks == 1 else delivered).release()
+
+            await app(scope, receive, send)
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(client()) for _ in range(clients)]
+        for _ in range(clients):
+            await connected.acquire()
+        opened = time.perf_counter() - start
+        peak_threads = threading.active_count()
+
+        start = time.perf_counter()
+        change_light(app.home)
+        for _ in range(clients):
+            await delivered.acquire()
+        fan_out = time.perf_counter() - start
+        disconnect.set()
+        await asyncio.gather(*tasks)
+        return opened, fan_out, peak_threads
+
+    return asyncio.run(run())
+
+
+def flask_polls(home: HoneywellHome, clients: int, rounds: int) -> float:
+    """Returns GET requests per second with a thread per client."""
+    client = home.test_client()
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: client.get(_light),
+                      range(clients * rounds)))
+    return clients * rounds / (time.perf_counter() - start)
+
+
+def asgi_polls(app: AsyncHoneywellHome, clients: int, rounds: int) -> float:
+    """Returns GET requests per second with a coroutine per client."""
+    scope = {"type": "http", "method": "GET", "path": _light,
+             "query_string": b"", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def client():
+        for _ in range(rounds):
+            await app(scope, receive, send)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return clients * rounds / (time.perf_counter() - start)
+
+    return asyncio.run(run())
+
+
+def main(clients=(10, 100, 1000), devices: int = 1000, rounds: int = 20):
+    logger = quiet_logger()
+    home = HoneywellHome(logger=logger, stream_keepalive=3600)
+    home.__from_json__(synthetic_config(devices, locations=4))
+    app = AsyncHoneywellHome(home)
+
+    print(f"{'clients':>8}{'server':>8}{'open (ms)':>12}"
+          f"{'fan out (ms)':>14}{'threads':>9}{'GET/s':>10}")
+    for count in clients:
+        for name, streams, polls, server in (
+                ("flask", flask_streams, flask_polls, home),
+                ("asgi", asgi_streams, asgi_polls, app)):
+            opened, fan_out, threads = streams(server, count)
+            rate = polls(server, count, rounds)
+            print(f"{count:>8}{name:>8}{opened * 1e3:>12.1f}"
+                  f"{fan_out * 1e3:>14.1f}{threads:>9}{rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compares constructing devices one at a time with device_factory
+against create_many, for configurations with and without device ids.
+
+Run from the project root with:
+    python -m benchmarks.bulk_create
+"""
+import time
+
+from helpers.factories import create_many, device_factory
+from benchmarks.common import quiet_logger, synthetic_config
+
+
+def _configs(devices: int, with_ids: bool) -> list:
+    configs = synthetic_config(devices)[0]["devices"]
+    if not with_ids:
+        for config in configs:
+            del config["device_id"]
+    return configs
+
+
+def one_at_a_time(configs: list, logger) -> list:
+    devices = []
+    for config in configs:
+        config = dict(config)
+        devices.append(device_factory(config.pop("class"), config, logger))
+    return devices
+
+
+def main(devices: int = 50000):
+    logger = quiet_logger()
+    print(f"{'config':<14}{'factory (s)':>12}{'create_many (s)':>17}")
+    for with_ids in (True, False):
+        configs = _configs(devices, with_ids)
+        began = time.perf_counter()
+        one_at_a_time(configs, logger)
+        single = time.perf_counter() - began
+        began = time.perf_counter()
+        create_many(configs, logger)
+        bulk = time.perf_counter() - began
+        label = "with ids" if with_ids else "without ids"
+        print(f"{label:<14}{single:>12.2f}{bulk:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import logging
+import timeit
+
+from typing import Callable, List
+
+
+def quiet_logger(name: str = "benchmark") -> logging.Logger:
+    """Creates a logger which discards everything below CRITICAL, so
+    that benchmarks measure the code under test rather than log I/O.
+
+    Args:
+        name (str, optional): The name of the logger. Defaults to
+        "benchmark".
+
+    Returns:
+        logging.Logger: The logger.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.CRITICAL)
+    logger.propagate = False
+    return logger
+
+
+def time_per_call(function: Callable, number: int = 10000,
+                  repeat: int = 5) -> float:
+    """Times a callable and reports the best observed time per call.
+
+    Args:
+        function (Callable): The zero-argument callable to time.
+        number (int, optional): Calls per measurement. Defaults to
+        10000.
+        repeat (int, optional): Number of measurements. Defaults to 5.
+
+    Returns:
+        float: The fastest time per call, in microseconds.
+    """
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+_synthetic_devices = [
+    ("NestThermostat", "Thermostat"),
+    ("PhilipsHueLamp", "Light"),
+    ("SmartPlug", "Plug")
+]
+_synthetic_rooms = ["Kitchen", "Office", "Hallway", "Upstairs", "Downstairs"]
+
+
+def synthetic_config(devices: int, locations: int = 1) -> List[dict]:
+    """Builds a HoneywellHome configuration with the requested number of
+    devices spread evenly over the requested number of locations.
+    Device ids are the decimal device number, zero padded to 8 digits.
+
+    Args:
+        devices (int): The total number of devices.
+        locations (int, optional): The number of locations. Defaults
+        to 1.
+
+    Returns:
+        List[dict]: The configuration, as loaded from a JSON file.
+    """
+    config = [{
+        "name": f"Location {n}",
+        "street_address": f"{n} Synthetic Lane",
+        "city": "Norfolk",
+        "state": "VA",
+        "zipcode": "23529",
+        "devices": []
+    } for n in range(locations)]
+
+    for n in range(devices):
+        class_, type_ = _synthetic_devices[n % len(_synthetic_devices)]
+        config[n % locations]["devices"].append({
+            "class": class_,
+            "device_type": type_,
+            "device_id": f"{n:08d}",
+            "name": f"{type_} {n}",
+            "location": _synthetic_rooms[n % len(_synthetic_rooms)]
+        })
+    return config
@@ -0,0 +1,40 @@
+"""Compares a full /devices poll against a /devices?since=<version>
+poll on a mostly idle home, where only a few devices change between
+polls.
+
+Run from the project root with:
+    python -m benchmarks.delta_sync
+"""
+from webservers import HoneywellHome
+from benchmarks.common import quiet_logger, synthetic_config, time_per_call
+
+
+def main(sizes=(100, 1000, 10000), changes: int = 5, number: int = 20):
+    logger = quiet_logger()
+    print(f"{'devices':>8}{'full (us)':>12}{'full (B)':>12}"
+          f"{'delta (us)':>12}{'delta (B)':>12}")
+    for size in sizes:
+        server = HoneywellHome(logger=logger)
+        server.__from_json__(synthetic_config(size, locations=4))
+        client = server.test_client()
+        version = client.get("/devices?since=0").json["version"]
+        # Lights are every third device.
+        for n in range(1, 3 * changes, 3):
+            client.post(f"/devices/Light/{n:08d}", json={"name": f"L{n}"})
+
+        def full():
+            # Bypass the response cache to measure rendering.
+            server._cache.invalidate()
+            return client.get("/devices")
+
+        def delta():
+            return client.get(f"/devices?since={version}")
+
+        full_time = time_per_call(full, number)
+        delta_time = time_per_call(delta, number * 10)
+        print(f"{size:>8}{full_time:>12.1f}{len(full().data):>12}"
+              f"{delta_time:>12.1f}{len(delta().data):>12}")
+
+
+if __name__ == "__main__":
+    main()
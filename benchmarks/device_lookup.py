@@ -0,0 +1,36 @@
+"""Times single device lookups through the HoneywellHome routes as the
+number of devices on the server grows.
+
+Run from the project root with:
+    python -m benchmarks.device_lookup
+"""
+import random
+
+from webservers import HoneywellHome
+from benchmarks.common import quiet_logger, synthetic_config, time_per_call
+
+
+def main(sizes=(10, 100, 1000, 10000, 100000), number: int = 2000):
+    logger = quiet_logger()
+    print(f"{'devices':>8}{'GET id (us)':>14}{'by_device_id (us)':>20}")
+    for size in sizes:
+        server = HoneywellHome(logger=logger)
+        server.__from_json__(synthetic_config(size, locations=4))
+        # Lights are every third device.
+        device_ids = [f"{n:08d}" for n in range(1, size, 3)]
+        client = server.test_client()
+
+        def get():
+            client.get(f"/devices/Light/{random.choice(device_ids)}")
+
+        def lookup():
+            server.by_device_id("Light", random.choice(device_ids))
+
+        with server.test_request_context("/"):
+            direct = time_per_call(lookup, number)
+        routed = time_per_call(get, number // 10)
+        print(f"{size:>8}{routed:>14.1f}{direct:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
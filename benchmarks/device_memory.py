@@ -0,0 +1,96 @@
+"""Reports the memory used per simulated device with the slotted,
+interned layout, and with the previous layout in which every device
+kept an instance __dict__, its own parsed software version, its own
+name and location strings and a per-instance copy of
+_api_return_parameters.
+
+Objects shared between devices (interned strings, the parsed software
+version, the logger) are only counted once for the whole fleet, so the
+figures are the marginal cost of one more device.
+
+Run from the project root with:
+    python -m benchmarks.device_memory
+"""
+import logging
+import sys
+
+from datetime import datetime
+
+from devices import NestThermostat, PhilipsHueLamp, SmartPlug, \
+    Refrigerator, WaterHeater
+from benchmarks.common import quiet_logger
+
+
+class _DictLayout:
+    """Stand-in for a device stored the way it used to be."""
+
+
+def _slot_names(device):
+    for klass in type(device).__mro__:
+        for name in getattr(klass, "__slots__", ()):
+            yield name
+
+
+def _copy_str(value: str) -> str:
+    return (value + ".")[:-1]
+
+
+def legacy_layout(device) -> _DictLayout:
+    """Copies a device's state into a __dict__ based object with the
+    per-device values the old constructors created.
+    """
+    legacy = _DictLayout()
+    for name in _slot_names(device):
+        value = getattr(device, name)
+        if isinstance(value, str):
+            value = _copy_str(value)
+        setattr(legacy, name, value)
+    legacy._software_version = datetime.strptime(
+        device.software_version, "%Y.%m.%d")
+    legacy._api_return_parameters = list(device._api_return_parameters)
+    return legacy
+
+
+def fleet_bytes(objects) -> int:
+    """Sums the size of a group of objects and everything they refer
+    to, counting each shared object once. Loggers and callables are
+    shared infrastructure and are skipped.
+    """
+    seen = set()
+    total = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, logging.Logger) \
+                or callable(obj):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            total += sys.getsizeof(obj.__dict__)
+            stack.extend(obj.__dict__.values())
+        if hasattr(type(obj), "__slots__"):
+            stack.extend(getattr(obj, name) for name in _slot_names(obj)
+                         if hasattr(obj, name))
+    return total
+
+
+def main(count: int = 10000):
+    logger = quiet_logger()
+    print(f"{'device':<16}{'before (B)':>12}{'after (B)':>12}"
+          f"{'saving':>10}")
+    for cls in [NestThermostat, PhilipsHueLamp, SmartPlug, Refrigerator,
+                WaterHeater]:
+        devices = [cls(logger=logger) for _ in range(count)]
+        for device in devices:
+            device.__from_json__({"location": "Kitchen", "name": "device"})
+        before = fleet_bytes(legacy_layout(d) for d in devices) / count
+        after = fleet_bytes(devices) / count
+        print(f"{cls.__name__:<16}{before:>12.0f}{after:>12.0f}"
+              f"{1 - after / before:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
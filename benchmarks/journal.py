@@ -0,0 +1,45 @@
+"""Measures the cost of recording a change in the journal, and what
+journaling adds to a device setter.
+
+Run from the project root with:
+    python -m benchmarks.journal
+"""
+import os
+import tempfile
+
+from devices import PhilipsHueLamp
+from devices.devices import set_change_journal
+from helpers.journal import Journal
+from benchmarks.common import quiet_logger, time_per_call
+
+
+def main(number: int = 20000):
+    journal = Journal()
+    record = time_per_call(
+        lambda: journal.record("00000001", "brightness", 1, 2), number)
+
+    lamp = PhilipsHueLamp(logger=quiet_logger())
+    values = iter(range(10 ** 9))
+
+    def set_brightness():
+        lamp.set_brightness(next(values) % 100)
+
+    plain = time_per_call(set_brightness, number)
+    set_change_journal(journal)
+    journaled = time_per_call(set_brightness, number)
+    set_change_journal(None)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal.bin")
+        spill = time_per_call(lambda: journal.spill(path), 1, repeat=1)
+        size = os.path.getsize(path)
+
+    print(f"record:              {record:.2f} us")
+    print(f"setter, no journal:  {plain:.2f} us")
+    print(f"setter, journaled:   {journaled:.2f} us")
+    print(f"spill {len(journal)} changes: {spill / 1e3:.1f} ms, "
+          f"{size / len(journal):.1f} bytes each")
+
+
+if __name__ == "__main__":
+    main()
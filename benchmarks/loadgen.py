@@ -0,0 +1,319 @@
+"""Load generator for the HoneywellHome API. Drives a weighted mix of
+GET and POST requests from concurrent workers against a server loaded
+with a synthetic configuration, and reports throughput and latency
+percentiles as JSON.
+
+Requests are either sent in-process through test_client(), which
+measures the application alone, or over HTTP, which includes the server
+and network stack. Over HTTP, a threaded local server is started unless
+--url points at a running one, which must hold the same synthetic
+configuration.
+
+Run from the project root, e.g.:
+    python -m benchmarks.loadgen --devices 10000 --workers 8
+    python -m benchmarks.loadgen --http --duration 30 -o after.json \\
+        --baseline before.json
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from webservers import HoneywellHome
+from benchmarks.common import quiet_logger, synthetic_config
+
+_types = ["Thermostat", "Light", "Plug"]
+
+# Operation name mapped to a function building (method, path, body) from
+# a random generator and the number of devices.
+_operations: Dict[str, Callable] = {
+    "get_locations": lambda r, n: ("GET", "/locations", None),
+    "get_devices": lambda r, n: ("GET", "/devices", None),
+    "get_type": lambda r, n: ("GET", f"/devices/{r.choice(_types)}", None),
+    "get_device": lambda r, n: _device_request(r, n, "GET", None),
+    "get_since": lambda r, n: ("GET", "/devices?since=0", None),
+    "post_device": lambda r, n: _device_request(
+        r, n, "POST", {"name": f"load {r.randrange(1000)}"})
+}
+
+DEFAULT_MIX = "get_device=70,get_type=10,get_devices=5,post_device=15"
+
+
+def _device_request(r: random.Random, devices: int, method: str,
+                    body: dict) -> Tuple[str, str, dict]:
+    n = r.randrange(devices)
+    return method, f"/devices/{_types[n % len(_types)]}/{n:08d}", body
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parses a request mix such as "get_device=70,post_device=30".
+
+    Args:
+        mix (str): Comma separated operation=weight pairs.
+
+    Raises:
+        ValueError: If an operation is unknown or a weight is invalid.
+
+    Returns:
+        Dict[str, float]: Operations mapped to their weights.
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in _operations:
+            raise ValueError(f"{name} not in {list(_operations)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """The nearest-rank percentile of sorted values.
+
+    Args:
+        ordered (List[float]): The values, in increasing order.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The value at the percentile, or 0 if there are none.
+    """
+    if not ordered:
+        return 0.0
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize(latencies: List[float]) -> dict:
+    """Summarizes request latencies, given in seconds, in milliseconds.
+    """
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "mean": 1e3 * sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": 1e3 * percentile(ordered, 0.50),
+        "p95": 1e3 * percentile(ordered, 0.95),
+        "p99": 1e3 * percentile(ordered, 0.99),
+        "max": 1e3 * ordered[-1] if ordered else 0.0
+    }
+
+
+class InProcessSender():
+    """Sends requests through a Flask test client."""
+
+    def __init__(self, app: HoneywellHome):
+        self._client = app.test_client()
+
+    def send(self, method: str, path: str, body: dict) -> int:
+        return self._client.open(path, method=method, json=body).status_code
+
+
+class HttpSender():
+    """Sends requests over a persistent HTTP connection."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self._connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=30)
+
+    def send(self, method: str, path: str, body: dict) -> int:
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self._connection.request(method, path, body, headers)
+            response = self._connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            return 0
+        return response.status
+
+
+def run(make_sender: Callable, mix: Dict[str, float], devices: int,
+        workers: int, duration: float, requests: int, seed: int) -> dict:
+    """Runs the load and collects the results.
+
+    Args:
+        make_sender (Callable): Creates a sender for each worker.
+        mix (Dict[str, float]): Operations mapped to their weights.
+        devices (int): The number of devices in the configuration.
+        workers (int): The number of concurrent workers.
+        duration (float): Seconds to run for, if requests is 0.
+        requests (int): Requests per worker, or 0 to run for duration.
+        seed (int): Seed for the request sequence.
+
+    Returns:
+        dict: The throughput, latency percentiles and status counts,
+        overall and per operation.
+    """
+    names, weights = list(mix), list(mix.values())
+    results = [[] for _ in range(workers)]
+    start_line = threading.Barrier(workers + 1)
+    deadline = [0.0]
+
+    def worker(slot: int):
+        r = random.Random(seed + slot)
+        sender = make_sender()
+        samples = results[slot]
+        start_line.wait()
+        sent = 0
+        while (sent < requests) if requests \
+                else (time.perf_counter() < deadline[0]):
+            name = r.choices(names, weights)[0]
+            method, path, body = _operations[name](r, devices)
+            began = time.perf_counter()
+            status = sender.send(method, path, body)
+            samples.append((name, status, time.perf_counter() - began))
+            sent += 1
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True)
+               for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    start_line.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    samples = [sample for worker in results for sample in worker]
+    statuses: Dict[str, int] = {}
+    by_operation: Dict[str, List[float]] = {}
+    for name, status, latency in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        by_operation.setdefault(name, []).append(latency)
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items()
+                      if not status.startswith(("2", "3"))),
+        "duration_s": elapsed,
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize([latency for _, _, latency in samples]),
+        "statuses": statuses,
+        "operations": {name: summarize(latencies)
+                       for name, latencies in sorted(by_operation.items())}
+    }
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    """Relative change of the headline numbers against a previous run.
+
+    Returns:
+        dict: Percentage change of throughput and latency percentiles.
+    """
+    def change(new, old):
+        return round(100.0 * (new - old) / old, 1) if old else None
+
+    delta = {"throughput_rps": change(result["throughput_rps"],
+                                      baseline["throughput_rps"])}
+    for key in ("p50", "p95", "p99"):
+        delta[key] = change(result["latency_ms"][key],
+                            baseline["latency_ms"][key])
+    return delta
+
+
+def start_server(app: HoneywellHome):
+    """Serves an app over HTTP on a free local port, in the background.
+
+    Returns:
+        The werkzeug server; its port is in server.port.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        # Keep connections open between requests, and skip the access
+        # log, which would dominate the measurement.
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, app, threaded=True,
+                         request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Load test the HoneywellHome API.")
+    parser.add_argument("--devices", type=int, default=1000,
+                        help="devices in the synthetic configuration")
+    parser.add_argument("--locations", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="concurrent workers")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds to run for")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="requests per worker, instead of --duration")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="operation=weight pairs, from: "
+                        + ", ".join(_operations))
+    parser.add_argument("--http", action="store_true",
+                        help="send requests over HTTP")
+    parser.add_argument("--url", help="a running server to load over "
+                        "HTTP; one is started locally if omitted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the JSON results "
+                        "to a file instead of standard output")
+    parser.add_argument("--baseline", help="JSON results of a previous "
+                        "run to compare against")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    app, server = None, None
+    if args.url is None:
+        app = HoneywellHome(logger=quiet_logger())
+        app.__from_json__(synthetic_config(args.devices, args.locations))
+    if args.http or args.url is not None:
+        url = args.url
+        if url is None:
+            server = start_server(app)
+            url = f"http://127.0.0.1:{server.port}"
+        mode = "http"
+
+        def make_sender():
+            return HttpSender(url)
+    else:
+        mode = "in-process"
+
+        def make_sender():
+            return InProcessSender(app)
+
+    result = {
+        "config": {"mode": mode, "devices": args.devices,
+                   "locations": args.locations, "workers": args.workers,
+                   "duration": args.duration, "requests": args.requests,
+                   "mix": mix, "seed": args.seed},
+        **run(make_sender, mix, args.devices, args.workers, args.duration,
+              args.requests, args.seed)
+    }
+    if server is not None:
+        server.shutdown()
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["change_pct"] = compare(result, json.load(f))
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measures what a log call costs the calling thread with a synchronous
+FileHandler and with the queued pipeline, writing to a temporary file,
+and how long the pipeline then takes to drain.
+
+Run from the project root with:
+    python -m benchmarks.log_pipeline
+"""
+import logging
+import os
+import tempfile
+import time
+
+from helpers.logpipeline import BatchingRotatingFileHandler, LogPipeline
+from benchmarks.common import time_per_call
+
+_format = ('%(asctime)s - %(filename)s - %(lineno)s - %(levelname)s - '
+           '%(message)s')
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def main(number: int = 5000):
+    with tempfile.TemporaryDirectory() as directory:
+        handler = logging.FileHandler(os.path.join(directory, "sync.log"))
+        handler.setFormatter(logging.Formatter(_format))
+        logger = _logger("benchmark-sync", handler)
+        sync = time_per_call(
+            lambda: logger.debug("set %s %s", "00000001", "name"), number)
+        logger.removeHandler(handler)
+        handler.close()
+
+        handler = BatchingRotatingFileHandler(
+            os.path.join(directory, "queued.log"), maxBytes=1 << 30)
+        handler.setFormatter(logging.Formatter(_format))
+        # Large enough that no record is dropped during the measurement.
+        pipeline = LogPipeline([handler], queue_size=10 * 5 * number)
+        logger = _logger("benchmark-queued", pipeline.handler)
+        queued = time_per_call(
+            lambda: logger.debug("set %s %s", "00000001", "name"), number)
+        began = time.perf_counter()
+        pipeline.flush()
+        drain = time.perf_counter() - began
+        logger.removeHandler(pipeline.handler)
+        pipeline.close()
+
+    print(f"{'handler':<12}{'us/call':>10}")
+    print(f"{'FileHandler':<12}{sync:>10.2f}")
+    print(f"{'pipeline':<12}{queued:>10.2f}")
+    print(f"\nremaining drain: {1e3 * drain:.1f} ms, "
+          f"dropped: {pipeline.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Measures NestThermostat.__api__ throughput with device logging at
+INFO, at DEBUG, and at DEBUG with hot path quiet mode enabled. Records
+are written to os.devnull so that only formatting and dispatch costs
+are measured.
+
+Run from the project root with:
+    python -m benchmarks.logging_overhead
+"""
+import logging
+import os
+
+from devices import NestThermostat
+from helpers.devicelog import set_hot_path_quiet
+from benchmarks.common import time_per_call
+
+
+def main(number: int = 5000):
+    logger = logging.getLogger("benchmark-logging")
+    logger.propagate = False
+    handler = logging.FileHandler(os.devnull)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(filename)s - %(lineno)s - %(levelname)s - '
+        '%(message)s'))
+    logger.addHandler(handler)
+    thermostat = NestThermostat(logger=logger)
+
+    print(f"{'mode':<20}{'us/call':>10}{'calls/s':>12}")
+    for label, level, quiet in [("INFO", logging.INFO, False),
+                                ("DEBUG", logging.DEBUG, False),
+                                ("DEBUG, quiet gets", logging.DEBUG, True)]:
+        logger.setLevel(level)
+        set_hot_path_quiet(quiet)
+        per_call = time_per_call(thermostat.__api__, number)
+        print(f"{label:<20}{per_call:>10.2f}{1e6 / per_call:>12.0f}")
+
+    set_hot_path_quiet(False)
+    logger.removeHandler(handler)
+    handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Measures what recording metrics costs per request, by timing the
+same routes on servers with metrics turned on and off, and the cost of
+the individual recording operations.
+
+Run from the project root with:
+    python -m benchmarks.metrics_overhead
+"""
+from webservers import HoneywellHome
+from webservers.metrics import Metrics, current_route
+from benchmarks.common import quiet_logger, synthetic_config, time_per_call
+
+_routes = ["/devices/Light/00000001", "/devices/Light", "/devices"]
+
+
+def main(devices: int = 1000, number: int = 500):
+    logger = quiet_logger()
+    servers = {}
+    for enabled in (False, True):
+        server = HoneywellHome(logger=logger, metrics=enabled)
+        server.__from_json__(synthetic_config(devices, locations=4))
+        servers[enabled] = server.test_client()
+
+    print(f"{'route':<28}{'off (us)':>10}{'on (us)':>10}{'overhead (us)':>15}")
+    for route in _routes:
+        off = time_per_call(lambda: servers[False].get(route), number)
+        on = time_per_call(lambda: servers[True].get(route), number)
+        print(f"{route:<28}{off:>10.1f}{on:>10.1f}{on - off:>15.1f}")
+
+    metrics = Metrics()
+    current_route.set("/devices/<device_type>/<device_id>")
+    observe = time_per_call(lambda: metrics.observe_request(
+        "/devices/<device_type>/<device_id>", 200, 0.0004, 512))
+
+    def stage():
+        with metrics.timed("lookup"):
+            pass
+
+    print(f"\nobserve_request: {observe:.2f} us, "
+          f"timed stage: {time_per_call(stage):.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measures read and write throughput through the per-location
+reader-writer locks as reader threads are added, with and without a
+thread writing continuously.
+
+Run from the project root with:
+    python -m benchmarks.rw_throughput
+"""
+import threading
+import time
+
+from webservers import HoneywellHome
+from benchmarks.common import quiet_logger, synthetic_config
+
+
+def run(home: HoneywellHome, readers: int, writing: bool,
+        duration: float = 1.0) -> tuple:
+    """Runs reader threads, and optionally a writer, for a while.
+
+    Returns:
+        tuple: Reads per second and writes per second.
+    """
+    stop = threading.Event()
+    counts = [0] * (readers + 1)
+    lights = list(home._index.by_type("Light"))
+
+    def reader(slot):
+        device = lights[slot % len(lights)]
+        while not stop.is_set():
+            home._device_json(device)
+            counts[slot] += 1
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            home.apply_patch(lights[n % len(lights)], {"brightness": n % 2})
+            n += 1
+        counts[readers] = n
+
+    threads = [threading.Thread(target=reader, args=(n,))
+               for n in range(readers)]
+    if writing:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts[:readers]) / duration, counts[readers] / duration
+
+
+def main(readers=(1, 2, 4, 8), devices: int = 1000):
+    home = HoneywellHome(logger=quiet_logger())
+    home.__from_json__(synthetic_config(devices, locations=4))
+    print(f"{'readers':>8}{'reads/s':>12}{'reads/s (w)':>14}"
+          f"{'writes/s (w)':>14}")
+    for count in readers:
+        reads, _ = run(home, count, writing=False)
+        reads_writing, writes = run(home, count, writing=True)
+        print(f"{count:>8}{reads:>12.0f}{reads_writing:>14.0f}"
+              f"{writes:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Times Location.__to_json__ snapshots as the number of devices grows,
+alongside the dir() based __properties__ the cached schema replaced.
+
+Run from the project root with:
+    python -m benchmarks.snapshot
+"""
+import itertools
+import time
+
+from devices import NestThermostat, PhilipsHueLamp, SmartPlug
+from smarthome import Location
+from benchmarks.common import quiet_logger
+
+
+def dir_properties(device) -> dict:
+    """The previous, introspection based, SmartDevice.__properties__."""
+    parameters = [
+        d for d in dir(device) if (d[0] != "_") and (d.count("set") == 0)
+    ]
+    return device.__as_json__(parameters)
+
+
+def build_location(size: int, logger) -> Location:
+    location = Location(logger=logger)
+    classes = itertools.cycle([NestThermostat, PhilipsHueLamp, SmartPlug])
+    for _ in range(size):
+        location.append(next(classes)(logger=logger))
+    return location
+
+
+def main(sizes=(1000, 5000, 10000)):
+    logger = quiet_logger()
+    print(f"{'devices':>8}{'dir (ms)':>12}{'schema (ms)':>14}"
+          f"{'us/device':>12}")
+    for size in sizes:
+        location = build_location(size, logger)
+
+        start = time.perf_counter()
+        for device in location._devices:
+            dir_properties(device)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        location.__to_json__()
+        after = time.perf_counter() - start
+
+        print(f"{size:>8}{before * 1e3:>12.1f}{after * 1e3:>14.1f}"
+              f"{after / size * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Measures HoneywellHome startup from a configuration file without the
+compiled cache, while building it, and from the cache, for growing
+numbers of devices.
+
+Run from the project root with:
+    python -m benchmarks.startup
+"""
+import json
+import os
+import tempfile
+import time
+
+from webservers import HoneywellHome
+from smarthome.configcache import cache_path
+from benchmarks.common import quiet_logger, synthetic_config
+
+
+def _start(path: str, logger, config_cache: bool) -> float:
+    began = time.perf_counter()
+    HoneywellHome(path, logger=logger, config_cache=config_cache)
+    return time.perf_counter() - began
+
+
+def main(sizes=(1000, 10000, 100000), locations: int = 10):
+    logger = quiet_logger()
+    print(f"{'devices':>8}{'json (s)':>10}{'build (s)':>11}"
+          f"{'cached (s)':>12}{'cache (MiB)':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for devices in sizes:
+            path = os.path.join(directory, f"config-{devices}.json")
+            with open(path, "w") as f:
+                json.dump(synthetic_config(devices, locations), f, indent=4)
+            plain = _start(path, logger, config_cache=False)
+            build = _start(path, logger, config_cache=True)
+            cached = _start(path, logger, config_cache=True)
+            size = os.path.getsize(cache_path(path)) / 2 ** 20
+            print(f"{devices:>8}{plain:>10.2f}{build:>11.2f}"
+                  f"{cached:>12.2f}{size:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
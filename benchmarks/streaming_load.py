@@ -0,0 +1,63 @@
+"""Compares loading a large configuration file whole with
+json_from_file against streaming it with iter_locations: total time,
+time until the first location can be served, and peak memory, as seen
+by tracemalloc, spent on parsing. Built devices are released as they
+are loaded so that only the loading itself is measured.
+
+Run from the project root with:
+    python -m benchmarks.streaming_load
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from helpers.misc import json_from_file
+from smarthome import Location
+from smarthome.loader import iter_locations
+from benchmarks.common import quiet_logger, synthetic_config
+
+
+def whole(path: str, logger) -> tuple:
+    began = time.perf_counter()
+    first = None
+    for config in json_from_file(path):
+        location = Location(logger=logger)
+        location.__from_json__(config)
+        if first is None:
+            first = time.perf_counter() - began
+    return time.perf_counter() - began, first
+
+
+def streamed(path: str, logger) -> tuple:
+    began = time.perf_counter()
+    first = None
+    for location in iter_locations(path, logger):
+        if first is None:
+            first = time.perf_counter() - began
+    return time.perf_counter() - began, first
+
+
+def main(devices: int = 50000, locations: int = 20):
+    logger = quiet_logger()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.json")
+        with open(path, "w") as f:
+            json.dump(synthetic_config(devices, locations), f, indent=4)
+        size = os.path.getsize(path)
+        print(f"{devices} devices in {locations} locations, "
+              f"{size / 2 ** 20:.1f} MiB\n")
+        print(f"{'loader':<10}{'total (s)':>11}{'first (s)':>11}"
+              f"{'peak (MiB)':>12}")
+        for label, load in (("whole", whole), ("streamed", streamed)):
+            tracemalloc.start()
+            total, first = load(path, logger)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:<10}{total:>11.2f}{first:>11.2f}"
+                  f"{peak / 2 ** 20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
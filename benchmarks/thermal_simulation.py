@@ -0,0 +1,69 @@
+"""Measures how fast ThermalSimulation advances a fleet of thermostats
+at one-minute resolution, the cost of reading them in and writing the
+results back through the device API, and the cost of serializing a
+thermostat with and without the HVAC state of a simulation tick.
+
+Run from the project root with:
+    python -m benchmarks.thermal_simulation
+"""
+import random
+import time
+
+from devices import NestThermostat
+from simulation import ThermalSimulation
+from benchmarks.common import quiet_logger, time_per_call
+
+_modes = ["heat", "cool", "heat-cool", "eco", "off"]
+
+
+def fleet(count: int) -> list:
+    logger = quiet_logger()
+    r = random.Random(0)
+    thermostats = []
+    for _ in range(count):
+        thermostat = NestThermostat(logger=logger)
+        thermostat.set_hvac_mode(r.choice(_modes))
+        thermostat.set_target_temperature_low(r.uniform(290, 294))
+        thermostat.set_target_temperature_high(r.uniform(294, 298))
+        thermostat.set_eco_temperature_low(285)
+        thermostat.set_eco_temperature_high(303)
+        thermostat.set_ambient_temperature(r.uniform(280, 300))
+        thermostats.append(thermostat)
+    return thermostats
+
+
+def main(count: int = 100000, minutes: int = 1440):
+    thermostats = fleet(count)
+    sample = thermostats[:1000]
+
+    def serialize():
+        for thermostat in sample:
+            thermostat.__as_json__(thermostat._api_return_parameters)
+
+    estimated = time_per_call(serialize, number=10) / len(sample)
+
+    began = time.perf_counter()
+    simulation = ThermalSimulation(thermostats, outdoor_spread=3.0, seed=0)
+    load = time.perf_counter() - began
+
+    began = time.perf_counter()
+    simulation.step(1.0, minutes)
+    run = time.perf_counter() - began
+
+    began = time.perf_counter()
+    written = simulation.store()
+    store = time.perf_counter() - began
+
+    ticked = time_per_call(serialize, number=10) / len(sample)
+
+    print(f"{count} thermostats, {minutes} one-minute steps")
+    print(f"load:  {load:.2f} s")
+    print(f"steps: {run:.2f} s, {1e3 * run / minutes:.2f} ms per step, "
+          f"{minutes * 60 / run:.0f}x real time")
+    print(f"store: {store:.2f} s for {written} thermostats")
+    print(f"serialize: {estimated:.2f} us estimated, "
+          f"{ticked:.2f} us after a tick")
+
+
+if __name__ == "__main__":
+    main()
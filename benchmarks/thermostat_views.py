@@ -0,0 +1,44 @@
+"""Measures reading NestThermostat temperatures and serializing a
+thermostat for the API in each temperature scale, and the cost of
+changing the scale, which recomputes every temperature view.
+
+Run from the project root with:
+    python -m benchmarks.thermostat_views
+"""
+from devices import NestThermostat
+from benchmarks.common import quiet_logger, time_per_call
+
+
+def main(number: int = 20000):
+    thermostat = NestThermostat(logger=quiet_logger())
+    thermostat.set_hvac_mode("heat-cool")
+    thermostat.set_target_temperature_low(292.15)
+    thermostat.set_target_temperature_high(296.15)
+    thermostat.set_ambient_temperature(290.15)
+
+    def read():
+        return (thermostat.ambient_temperature,
+                thermostat.target_temperature,
+                thermostat.target_temperature_high,
+                thermostat.target_temperature_low,
+                thermostat.eco_temperature_high,
+                thermostat.eco_temperature_low,
+                thermostat.locked_temp_max,
+                thermostat.locked_temp_min)
+
+    def serialize():
+        return thermostat.__as_json__(thermostat._api_return_parameters)
+
+    print(f"{'scale':<8}{'8 reads (us)':>14}{'serialize (us)':>16}"
+          f"{'set scale (us)':>16}")
+    for scale in NestThermostat._temperature_scales:
+        thermostat.set_temperature_scale(scale)
+        reads = time_per_call(read, number)
+        serialized = time_per_call(serialize, number)
+        rescale = time_per_call(
+            lambda: thermostat.set_temperature_scale(scale), number)
+        print(f"{scale:<8}{reads:>14.2f}{serialized:>16.2f}{rescale:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measures the timer scheduler: reading fan_timer_active against the
+previous parse-and-compare on every read, the cost of scheduling,
+rescheduling and cancelling with many timers pending, and the cost of
+run_due as the number of expiring timers grows.
+
+Run from the project root with:
+    python -m benchmarks.timers
+"""
+import random
+import time
+
+from datetime import datetime
+
+from devices import NestThermostat
+from helpers.timers import TimerScheduler
+from benchmarks.common import quiet_logger, time_per_call
+
+
+def legacy_fan_timer_active(thermostat: NestThermostat) -> bool:
+    """The previous implementation of fan_timer_active."""
+    return datetime.fromisoformat(thermostat.fan_timer_timeout) \
+        > datetime.now()
+
+
+def main(pending: int = 100000, number: int = 100000):
+    thermostat = NestThermostat(logger=quiet_logger())
+    legacy = time_per_call(
+        lambda: legacy_fan_timer_active(thermostat), number)
+    flag = time_per_call(lambda: thermostat.fan_timer_active, number)
+    print(f"{'fan_timer_active':<28}{'us/read':>10}")
+    print(f"{'parse and compare':<28}{legacy:>10.3f}")
+    print(f"{'scheduled flag':<28}{flag:>10.3f}")
+
+    r = random.Random(0)
+    scheduler = TimerScheduler(clock=lambda: 0.0)
+    for key in range(pending):
+        scheduler.schedule(key, r.uniform(1, 1e6), _nothing)
+    keys = iter(range(pending, 10 * pending))
+    print(f"\n{f'with {pending} pending':<28}{'us/call':>10}")
+    operations = [
+        ("schedule", lambda: scheduler.schedule(
+            next(keys), r.uniform(1, 1e6), _nothing)),
+        ("reschedule", lambda: scheduler.schedule(
+            r.randrange(pending), r.uniform(1, 1e6), _nothing)),
+        ("cancel and schedule", lambda: (
+            scheduler.cancel(r.randrange(pending)),
+            scheduler.schedule(r.randrange(pending), r.uniform(1, 1e6),
+                               _nothing))),
+        ("run_due, none due", lambda: scheduler.run_due(now=0.0))
+    ]
+    for label, operation in operations:
+        print(f"{label:<28}{time_per_call(operation, number):>10.3f}")
+
+    print(f"\n{'expiring':>10}{'run_due (ms)':>14}{'us/timer':>10}")
+    for expiring in [10, 1000, 100000]:
+        scheduler = TimerScheduler(clock=lambda: 0.0)
+        for key in range(pending):
+            scheduler.schedule(key, 2.0 + key, _nothing)
+        for key in range(expiring):
+            scheduler.schedule(("due", key), 1.0, _nothing)
+        began = time.perf_counter()
+        scheduler.run_due(now=1.0)
+        elapsed = time.perf_counter() - began
+        print(f"{expiring:>10}{1e3 * elapsed:>14.2f}"
+              f"{1e6 * elapsed / expiring:>10.3f}")
+
+
+def _nothing():
+    pass
+
+
+if __name__ == "__main__":
+    main()
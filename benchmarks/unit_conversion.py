@@ -0,0 +1,51 @@
+"""Measures temperature conversion for single values, where the chained
+Kelvin to Celsius to Fahrenheit calls the thermostat getters used to
+make are compared with kelvin_to_fahrenheit and convert, and for a
+million readings, where a Python loop over the chain is compared with
+convert on a NumPy array.
+
+Run from the project root with:
+    python -m benchmarks.unit_conversion
+"""
+import numpy as np
+
+from devices import NestThermostat
+from helpers.unitconverters import celsius_to_fahrenheit, convert, \
+    kelvin_to_celsius, kelvin_to_fahrenheit
+from benchmarks.common import quiet_logger, time_per_call
+
+
+def main(number: int = 200000, readings: int = 1000000):
+    value = 295.15
+    thermostat = NestThermostat(logger=quiet_logger())
+    thermostat.set_ambient_temperature(value)
+    scalar = [
+        ("chained", lambda: celsius_to_fahrenheit(kelvin_to_celsius(value))),
+        ("kelvin_to_fahrenheit", lambda: kelvin_to_fahrenheit(value)),
+        ("convert", lambda: convert(value, "K", "F")),
+        ("ambient_temperature_f",
+         lambda: thermostat.ambient_temperature_f)
+    ]
+    print(f"{'single value':<24}{'us/call':>10}")
+    for label, function in scalar:
+        print(f"{label:<24}{time_per_call(function, number):>10.3f}")
+
+    values = np.random.default_rng(0).uniform(250, 320, readings)
+    as_list = values.tolist()
+    out = np.empty_like(values)
+    batch = [
+        ("chained loop", lambda: [celsius_to_fahrenheit(kelvin_to_celsius(v))
+                                  for v in as_list]),
+        ("convert", lambda: convert(values, "K", "F")),
+        ("convert, out", lambda: convert(values, "K", "F", out=out)),
+        ("convert from list", lambda: convert(as_list, "K", "F"))
+    ]
+    print(f"\n{f'{readings} readings':<24}{'ms/call':>10}{'ns/value':>10}")
+    for label, function in batch:
+        per_call = time_per_call(function, number=3, repeat=3)
+        print(f"{label:<24}{per_call / 1e3:>10.2f}"
+              f"{1e3 * per_call / readings:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import urllib.request
+
+
+# Prints device changes as they happen, instead of polling once per
+# second as urltest.py does.
+response = urllib.request.urlopen(
+    "http://127.0.0.1:5000/devices/stream")
+
+for line in response:
+    line = line.decode().rstrip()
+    if line.startswith("event:") or line.startswith("data:"):
+        print(line)
@@ -6,20 +6,20 @@ from devices.devices import SmartDevice
 
 class Refrigerator(SmartDevice):
 
+    __slots__ = ()
     _api_return_parameters = [
         "target_fridge_temperature",
         "current_fridge_temperature",
         "current_freezer_temperature",
         "target_freezer_temperature",
         "energy_use"
-    ]
+    ] + SmartDevice._api_return_parameters
     _device_type = "Refrigerator"
+    _cache_ttl = 1.0
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, device_id=None):
         self._logger = logger
-        super().__init__()
-        self._api_return_parameters = self._api_return_parameters \
-            + super()._api_return_parameters
+        super().__init__(device_id=device_id)
 
     @ property
     def current_fridge_temperature(self):
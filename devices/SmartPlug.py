@@ -7,7 +7,8 @@ from devices.devices import SmartDevice
 
 class SmartPlug(SmartDevice):
 
-    _api_return_parameters = [
+    __slots__ = ("_is_on", "_last_on_time", "_last_off_time", "_power_range")
+    _api_return_parameters = SmartDevice._api_return_parameters + [
         "power_draw",
         "is_on",
         "last_on_time",
@@ -23,15 +24,15 @@ class SmartPlug(SmartDevice):
     ]
 
     _device_type = "Plug"
+    _cache_ttl = 1.0
 
-    def __init__(self, logger: logging.Logger = logging.getLogger("dummy")):
-        super().__init__(logger=logger)
+    def __init__(self, logger: logging.Logger = logging.getLogger("dummy"),
+                 device_id: str = None):
+        super().__init__(device_id=device_id, logger=logger)
         self._pick_power_range()
         self.set_is_on()
         self.set_last_on_time(datetime.datetime.now())
         self.set_last_off_time(datetime.datetime.now())
-        self._api_return_parameters = super()._api_return_parameters + \
-            self._api_return_parameters
 
     @ property
     def is_on(self):
@@ -57,10 +58,11 @@ class SmartPlug(SmartDevice):
 
     @ property
     def power_draw(self):
-        return self._power_range()
+        return self._power_draw_ranges[self._power_range]()
 
     def _pick_power_range(self):
-        self._power_range = random.choice(self._power_draw_ranges)
+        # Stored as an index so that the device state stays plain data.
+        self._power_range = random.randrange(len(self._power_draw_ranges))
 
 
 if __name__ == "__main__":
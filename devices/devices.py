@@ -1,16 +1,166 @@
+import functools
 import logging
-import time
+import sys
+import weakref
 
 from datetime import datetime
-from typing import List, Union
+from typing import Any, Callable, Dict, List, Tuple, Union
 
-from helpers.misc import create_logger, log_message_formatter
+from helpers.accessors import AccessorRegistry
+from helpers.journal import Journal
+from helpers.devicelog import log_get, log_set
+from helpers.ids import new_id
+from helpers.misc import create_logger
+from helpers.timers import get_scheduler
+from helpers.versions import next_version
 
 SOFTWARE_VERSION = "2021.07.28"
 SOFTWARE_VERSION_FORMAT = "%Y.%m.%d"
 
+# Parsed software versions, shared by every device on the same version.
+_software_versions = {}
 
-class SmartDevice:
+# The journal every device records its changes to, if any.
+_journal = None
+
+# Device classes by class name, filled in as subclasses are defined.
+_device_classes: Dict[str, type] = {}
+
+# Slots which belong to the running process rather than the device state.
+_transient_slots = ("_observers", "_version", "__weakref__")
+
+
+def _intern(value):
+    """Interns string values so devices sharing a name, location or
+    type share a single string object.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def schedule_device_timer(device: Any, timer: str, deadline: datetime,
+                          expire: Callable[[Any], None]):
+    """Schedules a device timer on the process-wide scheduler, replacing
+    any earlier one of the same name. The scheduler only holds the
+    device weakly, so pending timers do not keep devices alive.
+
+    Args:
+        device (Any): The device.
+        timer (str): The name of the timer, unique to the device.
+        deadline (datetime): When the timer expires, in local time.
+        expire (Callable[[Any], None]): Called with the device when the
+        timer expires.
+    """
+    reference = weakref.ref(device)
+
+    def expired():
+        target = reference()
+        if target is not None:
+            expire(target)
+
+    get_scheduler().schedule((id(device), timer), deadline.timestamp(),
+                             expired)
+
+
+def cancel_device_timer(device: Any, timer: str) -> bool:
+    """Cancels a device timer scheduled with schedule_device_timer.
+
+    Args:
+        device (Any): The device.
+        timer (str): The name of the timer.
+
+    Returns:
+        bool: Whether the timer was pending.
+    """
+    return get_scheduler().cancel((id(device), timer))
+
+
+def device_class(name: str) -> type:
+    """Looks up a device class by name, as given under "class" in
+    configuration files.
+
+    Args:
+        name (str): The name of the class.
+
+    Raises:
+        ValueError: If no device class has the name.
+
+    Returns:
+        type: The device class.
+    """
+    cls = _device_classes.get(name)
+    if cls is None:
+        raise ValueError(f"{name} not in {list(_device_classes)}")
+    return cls
+
+
+def device_classes() -> Dict[str, type]:
+    """Getter for every defined device class.
+
+    Returns:
+        Dict[str, type]: Class names mapped to the device classes.
+    """
+    return dict(_device_classes)
+
+
+def set_change_journal(journal: Union[Journal, None]):
+    """Records the property changes of every device to a journal.
+
+    Args:
+        journal (Union[Journal, None]): The journal, or None to stop
+        recording.
+    """
+    global _journal
+    _journal = journal
+
+
+def _observed_setter(setter: Callable, property_: str) -> Callable:
+    """Wraps a set_<property> method so that the device's version is
+    bumped, and its observers are told and the change journal records
+    when the property changes. Devices without observers only pay for
+    the version bump while no journal is set.
+
+    Args:
+        setter (Callable): The setter to wrap.
+        property_ (str): The name of the property the setter changes.
+
+    Returns:
+        Callable: The wrapped setter.
+    """
+    @functools.wraps(setter)
+    def observed(self, *args, **kwargs):
+        self._version = next_version()
+        observers = self._observers
+        journal = _journal
+        if journal is not None and property_ in journal.ignored:
+            journal = None
+        if not observers and journal is None:
+            return setter(self, *args, **kwargs)
+        getter = self._getters.get(property_)
+        if getter is None:
+            result = setter(self, *args, **kwargs)
+            for observer in observers:
+                observer(self, property_, None, None)
+            return result
+        try:
+            old = getter(self)
+        except AttributeError:
+            # Not set yet, as while the device is being constructed,
+            # which is not journaled.
+            old, journal = None, None
+        result = setter(self, *args, **kwargs)
+        new = getter(self)
+        if old != new:
+            if journal is not None:
+                journal.record(self._device_id, property_, old, new)
+            for observer in observers:
+                observer(self, property_, old, new)
+        return result
+
+    observed._observed = True
+    return observed
+
+
+class SmartDevice(AccessorRegistry):
     """The class from which all smart device simulator objects
     will inherit. Parameters common to all smart devices are to be
     defined here.
@@ -19,7 +169,40 @@ class SmartDevice:
     name (str): The user-defined name of the device.
     logger (logging.Logger): The logger to user for logging internal
     events.
+
+    Instances use __slots__ rather than a per-instance __dict__, and
+    shared values such as names, locations and software versions are
+    interned, so that large simulated fleets stay compact. Subclasses
+    should declare __slots__ for any new instance attributes.
+
+    Every set_<property> method is wrapped when the class is defined so
+    that _version is bumped and callbacks registered with add_observer
+    are notified of changes. Subclasses are registered by class name
+    when defined, see device_class.
+
+    Devices pickle as the values of their _state_slots, leaving out
+    observers and the version, so the converted state can be stored
+    and restored without running the setters again.
+
+    A status of "timer" set through set_timer_timeout turns back to
+    "off" when the timer expires, see helpers.timers.
     """
+    __slots__ = (
+        "_observers",
+        "_version",
+        "_logger",
+        "_device_id",
+        "_type",
+        "_is_online",
+        "_name",
+        "_location",
+        "_software_version",
+        "_status",
+        "_timer_timeout",
+        "_last_connected",
+        "__weakref__"
+    )
+
     _device_type: str = "none"
     _api_return_parameters: List = [
         "device_type",
@@ -33,28 +216,71 @@ class SmartDevice:
     _software_version_string = "2021.07.28"
 
     _statuses: List[str] = ["on", "off", "timer"]
+    # Seconds for which a cached API response stays valid. None means
+    # responses are only invalidated by changes. Devices whose getters
+    # return a new reading on every call should set a time limit.
+    _cache_ttl: Union[float, None] = None
+    # Properties which other properties are given in terms of, e.g. a
+    # temperature scale, so are set first when loading from JSON.
+    _leading_properties: Tuple[str, ...] = ()
 
     def __init__(self, name: str = "unnamed", location: str = "none",
                  device_id: Union[str, None] = None,
                  logger: logging.Logger = logging.getLogger("dummy")):
+        self._observers = ()
+        self._type = self._device_type
         self.set_logger(logger)
         self.set_device_id(device_id)
         self.set_is_online(True)
         self.set_name(name)
         self.set_location(location)
         self.set_software_version(self._software_version_string)
+        self._timer_timeout = None
         self.set_status("off")
         self.set_last_connected(datetime.now().isoformat())
 
-        self._logger.debug(
-            f"create {self} name -- "
-            + f"{self.name}, software_version -- "
-            + f"{self.software_version}, "
-            + f"location -- {self.location}."
-        )
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                f"create {self} name -- "
+                + f"{self.name}, software_version -- "
+                + f"{self.software_version}, "
+                + f"location -- {self.location}."
+            )
+
+    @classmethod
+    def _register_accessors(cls):
+        """Wraps the setters defined on the class so that observers are
+        notified, builds the accessor tables and registers the class.
+        """
+        for name, attribute in list(vars(cls).items()):
+            if name.startswith("set_") and callable(attribute) \
+                    and not getattr(attribute, "_observed", False):
+                setattr(cls, name, _observed_setter(attribute, name[4:]))
+        super()._register_accessors()
+        cls._state_slots = tuple(
+            slot for klass in reversed(cls.__mro__)
+            for slot in vars(klass).get("__slots__", ())
+            if slot not in _transient_slots)
+        _device_classes[cls.__name__] = cls
+
+    def __getstate__(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self._state_slots
+                if hasattr(self, slot)}
+
+    def __setstate__(self, state: dict):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._observers = ()
+        self._version = next_version()
+        # Timers belong to the process, so restart the pending one.
+        if self._timer_timeout is not None:
+            self.set_timer_timeout(self._timer_timeout.isoformat())
 
     def __getitem__(self, key: str):
-        return eval(f"self.{key}") if key in dir(self) else None
+        getter = self._getters.get(key)
+        if getter is not None:
+            return getter(self)
+        return getattr(self, key, None)
 
     def __api__(self) -> dict:
         """Representation of the object state as a dictionary.
@@ -74,10 +300,12 @@ class SmartDevice:
             parameters (List): A list of the property names to return.
         """
 
+        getters = self._getters
         dictionary = {}
-        # Comprehensions doesn't work as expected with eval and self
         for parameter in parameters:
-            dictionary.update({parameter: eval(f"self.{parameter}")})
+            getter = getters.get(parameter)
+            dictionary[parameter] = getter(self) if getter is not None \
+                else getattr(self, parameter)
 
         return dictionary
 
@@ -88,13 +316,18 @@ class SmartDevice:
         Args:
             dictionary (dict): The state to set the device to.
         """
-        for key in dictionary.keys():
-            parameter = f"set_{key}"
-            if parameter in dir(self):
-                eval(f"self.{parameter}(dictionary['{key}'])")
+        setters = self._setters
+        items = dictionary.items()
+        leading = self._leading_properties
+        if leading:
+            items = sorted(items, key=lambda item: item[0] not in leading)
+        for key, value in items:
+            setter = setters.get(key)
+            if setter is not None:
+                setter(self, value)
             else:
                 self._logger.warning(
-                    f"abort set -- '{parameter}' not in {self.device_type}")
+                    f"abort set -- 'set_{key}' not in {self.device_type}")
 
     def __properties__(self):
         """Getter for settable parameters. Intended to be used to log
@@ -104,15 +337,28 @@ class SmartDevice:
         Returns:
             dict: The internal state of the device.
         """
-        # FIXME: Make this method more extensible. Maybe regexp?
-        parameters = [
-            d for d in dir(self) if (d[0] != "_") and (d.count("set") == 0)
-        ]
+        return self.__as_json__(self._persistable)
+
+    def add_observer(self, observer: Callable[[Any, str, Any, Any], None]):
+        """Registers a callback to be notified when a property of the
+        device changes. The callback is called as
+        observer(device, property_, old_value, new_value).
+
+        Args:
+            observer (Callable): The callback to register.
+        """
+        self._observers = self._observers + (observer,)
 
-        return self.__as_json__(parameters)
+    def remove_observer(self, observer: Callable[[Any, str, Any, Any], None]):
+        """Unregisters a callback added with add_observer.
+
+        Args:
+            observer (Callable): The callback to remove.
+        """
+        self._observers = tuple(o for o in self._observers if o != observer)
 
     def __repr__(self):
-        return f"[device_id: {self.device_id}]"
+        return f"[device_id: {self._device_id}]"
 
     @ property
     def device_id(self) -> str:
@@ -121,7 +367,7 @@ class SmartDevice:
         Returns:
         str: The unique identifier of the device.
         """
-        self._logger.debug("get device_id.")
+        log_get(self._logger, self, "device_id")
         return self._device_id
 
     def set_device_id(self, id_: Union[str, None] = None):
@@ -132,7 +378,7 @@ class SmartDevice:
             device_id (Union[str, None], optional): The value to set
             device_id to. Defaults to None.
         """
-        self._device_id = f"{hash(time.time()):016X}" if id_ is None else id_
+        self._device_id = new_id() if id_ is None else id_
 
     @ property
     def device_type(self) -> str:
@@ -141,7 +387,7 @@ class SmartDevice:
         Returns:
         str: the type of the device.
         """
-        return self._device_type
+        return self._type
 
     def set_device_type(self, type_: str = "none"):
         """Setter for device type.
@@ -149,8 +395,8 @@ class SmartDevice:
         Parameters:
         type (str): The type of the device.
         """
-        self._logger.info(f"{self} is now a {type_}.")
-        self._device_type = type_
+        log_set(self._logger, self, "device_type", type_)
+        self._type = _intern(type_)
 
     @ property
     def is_online(self) -> bool:
@@ -163,8 +409,7 @@ class SmartDevice:
 
     def set_is_online(self, online: bool = True):
         self._is_online = online
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "is_online", online))
+        log_set(self._logger, self, "is_online", online)
 
     @ property
     def last_connected(self) -> str:
@@ -174,8 +419,7 @@ class SmartDevice:
             str: The timestamp of last connection, as iso formmated
             string.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "last_connected"))
+        log_get(self._logger, self, "last_connected")
         return self._last_connected.isoformat()
 
     def set_last_connected(self, date_: str):
@@ -186,8 +430,7 @@ class SmartDevice:
             connected.
         """
         self._last_connected = datetime.fromisoformat(date_)
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "last_connected", date_))
+        log_set(self._logger, self, "last_connected", date_)
 
     @ property
     def location(self) -> str:
@@ -196,7 +439,7 @@ class SmartDevice:
         Returns:
         (str): The location of the device.
         """
-        self._logger.debug(log_message_formatter("get", f"{self}", "location"))
+        log_get(self._logger, self, "location")
         return self._location
 
     def set_location(self, location: str = "none"):
@@ -205,9 +448,8 @@ class SmartDevice:
         Parameters:
         value(str): The value to set location to.
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "location", location))
-        self._location = location
+        log_set(self._logger, self, "location", location)
+        self._location = _intern(location)
 
     def set_logger(self, logger: logging.Logger = None):
         if logger is None:
@@ -223,9 +465,8 @@ class SmartDevice:
         Returns:
         str: The long form name of the smart device.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "name_long"))
-        return f"{self._name} {self._device_type} ({self._location})"
+        log_get(self._logger, self, "name_long")
+        return f"{self._name} {self._type} ({self._location})"
 
     @ property
     def name(self) -> str:
@@ -235,8 +476,7 @@ class SmartDevice:
         str: The device name.
         """
 
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "name"))
+        log_get(self._logger, self, "name")
         return self._name
 
     def set_name(self, name: str = ""):
@@ -245,9 +485,8 @@ class SmartDevice:
         Parameters:
         value (str): The value to set name to.
         """
-        self._name = name
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "name", name))
+        self._name = _intern(name)
+        log_set(self._logger, self, "name", name)
 
     @ property
     def software_version(self) -> str:
@@ -257,8 +496,7 @@ class SmartDevice:
         str: The software version.
         """
 
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "software_version"))
+        log_get(self._logger, self, "software_version")
         return datetime.strftime(self._software_version, "%Y.%m.%d")
 
     def set_software_version(self, version_number: str):
@@ -268,10 +506,14 @@ class SmartDevice:
             version_number (str): The version number. Expected format is
             strptime format %Y.%m.%d.
         """
-        self._software_version = datetime.strptime(
-            version_number, self._software_version_format)
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "software_version", version_number))
+        key = (version_number, self._software_version_format)
+        version = _software_versions.get(key)
+        if version is None:
+            version = datetime.strptime(
+                version_number, self._software_version_format)
+            _software_versions[key] = version
+        self._software_version = version
+        log_set(self._logger, self, "software_version", version_number)
 
     @ property
     def status(self) -> str:
@@ -281,7 +523,7 @@ class SmartDevice:
         str: The current status of the device.
         """
 
-        self._logger.debug(log_message_formatter("get", f"{self}", "status"))
+        log_get(self._logger, self, "status")
         return self._status
 
     def set_status(self, status: str = "off"):
@@ -293,8 +535,52 @@ class SmartDevice:
         """
         if status in self._statuses:
             self._status = status
-            self._logger.info(log_message_formatter(
-                "set", f"{self}", "status", self._status))
+            log_set(self._logger, self, "status", self._status)
+            if status != "timer" and self._timer_timeout is not None:
+                self._timer_timeout = None
+                cancel_device_timer(self, "timer")
         else:
             self._logger.warning(
                 f"abort set {self} status -- not in {self._statuses}.")
+
+    @property
+    def timer_timeout(self) -> Union[str, None]:
+        """The time at which the device's timer expires and its status
+        turns from "timer" to "off".
+
+        Returns:
+            Union[str, None]: The time, in isoformat, or None if no
+            timer is running.
+        """
+        log_get(self._logger, self, "timer_timeout")
+        timeout = self._timer_timeout
+        return None if timeout is None else timeout.isoformat()
+
+    def set_timer_timeout(self, time_: Union[str, None] = None):
+        """Setter for the timer timeout. A time in the future sets the
+        status to "timer" until then, and one in the past ends the timer
+        at once.
+
+        Args:
+            time_ (Union[str, None], optional): The time to expire at,
+            in isoformat. None cancels the timer without changing the
+            status. Defaults to None.
+        """
+        timeout = None if time_ is None else datetime.fromisoformat(time_)
+        if timeout is not None and timeout > datetime.now():
+            self._timer_timeout = timeout
+            schedule_device_timer(self, "timer", timeout,
+                                  SmartDevice._expire_timer)
+            self.set_status("timer")
+        else:
+            self._timer_timeout = None
+            cancel_device_timer(self, "timer")
+            if timeout is not None and self._status == "timer":
+                self.set_status("off")
+        log_set(self._logger, self, "timer_timeout", time_)
+
+    def _expire_timer(self):
+        """Ends the device timer, turning the device off."""
+        self._timer_timeout = None
+        if self._status == "timer":
+            self.set_status("off")
@@ -23,9 +23,17 @@ class NewDevice(SmartDevice):
     Type hints provide hints to programmers as to what data type
     the input should take. It is specified as:
     <name>:<type> = <default_value>
+
+    SmartDevice uses __slots__ instead of a per-instance dictionary to
+    keep large simulations small, so every "private" instance variable
+    the new device stores must be listed in __slots__. The parameters
+    returned on __api__ are built once here by appending to the list
+    in SmartDevice. Python overloads addition of lists to be
+    concatenation.
     """
     _device_type: str = "NewDevice"
-    _api_return_parameters: List = [
+    __slots__ = ("_new_property_a", "_new_property_b")
+    _api_return_parameters: List = SmartDevice._api_return_parameters + [
         "new_property_a",
         "new_property_b"
     ]
@@ -46,11 +54,6 @@ class NewDevice(SmartDevice):
         """
         # Calls the constructor of the parent class, SmartDevice
         super.__init__(key1=key1, key2=key2)
-        # Appends the return parameters of the new device to the
-        # parameters specified in Devices. Python overloads addition
-        # of lists to be concatentation.
-        self._api_return_parameters = super()._api_return_parameters + \
-            self._api_return_parameters
         self.set_new_property("c")
         self.set_new_property("d")
 
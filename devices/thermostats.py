@@ -1,14 +1,18 @@
+import bisect
 import locale
 import logging
+import math
 
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-from devices.devices import SmartDevice
+from devices.devices import SmartDevice, cancel_device_timer, \
+    schedule_device_timer
 
-from helpers.unitconverters import celsius_to_fahrenheit, celsius_to_kelvin, \
-    fahrenheit_to_celsius, kelvin_to_celsius
-from helpers.misc import log_message_formatter
+from helpers.unitconverters import convert, kelvin_to_celsius, \
+    kelvin_to_fahrenheit
+from helpers.devicelog import log_get, log_set
+from helpers.versions import next_version
 
 
 class NestThermostat(SmartDevice):
@@ -20,8 +24,70 @@ class NestThermostat(SmartDevice):
     _temperature_scales: List = ["K", "C", "F"]
     _hvac_modes: List[str] = ["heat", "cool", "heat-cool", "eco", "off"]
     _time_to_target_options: List[str] = ["~0", "<5", "~15", "~90", "120"]
+    # Upper bounds, in minutes, of all but the last time-to-target
+    # option, halfway between neighbouring options.
+    _time_to_target_bounds: List[float] = [1.0, 5.0, 52.5, 105.0]
     _training_modes: List[str] = ["training", "ready"]
-    _degrees_per_minute: int = 1  # Currently unused.
+    # Temperatures are given in the temperature scale.
+    _leading_properties: Tuple[str, ...] = ("temperature_scale",)
+    # The default HVAC rate of simulation.ThermalSimulation, in Kelvin.
+    _degrees_per_minute: int = 1
+    # Setpoint slots for each HVAC mode, as (heat, cool). "heat" aims
+    # for the high target and "cool" for the low one, as in
+    # target_temperature. "heat-cool" and "eco" hold the temperature
+    # between their low and high setpoints, and "off" lets it drift.
+    _mode_setpoints: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+        "heat": ("_target_temperature_high", None),
+        "cool": (None, "_target_temperature_low"),
+        "heat-cool": ("_target_temperature_low", "_target_temperature_high"),
+        "eco": ("_eco_temperature_low", "_eco_temperature_high"),
+        "off": (None, None)
+    }
+    # The slot of each temperature, held in Kelvin, and the slot of its
+    # view in the current temperature scale, which the getters return.
+    _temperature_views: Dict[str, str] = {
+        "_ambient_temperature": "_ambient_temperature_view",
+        "_eco_temperature_high": "_eco_temperature_high_view",
+        "_eco_temperature_low": "_eco_temperature_low_view",
+        "_locked_temp_max": "_locked_temp_max_view",
+        "_locked_temp_min": "_locked_temp_min_view",
+        "_target_temperature_high": "_target_temperature_high_view",
+        "_target_temperature_low": "_target_temperature_low_view"
+    }
+    __slots__ = (
+        "_ambient_temperature",
+        "_ambient_temperature_view",
+        "_eco_temperature_high",
+        "_eco_temperature_high_view",
+        "_eco_temperature_low",
+        "_eco_temperature_low_view",
+        "_fan_timer_active",
+        "_fan_timer_duration",
+        "_fan_timer_timeout",
+        "_has_fan",
+        "_humidity",
+        "_hvac_mode",
+        "_is_locked",
+        "_locale",
+        "_locked_temp_max",
+        "_locked_temp_max_view",
+        "_locked_temp_min",
+        "_locked_temp_min_view",
+        "_previous_hvac_mode",
+        "_structure_id",
+        "_sunlight_correction_active",
+        "_sunlight_correction_enabled",
+        "_target_temperature_high",
+        "_target_temperature_high_view",
+        "_target_temperature_low",
+        "_target_temperature_low_view",
+        "_target_temperature_view",
+        "_temperature_scale",
+        "_thermal_estimate_cache",
+        "_thermal_state",
+        "_where_id",
+        "_where_name"
+    )
     _api_return_parameters: List = [
         "device_id",
         "device_type",
@@ -32,13 +98,27 @@ class NestThermostat(SmartDevice):
         "target_temperature",
         "temperature_scale",
         "hvac_mode",
-        "fan_timer_timeout"
-    ]
+        "fan_timer_timeout",
+        "is_heating",
+        "is_cooling",
+        "time_to_target"
+    ] + SmartDevice._api_return_parameters
 
     def __init__(self, location: str = "none", name: str = "none",
                  device_id: str = None, logger: logging.Logger = None):
         super().__init__(name=name, location=location, logger=logger,
                          device_id=device_id)
+        # Temperatures are kept in Kelvin, and the setters keep their
+        # views in the current scale up to date from here on.
+        self._ambient_temperature: float = 0.0
+        self._eco_temperature_high: float = 0.0
+        self._eco_temperature_low: float = 0.0
+        self._locked_temp_max: float = 0.0
+        self._locked_temp_min: float = 0.0
+        self._target_temperature_high: float = 0.0
+        self._target_temperature_low: float = 0.0
+        # Can't use setter because it expects _hvac_mode to exist.
+        self._hvac_mode: str = "off"
         self.set_temperature_scale("K")
         self.set_fan_timer_duration()
         self.set_fan_timer_timeout()
@@ -52,51 +132,28 @@ class NestThermostat(SmartDevice):
         self.set_sunlight_correction_active(False)
         self.set_sunlight_correction_enabled(False)
 
-        self._ambient_temperature: float = 0.0
         self._has_fan: bool = True
         self._humidity: float = 0.0
-        # Can't use setter because it expects _hvac_mode to exist.
-        self._hvac_mode: str = "off"
         self._locale: str = locale.getlocale()[0]
         # Default is not a valid mode, so must be set this way.
         self._previous_hvac_mode: str = ""
         self._structure_id: str = ""  # Currently unused.
-        self._target_temperature: float = 0.0
+        # (version, heating, cooling, time to target option) from the
+        # last simulation tick, see _store_thermal_state.
+        self._thermal_state: Optional[Tuple[int, bool, bool, int]] = None
+        # The same, estimated by _thermal_estimate when a getter is read.
+        # Only getters write it, and always a whole tuple for the version
+        # they read, so concurrent readers agree on its value.
+        self._thermal_estimate_cache: Optional[
+            Tuple[int, bool, bool, int]] = None
         self._where_id: str = ""  # Currently unused.
         self._where_name: str = ""  # Currently unused.
 
-        self._api_return_parameters = self._api_return_parameters + \
-            super()._api_return_parameters
-
-    def __properties__(self) -> dict:
-        """Getter for settable parameters. Intended to be used to log
-        the state of the simulated device to store in a configuration
-        file.
-
-        Returns:
-            dict: The internal state of the device.
-        """
-        parameters = [
-            d for d in dir(self) if (d[0] != "_") and (d.count("set") == 0)
-            and (d.count("_c") == 0) and (d.count("_f") == 0)
-        ]
-
-        return self.__as_json__(parameters)
-
-    def __from_json__(self, properties: dict):
-        """Set device parameters from dictionary. To be used with API
-        POST requests and configuration files.
-
-        Args:
-            dictionary (dict): The state to set the device to.
-        """
-        # Look for units first so the temperatures are set correctly.
-        value = properties.pop("temperature_scale", None)
-        if value is not None:
-            eval(f"self.set_temperature_scale('{value}')")
-
-        # Let superclass handle the rest
-        super().__from_json__(properties)
+    def __setstate__(self, state: dict):
+        super().__setstate__(state)
+        # Timers belong to the process, so restart a running fan timer.
+        if self._fan_timer_active:
+            self.set_fan_timer_timeout(self._fan_timer_timeout.isoformat())
 
     @property
     def ambient_temperature(self) -> int:
@@ -106,15 +163,9 @@ class NestThermostat(SmartDevice):
             int: The current temperature as measured at the device, in
             Kelvin.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "ambient_temperature"))
+        log_get(self._logger, self, "ambient_temperature")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "F":
-            return self.ambient_temperature_f
-        elif self.temperature_scale == "C":
-            return self.ambient_temperature_c
-        else:
-            return self._ambient_temperature
+        return self._ambient_temperature_view
 
     @property
     def ambient_temperature_c(self) -> float:
@@ -124,8 +175,7 @@ class NestThermostat(SmartDevice):
             float: The ambient temperature, as measured at the device,
             in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "ambient_temperature_c"))
+        log_get(self._logger, self, "ambient_temperature_c")
         return kelvin_to_celsius(self._ambient_temperature)
 
     @property
@@ -136,9 +186,23 @@ class NestThermostat(SmartDevice):
             float: The ambient temperature, as measured at the device,
             in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "ambient_temperature_f"))
-        return celsius_to_fahrenheit(self.ambient_temperature_c)
+        log_get(self._logger, self, "ambient_temperature_f")
+        return kelvin_to_fahrenheit(self._ambient_temperature)
+
+    def set_ambient_temperature(self, value: float = 0):
+        """Setter for the ambient temperature, for simulations. Assumes
+        set units are the same as the current system units.
+
+        Args:
+            value (float, optional): The temperature measured at the
+            device. Defaults to 0.
+        """
+        kelvin = self._to_kelvin(value)
+        self._ambient_temperature = kelvin
+        self._ambient_temperature_view = self._in_scale(kelvin)
+        self._refresh_target()
+
+        log_set(self._logger, self, "ambient_temperature", value)
 
     @property
     def can_heat(self) -> bool:
@@ -149,8 +213,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Always true.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "can_heat"))
+        log_get(self._logger, self, "can_heat")
         return True
 
     @property
@@ -162,8 +225,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Always true.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "can_cool"))
+        log_get(self._logger, self, "can_cool")
         return True
 
     @property
@@ -173,9 +235,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The high eco temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_high_f"))
-        return celsius_to_fahrenheit(self.eco_temperature_high_c)
+        log_get(self._logger, self, "eco_temperature_high_f")
+        return kelvin_to_fahrenheit(self._eco_temperature_high)
 
     @property
     def eco_temperature_high_c(self) -> float:
@@ -184,8 +245,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The high eco temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_high_c"))
+        log_get(self._logger, self, "eco_temperature_high_c")
         return kelvin_to_celsius(self._eco_temperature_high)
 
     @property
@@ -195,16 +255,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The eco temperature in current units.
         """
+        log_get(self._logger, self, "eco_temperature_high")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "C":
-            return self.eco_temperature_high_c
-        elif self.temperature_scale == "F":
-            return self.eco_temperature_high_f
-        else:
-            return self._eco_temperature_high
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_high"))
+        return self._eco_temperature_high_view
 
     def set_eco_temperature_high(self, value: int = 0):
         """Setter for high eco temperature value. Assumes set units are
@@ -214,17 +267,12 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the high eco
             value to. Defaults to 0.
         """
-        if self._temperature_scale == "F":
-            self._eco_temperature_high = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._eco_temperature_high = celsius_to_kelvin(value)
-        else:
-            self._eco_temperature_high = value
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "eco_temperature_high",
-            f"{value} {self.temperature_scale}"))
+        kelvin = self._to_kelvin(value)
+        self._eco_temperature_high = kelvin
+        self._eco_temperature_high_view = self._in_scale(kelvin)
+        self._refresh_target()
+        log_set(self._logger, self, "eco_temperature_high", value,
+                self._temperature_scale)
 
     @property
     def eco_temperature_low_f(self) -> float:
@@ -233,9 +281,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The low eco temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_low_f"))
-        return celsius_to_fahrenheit(self.eco_temperature_low_c)
+        log_get(self._logger, self, "eco_temperature_low_f")
+        return kelvin_to_fahrenheit(self._eco_temperature_low)
 
     @property
     def eco_temperature_low_c(self) -> float:
@@ -244,8 +291,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The high eco temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_low_c"))
+        log_get(self._logger, self, "eco_temperature_low_c")
         return kelvin_to_celsius(self._eco_temperature_low)
 
     @property
@@ -255,16 +301,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The eco low temperature, in current units.
         """
+        log_get(self._logger, self, "eco_temperature_low")
         # TODO: Force this to return an int or float rounded to 0.5.
-        if self.temperature_scale == "C":
-            return self.eco_temperature_low_c
-        elif self.temperature_scale == "F":
-            return self.eco_temperature_low_f
-        else:
-            return self._eco_temperature_low
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "eco_temperature_low"))
+        return self._eco_temperature_low_view
 
     def set_eco_temperature_low(self, value: int = 0):
         """Setter for low eco temperature value. Assumes set units are
@@ -274,29 +313,45 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the low eco
             value to. Defaults to 0.
         """
-        if self._temperature_scale == "F":
-            self._eco_temperature_low = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._eco_temperature_low = celsius_to_kelvin(value)
-        else:
-            self._eco_temperature_low = value
+        kelvin = self._to_kelvin(value)
+        self._eco_temperature_low = kelvin
+        self._eco_temperature_low_view = self._in_scale(kelvin)
+        self._refresh_target()
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "eco_temperature_low",
-            f"{value} {self.temperature_scale}"))
+        log_set(self._logger, self, "eco_temperature_low", value,
+                self._temperature_scale)
 
     @property
     def fan_timer_active(self) -> bool:
-        """Boolean indicating whether the fan timer is active.
+        """Boolean indicating whether the fan timer is active. It is
+        turned off by the process-wide timer scheduler when the fan
+        timer times out.
 
         Returns:
             bool: True if fan timer is active, false otherwise.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "fan_timer_active"))
-        return datetime.fromisoformat(self.fan_timer_timeout) > datetime.now()
+        log_get(self._logger, self, "fan_timer_active")
+        return self._fan_timer_active
+
+    def set_fan_timer_active(self, value: bool = False):
+        """Starts the fan timer for fan_timer_duration, or stops it now.
+
+        Args:
+            value (bool, optional): Whether the fan timer should run.
+            Defaults to False.
+        """
+        if value:
+            self.set_fan_timer_timeout()
+        elif self._fan_timer_active:
+            self._fan_timer_active = False
+            self._fan_timer_timeout = min(self._fan_timer_timeout,
+                                          datetime.now())
+            cancel_device_timer(self, "fan_timer")
+        log_set(self._logger, self, "fan_timer_active", value)
+
+    def _expire_fan_timer(self):
+        """Stops the fan timer once it times out."""
+        self.set_fan_timer_active(False)
 
     @property
     def fan_timer_timeout(self) -> str:
@@ -305,8 +360,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: The time at which the fan will become inactive.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "fan_timer_timeout"))
+        log_get(self._logger, self, "fan_timer_timeout")
         return self._fan_timer_timeout.isoformat()
 
     def set_fan_timer_timeout(self, time_: str = None):
@@ -318,13 +372,20 @@ class NestThermostat(SmartDevice):
             time_ (str, optional): The time to set the fan timer timeout
             to. Expects isoformat time. If no input. Defaults to None.
         """
+        now = datetime.now()
         if time_ is not None:
             self._fan_timer_timeout = datetime.fromisoformat(time_)
         else:
-            self._fan_timer_timeout = datetime.now() + self._fan_timer_duration
+            self._fan_timer_timeout = now + self._fan_timer_duration
+        self._fan_timer_active = self._fan_timer_timeout > now
+        if self._fan_timer_active:
+            schedule_device_timer(self, "fan_timer", self._fan_timer_timeout,
+                                  NestThermostat._expire_fan_timer)
+        else:
+            cancel_device_timer(self, "fan_timer")
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "fan_timer-timeout", self.fan_timer_timeout))
+        log_set(self._logger, self, "fan_timer_timeout",
+                self._fan_timer_timeout)
 
     @property
     def fan_timer_duration(self) -> int:
@@ -333,8 +394,7 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The fan timer duration, in minutes.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "fan_timer_duration"))
+        log_get(self._logger, self, "fan_timer_duration")
         return self._fan_timer_duration.seconds / 60
 
     def set_fan_timer_duration(self, minutes: int = 5):
@@ -345,8 +405,7 @@ class NestThermostat(SmartDevice):
             fan timer. Defaults to 5.
         """
         self._fan_timer_duration = timedelta(minutes=minutes)
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "fan_timer_duration", minutes))
+        log_set(self._logger, self, "fan_timer_duration", minutes)
 
     @property
     def has_fan(self) -> bool:
@@ -357,8 +416,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Always true.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "has_fan"))
+        log_get(self._logger, self, "has_fan")
         return self._has_fan
 
     def set_has_fan(self, value: bool = True):
@@ -368,8 +426,7 @@ class NestThermostat(SmartDevice):
             value (bool, optional): The value to set has_fan to.
             Defaults to True.
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "has_fan", value))
+        log_set(self._logger, self, "has_fan", value)
         self._has_fan = value
 
     @property
@@ -380,8 +437,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Whether thermostat is in energy saving mode.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "has_leaf"))
+        log_get(self._logger, self, "has_leaf")
         return self._hvac_mode == "eco"
 
     @property
@@ -392,8 +448,7 @@ class NestThermostat(SmartDevice):
         Returns:
             int: Percentage humidity, between 0 and 100 inclusive.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "humidity"))
+        log_get(self._logger, self, "humidity")
         return round(self._humidity * 100)
 
     @property
@@ -403,8 +458,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: The current HVAC mode.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "hvac_mode"))
+        log_get(self._logger, self, "hvac_mode")
         return self._hvac_mode
 
     def set_hvac_mode(self, value: str = "off"):
@@ -416,40 +470,38 @@ class NestThermostat(SmartDevice):
         """
         if value in self._hvac_modes:
             self.set_previous_hvac_mode(self._hvac_mode)
-            self._logger.info(log_message_formatter(
-                "set", f"{self}", "hvac_mode", value))
+            log_set(self._logger, self, "hvac_mode", value)
             self._hvac_mode = value
+            self._refresh_target()
         else:
             self._logger.warning(
                 "abort set -- {value} not in {self._hvac_modes}")
 
     @property
     def is_cooling(self) -> bool:
-        """Boolean indicating whether the system is actively cooling.
+        """Boolean indicating whether the system is actively cooling,
+        as of the last simulation tick if the thermostat has not changed
+        since, or else because the ambient temperature is above the
+        cooling setpoint of the HVAC mode.
 
         Returns:
-            bool: True if current temperature is greater than target
-            temperature.
+            bool: Whether the system is cooling.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "is_cooling"))
-        return (self._ambient_temperature > self._target_temperature) \
-            and self.can_cool \
-            and (self._hvac_mode == "cool" or self._hvac_mode == "heat-cool")
+        log_get(self._logger, self, "is_cooling")
+        return self._thermal_estimate()[1]
 
     @property
     def is_heating(self) -> bool:
-        """Boolean indicating whether the system is actively heating.
+        """Boolean indicating whether the system is actively heating,
+        as of the last simulation tick if the thermostat has not changed
+        since, or else because the ambient temperature is below the
+        heating setpoint of the HVAC mode.
 
         Returns:
-            bool: True if current temperature is less than target
-            temperature.
+            bool: Whether the system is heating.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "is_heating"))
-        return (self._ambient_temperature < self._target_temperature) \
-            and self.can_heat \
-            and (self._hvac_mode == "heat" or self._hvac_mode == "heat-cool")
+        log_get(self._logger, self, "is_heating")
+        return self._thermal_estimate()[0]
 
     @property
     def is_locked(self) -> bool:
@@ -458,8 +510,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Whether the device is locked.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "is_locked"))
+        log_get(self._logger, self, "is_locked")
         return self._is_locked
 
     def set_is_locked(self, value: bool = False):
@@ -469,8 +520,7 @@ class NestThermostat(SmartDevice):
             value (bool, optional): The desired lock status of the
             device. Defaults to False.
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "is_locked", value))
+        log_set(self._logger, self, "is_locked", value)
         self._is_locked = value
 
     @property
@@ -482,8 +532,7 @@ class NestThermostat(SmartDevice):
             bool: Whether the emergency heat is active.
         """
         # TODO: Figure out how to implement this.
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "is_using_emergency_heat"))
+        log_get(self._logger, self, "is_using_emergency_heat")
         return False
 
     @property
@@ -493,8 +542,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: The device label.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "label"))
+        log_get(self._logger, self, "label")
         return self._name
 
     def set_label(self, value: str = "nowhere"):
@@ -504,8 +552,7 @@ class NestThermostat(SmartDevice):
             value (str, optional): The value to set the label to.
             Defaults to "nowhere".
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "label"))
+        log_set(self._logger, self, "label", value)
         self._name = value
 
     @property
@@ -515,8 +562,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: The current locale being used by the device.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locale"))
+        log_get(self._logger, self, "locale")
         return self._locale
 
     @property
@@ -526,8 +572,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The locked maximum temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_max_c"))
+        log_get(self._logger, self, "locked_temp_max_c")
         return kelvin_to_celsius(self._locked_temp_max)
 
     @property
@@ -537,9 +582,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The locked maximum temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_max_f"))
-        return celsius_to_fahrenheit(self.locked_temp_max_c)
+        log_get(self._logger, self, "locked_temp_max_f")
+        return kelvin_to_fahrenheit(self._locked_temp_max)
 
     @property
     def locked_temp_max(self) -> int:
@@ -548,16 +592,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The locked temperature, in current units.
         """
+        log_get(self._logger, self, "locked_temp_max")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "C":
-            return self.locked_temp_max_c
-        elif self.temperature_scale == "F":
-            return self.locked_temp_max_f
-        else:
-            return self._locked_temp_max
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_max"))
+        return self._locked_temp_max_view
 
     def set_locked_temp_max(self, value: int = 0):
         """Setter for high locked temperature value. Assumes set units
@@ -567,17 +604,11 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the high
             locked value to. Defaults to 0.
         """
-        if self._temperature_scale == "F":
-            self._locked_temp_max = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._locked_temp_max = celsius_to_kelvin(value)
-        else:
-            self._locked_temp_max = value
+        kelvin = self._to_kelvin(value)
+        self._locked_temp_max = kelvin
+        self._locked_temp_max_view = self._in_scale(kelvin)
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "locked_temp_max", value))
+        log_set(self._logger, self, "locked_temp_max", value)
 
     @property
     def locked_temp_min_c(self) -> float:
@@ -586,8 +617,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The locked minimum temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_min_c"))
+        log_get(self._logger, self, "locked_temp_min_c")
         return kelvin_to_celsius(self._locked_temp_min)
 
     @property
@@ -597,9 +627,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The locked minimum temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_min_f"))
-        return celsius_to_fahrenheit(self.locked_temp_min_c)
+        log_get(self._logger, self, "locked_temp_min_f")
+        return kelvin_to_fahrenheit(self._locked_temp_min)
 
     @property
     def locked_temp_min(self) -> int:
@@ -608,16 +637,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The minimum locked temperature, in current units.
         """
+        log_get(self._logger, self, "locked_temp_min")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "C":
-            return self.locked_temp_min_c
-        elif self.temperature_scale == "F":
-            return self.locked_temp_min_f
-        else:
-            return self._locked_temp_min
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "locked_temp_min"))
+        return self._locked_temp_min_view
 
     def set_locked_temp_min(self, value: int = 0):
         """Setter for high locked temperature value. Assumes set units
@@ -627,17 +649,11 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the high
             locked value to. Defaults to 0.
         """
-        if self._temperature_scale == "F":
-            self._locked_temp_min = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._locked_temp_min = celsius_to_kelvin(value)
-        else:
-            self._locked_temp_min = value
+        kelvin = self._to_kelvin(value)
+        self._locked_temp_min = kelvin
+        self._locked_temp_min_view = self._in_scale(kelvin)
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "locked_temp_min", value))
+        log_set(self._logger, self, "locked_temp_min", value)
 
     @property
     def previous_hvac_mode(self) -> str:
@@ -646,8 +662,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: The HVAC mode previous to the current.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "previous_hvac_mode"))
+        log_get(self._logger, self, "previous_hvac_mode")
         return self._previous_hvac_mode
 
     def set_previous_hvac_mode(self, value: str):
@@ -658,8 +673,7 @@ class NestThermostat(SmartDevice):
         """
 
         if value in self._hvac_modes:
-            self._logger.info(log_message_formatter(
-                "set", f"{self}", "locked_temp_max_f", value))
+            log_set(self._logger, self, "previous_hvac_mode", value)
             self._previous_hvac_mode = value
         else:
             self._logger.warning(
@@ -672,8 +686,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Whether sunlight correction is enabled.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "sunlight_correction_enabled"))
+        log_get(self._logger, self, "sunlight_correction_enabled")
         return self._sunlight_correction_enabled
 
     def set_sunlight_correction_enabled(self, value: bool = False):
@@ -683,8 +696,7 @@ class NestThermostat(SmartDevice):
             value (bool, optional): The value to set sunlight correction
             to. Defaults to False.
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "sunlight_correction_enabled", value))
+        log_set(self._logger, self, "sunlight_correction_enabled", value)
         self._sunlight_correction_enabled = value
 
     @property
@@ -694,8 +706,7 @@ class NestThermostat(SmartDevice):
         Returns:
             bool: Whether the sunlight correction is active.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "sunlight_correction_active"))
+        log_get(self._logger, self, "sunlight_correction_active")
         return self._sunlight_correction_active
 
     def set_sunlight_correction_active(self, value: bool = False):
@@ -705,8 +716,7 @@ class NestThermostat(SmartDevice):
             value (bool, optional): Value to set sunlight correction
             status to. Defaults to False.
         """
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "sunlight_correction_active", value))
+        log_set(self._logger, self, "sunlight_correction_active", value)
         self._sunlight_correction_active = value
 
     @property
@@ -718,27 +728,8 @@ class NestThermostat(SmartDevice):
             int: The target temperature in units specified by
             temperature scale.
         """
-        # TODO: Find a better way to do this. This is ugly.
-        if self._hvac_mode == "cool":
-            return self.target_temperature_low
-        elif self._hvac_mode == "heat":
-            return self.target_temperature_high
-        elif self._hvac_mode == "heat-cool":
-            # TODO: Fix this so that heat or cool is chosen.
-            if self._ambient_temperature >= self._target_temperature:
-                return self.target_temperature_low
-            elif self._ambient_temperature <= self._target_temperature:
-                return self.target_temperature_high
-        elif self._hvac_mode == "eco":
-            if self._ambient_temperature >= self._target_temperature:
-                return self.eco_temperature_low
-            elif self._ambient_temperature <= self._target_temperature:
-                return self.eco_temperature_high
-        elif self._hvac_mode == "off":
-            return self.ambient_temperature
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "ambient_temperature"))
+        log_get(self._logger, self, "target_temperature")
+        return self._target_temperature_view
 
     @property
     def target_temperature_f(self) -> float:
@@ -747,9 +738,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_f"))
-        return celsius_to_fahrenheit(self.target_temperature_c)
+        log_get(self._logger, self, "target_temperature_f")
+        return kelvin_to_fahrenheit(self._active_setpoint())
 
     @property
     def target_temperature_c(self) -> float:
@@ -758,9 +748,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_c"))
-        return kelvin_to_celsius(self._target_temperature)
+        log_get(self._logger, self, "target_temperature_c")
+        return kelvin_to_celsius(self._active_setpoint())
 
     @property
     def target_temperature_high(self) -> int:
@@ -769,16 +758,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The target high temperature, in current units.
         """
+        log_get(self._logger, self, "target_temperature_high")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "C":
-            return self.target_temperature_high_c
-        elif self.temperature_scale == "F":
-            return self.target_temperature_high_f
-        else:
-            return self._target_temperature_high
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_high"))
+        return self._target_temperature_high_view
 
     @property
     def target_temperature_high_f(self) -> float:
@@ -787,9 +769,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target high temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperatue_high_f"))
-        return celsius_to_fahrenheit(self.target_temperature_high_c)
+        log_get(self._logger, self, "target_temperature_high_f")
+        return kelvin_to_fahrenheit(self._target_temperature_high)
 
     @property
     def target_temperature_high_c(self) -> float:
@@ -798,8 +779,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target high temperature, in Celsius.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_high_c"))
+        log_get(self._logger, self, "target_temperature_high_c")
         return kelvin_to_celsius(self._target_temperature_high)
 
     def set_target_temperature_high(self, value: int = 0):
@@ -810,17 +790,12 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the high
             temperature value to. Defaults to 0
         """
-        if self._temperature_scale == "F":
-            self._target_temperature_high = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._target_temperature_high = celsius_to_kelvin(value)
-        else:
-            self._target_temperature_high = value
+        kelvin = self._to_kelvin(value)
+        self._target_temperature_high = kelvin
+        self._target_temperature_high_view = self._in_scale(kelvin)
+        self._refresh_target()
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "target_temperature_high", value))
+        log_set(self._logger, self, "target_temperature_high", value)
 
     @property
     def target_temperature_low_f(self) -> float:
@@ -829,9 +804,8 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target low temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_low_f"))
-        return celsius_to_fahrenheit(self.target_temperature_low_c)
+        log_get(self._logger, self, "target_temperature_low_f")
+        return kelvin_to_fahrenheit(self._target_temperature_low)
 
     @property
     def target_temperature_low_c(self) -> float:
@@ -840,8 +814,7 @@ class NestThermostat(SmartDevice):
         Returns:
             float: The target low temperature, in Fahrenheit.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_low_c"))
+        log_get(self._logger, self, "target_temperature_low_c")
         return kelvin_to_celsius(self._target_temperature_low)
 
     def set_target_temperature_low(self, value: int = 0):
@@ -852,17 +825,12 @@ class NestThermostat(SmartDevice):
             value (int, optional): The temperature to set the low target
             temperature value to. Defaults to 0.
         """
-        if self._temperature_scale == "F":
-            self._target_temperature_low = celsius_to_kelvin(
-                fahrenheit_to_celsius(value)
-            )
-        elif self._temperature_scale == "C":
-            self._target_temperature_low = celsius_to_kelvin(value)
-        else:
-            self._target_temperature_low = value
+        kelvin = self._to_kelvin(value)
+        self._target_temperature_low = kelvin
+        self._target_temperature_low_view = self._in_scale(kelvin)
+        self._refresh_target()
 
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "target_temperature_low", value))
+        log_set(self._logger, self, "target_temperature_low", value)
 
     @property
     def target_temperature_low(self) -> int:
@@ -871,16 +839,9 @@ class NestThermostat(SmartDevice):
         Returns:
             int: The target low temperature, in current units.
         """
+        log_get(self._logger, self, "target_temperature_low")
         # TODO: Force this to return an int.
-        if self.temperature_scale == "C":
-            return self.target_temperature_low_c
-        elif self.temperature_scale == "F":
-            return self.target_temperature_low_f
-        else:
-            return self._target_temperature_low
-
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "target_temperature_low"))
+        return self._target_temperature_low_view
 
     @property
     def temperature_scale(self) -> str:
@@ -889,8 +850,7 @@ class NestThermostat(SmartDevice):
         Returns:
             str: Current temperature units returned by the device.
         """
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "temperature_scale"))
+        log_get(self._logger, self, "temperature_scale")
         return self._temperature_scale
 
     def set_temperature_scale(self, scale: str = "K"):
@@ -901,34 +861,171 @@ class NestThermostat(SmartDevice):
             or "F". Defaults to "K".
         """
         if scale in self._temperature_scales:
-            self._logger.info(log_message_formatter(
-                "set", f"{self}", "temperature_scale", scale))
+            log_set(self._logger, self, "temperature_scale", scale)
             self._temperature_scale = scale
+            for slot, view in self._temperature_views.items():
+                setattr(self, view, self._in_scale(getattr(self, slot)))
+            self._refresh_target()
         else:
             self._logger.warning(
                 "abort set -- {scale} not in {self._temperature_scales}")
 
     @property
     def time_to_target(self) -> str:
-        """Calculates the time, in minutes, for the structure to reach
-        the target temperature.
+        """Estimates the time, in minutes, for the structure to reach
+        the target temperature, as one of _time_to_target_options. The
+        estimate comes from the last simulation tick if the thermostat
+        has not changed since, see time_to_target_training. Otherwise
+        the HVAC is assumed to move the temperature by
+        _degrees_per_minute.
 
         Returns:
             str: A string representation of the estimated time.
         """
-        # TODO: Figure out how to implement this.
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "time_to_target"))
-        return self._time_to_target_options[0]
+        log_get(self._logger, self, "time_to_target")
+        return self._time_to_target_options[self._thermal_estimate()[2]]
+
+    def _store_thermal_state(self, heating: bool = False,
+                             cooling: bool = False, option: int = 0):
+        """Stores the HVAC state from a simulation tick. It holds until
+        the thermostat next changes. It is not a set_ method, so that it
+        cannot be set through the API, and so bumps the version and
+        tells observers itself, only when is_heating, is_cooling or
+        time_to_target change.
+
+        Args:
+            heating (bool, optional): Whether the system is heating.
+            Defaults to False.
+            cooling (bool, optional): Whether the system is cooling.
+            Defaults to False.
+            option (int, optional): The index of the time to target in
+            _time_to_target_options. Defaults to 0.
+        """
+        state = (heating, cooling, option)
+        current = self._thermal_state
+        if current is not None and current[0] == self._version \
+                and current[1:] == state:
+            return
+        if self._thermal_estimate() == state:
+            # Only time_to_target_training changes, which is not
+            # reported to observers.
+            self._thermal_state = (self._version,) + state
+            return
+        self._version = next_version()
+        self._thermal_state = (self._version,) + state
+        log_set(self._logger, self, "thermal_state",
+                (heating, cooling, self._time_to_target_options[option]))
+        for observer in self._observers:
+            observer(self, "thermal_state", None, None)
 
     @property
     def time_to_target_training(self) -> str:
-        """Getter for the time-to-temperature training mode.
+        """Getter for the time-to-temperature training mode, which is
+        "ready" while the estimates come from the thermal simulation.
 
         Returns:
             str: The training mode.
         """
-        # TODO: Figure out how to implement this.
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "time_to_target_training"))
-        return self._training_modes[0]
+        log_get(self._logger, self, "time_to_target_training")
+        state = self._thermal_state
+        return self._training_modes[int(
+            state is not None and state[0] == self._version)]
+
+    def _setpoints(self) -> Tuple[float, float]:
+        """The heating and cooling setpoints of the HVAC mode, in
+        Kelvin. A mode which does not heat or cool has a setpoint of
+        -inf or inf respectively, and a band given high-to-low still
+        heats below and cools above it.
+
+        Returns:
+            Tuple[float, float]: The heating and cooling setpoints.
+        """
+        heat_slot, cool_slot = self._mode_setpoints[self._hvac_mode]
+        heat = -math.inf if heat_slot is None else getattr(self, heat_slot)
+        cool = math.inf if cool_slot is None else getattr(self, cool_slot)
+        if heat_slot is not None and cool_slot is not None and heat > cool:
+            heat, cool = cool, heat
+        return heat, cool
+
+    def _active_setpoint(self) -> float:
+        """The setpoint the HVAC is driving the temperature towards, in
+        Kelvin, or the nearest edge of the band while inside it. With
+        the HVAC off, this is the ambient temperature.
+
+        Returns:
+            float: The setpoint.
+        """
+        heat, cool = self._setpoints()
+        ambient = self._ambient_temperature
+        if heat == -math.inf and cool == math.inf:
+            return ambient
+        if ambient > cool:
+            return cool
+        if ambient < heat or ambient - heat <= cool - ambient:
+            return heat
+        return cool
+
+    def _refresh_target(self):
+        """Recomputes the view of target_temperature, which follows the
+        HVAC mode, the setpoints and the ambient temperature.
+        """
+        self._target_temperature_view = self._in_scale(
+            self._active_setpoint())
+
+    def _to_kelvin(self, value: float) -> float:
+        """Converts a temperature in the current temperature scale to
+        Kelvin.
+
+        Args:
+            value (float): The temperature in the current scale.
+
+        Returns:
+            float: The temperature, in Kelvin.
+        """
+        return convert(value, self._temperature_scale, "K")
+
+    def _in_scale(self, kelvin: float) -> float:
+        """Converts a temperature to the current temperature scale.
+
+        Args:
+            kelvin (float): The temperature, in Kelvin.
+
+        Returns:
+            float: The temperature in the current scale.
+        """
+        return convert(kelvin, "K", self._temperature_scale)
+
+    def _thermal_estimate(self) -> Tuple[bool, bool, int]:
+        """Whether the system is heating and cooling, and the index of
+        the time-to-target option. These are cached by the last
+        simulation tick and are valid until the thermostat changes.
+        Otherwise they are estimated from the setpoints of the HVAC
+        mode, assuming the HVAC changes the temperature by
+        _degrees_per_minute and nothing else does, and the estimate is
+        cached apart from the simulated state, so reads never change it.
+
+        Returns:
+            Tuple[bool, bool, int]: Heating, cooling and the option.
+        """
+        version = self._version
+        state = self._thermal_state
+        if state is not None and state[0] == version:
+            return state[1:]
+        state = self._thermal_estimate_cache
+        if state is not None and state[0] == version:
+            return state[1:]
+        heat, cool = self._setpoints()
+        ambient = self._ambient_temperature
+        heating = cooling = False
+        minutes = 0.0
+        if ambient < heat:
+            heating = self.can_heat
+            minutes = (heat - ambient) / self._degrees_per_minute \
+                if heating else math.inf
+        elif ambient > cool:
+            cooling = self.can_cool
+            minutes = (ambient - cool) / self._degrees_per_minute \
+                if cooling else math.inf
+        option = bisect.bisect_right(self._time_to_target_bounds, minutes)
+        self._thermal_estimate_cache = (version, heating, cooling, option)
+        return heating, cooling, option
@@ -1,10 +1,11 @@
 from datetime import datetime
 import random
 import logging
-import time
 
-from devices.devices import SmartDevice
-from helpers.misc import log_message_formatter, create_logger
+from devices.devices import SmartDevice, _intern
+from helpers.devicelog import log_get, log_set
+from helpers.ids import new_id
+from helpers.misc import create_logger
 
 from typing import List, Union
 
@@ -45,7 +46,8 @@ class WaterHeater(SmartDevice):
         "target_temperature",
         "heater_mode"
     ]
-    _statuses: List[str] = ["on", "off"]
+    _statuses: List[str] = ["on", "off", "timer"]
+    __slots__ = ()
 
     def __init__(self, location: str = "none", name: str = "none", device_id: str = None, logger: logging.Logger = None):
         super(). __init__(name=name, logger=logger, device_id=device_id)
@@ -59,56 +61,35 @@ class WaterHeater(SmartDevice):
         self.set_status("off")
         self.set_last_connected(datetime.now().isoformat())
 
-        self._logger.debug(
-            f"create {self} name -- "
-            + f"{self.name}, software_version -- "
-            + f"{self.software_version}, "
-            + f"location -- {self.location}."
-        )
-
-    def __getitem__(self, key: str):
-        return eval(f"self.{key}") if key in dir(self) else None
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                f"create {self} name -- "
+                + f"{self.name}, software_version -- "
+                + f"{self.software_version}, "
+                + f"location -- {self.location}."
+            )
 
     def __api__(self) -> dict:
 
         self.set_last_connected(datetime.now().isoformat())
         return self.__as_json__(self._api_return_parameters)
 
-    def __as_json__(self, parameters: List) -> dict:
-
-        dictionary = {}
-        # Comprehensions doesn't work as expected with eval and self
-        for parameter in parameters:
-            dictionary.update({parameter: eval(f"self.{parameter}")})
-
-        return dictionary
-
-    def __from_json__(self, dictionary: dict):
-
-        for key in dictionary.keys():
-            parameter = f"set_{key}"
-            if parameter in dir(self):
-                eval(f"self.{parameter}(dictionary['{key}'])")
-            else:
-                self._logger.warning(
-                    f"abort set -- '{parameter}' not in {self.device_type}")
-
     @property
     def device_id(self) -> str:
 
-        self._logger.debug("get device_id.")
+        log_get(self._logger, self, "device_id")
         return self._device_id
 
     def set_device_id(self, id_: Union[str, None] = None):
-        self._device_id = f"{hash(time.time()):016X}" if id_ is None else id_
+        self._device_id = new_id() if id_ is None else id_
 
     @property
     def device_type(self) -> str:
-        return self._device_type
+        return self._type
 
     def set_device_type(self, type_: str = "none"):
-        self._logger.info(f"{self} is now a {type_}.")
-        self._device_type = type_
+        log_set(self._logger, self, "device_type", type_)
+        self._type = _intern(type_)
 
     @property
     def is_online(self) -> bool:
@@ -116,19 +97,13 @@ class WaterHeater(SmartDevice):
 
     def set_is_online(self, online: bool = True):
         self._is_online = online
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "is_online", online))
+        log_set(self._logger, self, "is_online", online)
 
     @property
     def location(self) -> str:
-        self._logger.debug(log_message_formatter("get", f"{self}", "location"))
+        log_get(self._logger, self, "location")
         return self._location
 
-    def set_location(self, location: str = "none"):
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "location", location))
-        self._location = location
-
     def set_logger(self, logger: logging.Logger = None):
         if logger is None:
             logger: logging.Logger = create_logger()
@@ -139,36 +114,20 @@ class WaterHeater(SmartDevice):
     @property
     def name_long(self) -> str:
 
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "name_long"))
-        return f"{self._name} {self._device_type} ({self._location})"
+        log_get(self._logger, self, "name_long")
+        return f"{self._name} {self._type} ({self._location})"
 
     @property
     def name(self) -> str:
 
-        self._logger.debug(log_message_formatter(
-            "get", f"{self}", "name"))
+        log_get(self._logger, self, "name")
         return self._name
 
-    def set_name(self, name: str = ""):
-        self._name = name
-        self._logger.info(log_message_formatter(
-            "set", f"{self}", "name", name))
-
     @property
     def status(self) -> str:
-        self._logger.debug(log_message_formatter("get", f"{self}", "status"))
+        log_get(self._logger, self, "status")
         return self._status
 
-    def set_status(self, status: str = "off"):
-        if status in self._statuses:
-            self._status = status
-            self._logger.info(log_message_formatter(
-                "set", f"{self}", "status", self._status))
-        else:
-            self._logger.warning(
-                f"abort set {self} status -- not in {self._statuses}.")
-
 
 """
 Alternate version - not used
@@ -0,0 +1,124 @@
+from typing import Callable, Dict, NamedTuple, Tuple, Union
+
+_unit_suffixes = ("_c", "_f")
+
+
+class PropertySpec(NamedTuple):
+    """Description of a single property in a class schema.
+
+    Attributes:
+        name (str): The name of the property.
+        type_ (Union[type, None]): The annotated return type of the
+        getter, if any.
+        settable (bool): Whether the property has a set_<name> method.
+        derived_from (Union[str, None]): The name of the property that
+        this one is a unit variant of, e.g. "ambient_temperature" for
+        "ambient_temperature_f".
+    """
+    name: str
+    type_: Union[type, None]
+    settable: bool
+    derived_from: Union[str, None]
+
+    @property
+    def persistable(self) -> bool:
+        """Whether the property should be stored in a configuration
+        file. Unit variants are skipped since the base property holds
+        the same value.
+        """
+        return self.settable and self.derived_from is None
+
+
+def getter_table(cls: type) -> Dict[str, Callable]:
+    """Builds a table mapping every property on a class to its getter
+    function. Properties defined on subclasses take precedence over
+    those defined on their parents.
+
+    Args:
+        cls (type): The class to inspect.
+
+    Returns:
+        Dict[str, Callable]: Property names mapped to unbound getters.
+    """
+    getters = {}
+    for klass in reversed(cls.__mro__):
+        for name, attribute in vars(klass).items():
+            if isinstance(attribute, property) and attribute.fget is not None:
+                getters[name] = attribute.fget
+            elif name in getters:
+                # A plain attribute in a subclass hides the property.
+                del getters[name]
+    return getters
+
+
+def setter_table(cls: type) -> Dict[str, Callable]:
+    """Builds a table mapping every settable parameter on a class to its
+    set_<parameter> method.
+
+    Args:
+        cls (type): The class to inspect.
+
+    Returns:
+        Dict[str, Callable]: Parameter names mapped to unbound setters.
+    """
+    setters = {}
+    for klass in reversed(cls.__mro__):
+        for name, attribute in vars(klass).items():
+            if name.startswith("set_") and callable(attribute):
+                setters[name[4:]] = attribute
+    return setters
+
+
+def property_schema(getters: Dict[str, Callable],
+                    setters: Dict[str, Callable]) -> Dict[str, PropertySpec]:
+    """Describes the public properties of a class from its accessor
+    tables.
+
+    Args:
+        getters (Dict[str, Callable]): The class getter table.
+        setters (Dict[str, Callable]): The class setter table.
+
+    Returns:
+        Dict[str, PropertySpec]: Public property names, in sorted
+        order, mapped to their descriptions.
+    """
+    schema = {}
+    for name in sorted(getters):
+        if name[0] == "_":
+            continue
+        derived_from = None
+        if name[-2:] in _unit_suffixes and name[:-2] in getters:
+            derived_from = name[:-2]
+        schema[name] = PropertySpec(
+            name=name,
+            type_=getters[name].__annotations__.get("return"),
+            settable=name in setters,
+            derived_from=derived_from)
+    return schema
+
+
+class AccessorRegistry:
+    """Mixin which builds getter and setter lookup tables once, when a
+    class is defined, so that serialization can look up accessors by
+    name instead of calling eval or dir on every request.
+    """
+    __slots__ = ()
+    _getters: Dict[str, Callable] = {}
+    _setters: Dict[str, Callable] = {}
+    _schema: Dict[str, PropertySpec] = {}
+    _persistable: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._register_accessors()
+
+    @classmethod
+    def _register_accessors(cls):
+        """Rebuilds the accessor tables and property schema for the
+        class. Called automatically for every subclass.
+        """
+        cls._getters = getter_table(cls)
+        cls._setters = setter_table(cls)
+        cls._schema = property_schema(cls._getters, cls._setters)
+        cls._persistable = tuple(
+            name for name, spec in cls._schema.items() if spec.persistable)
@@ -0,0 +1,64 @@
+import logging
+
+from typing import Any
+
+from helpers.misc import log_message_formatter
+
+_hot_path_quiet: bool = False
+
+
+def set_hot_path_quiet(quiet: bool = True):
+    """Turns per-get tracing on or off for every device. Set events
+    are still logged while get tracing is off.
+
+    Args:
+        quiet (bool, optional): Whether to skip get tracing. Defaults
+        to True.
+    """
+    global _hot_path_quiet
+    _hot_path_quiet = quiet
+
+
+def hot_path_quiet() -> bool:
+    """Whether per-get tracing is currently turned off.
+
+    Returns:
+        bool: True if get events are being skipped.
+    """
+    return _hot_path_quiet
+
+
+def log_get(logger: logging.Logger, device: Any, property_: str):
+    """Logs a property read at DEBUG level. The message is only built
+    if it will actually be emitted.
+
+    Args:
+        logger (logging.Logger): The device logger.
+        device (Any): The device being read.
+        property_ (str): The name of the property being read.
+    """
+    if _hot_path_quiet or not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug(log_message_formatter("get", f"{device}", property_),
+                 stacklevel=2)
+
+
+def log_set(logger: logging.Logger, device: Any, property_: str,
+            value: Any = None, unit: str = None):
+    """Logs a property change at INFO level. The message is only built
+    if it will actually be emitted.
+
+    Args:
+        logger (logging.Logger): The device logger.
+        device (Any): The device being changed.
+        property_ (str): The name of the property being changed.
+        value (Any, optional): The new value. Defaults to None.
+        unit (str, optional): Units to append to the value, e.g. a
+        temperature scale. Defaults to None.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if unit is not None:
+        value = f"{value} {unit}"
+    logger.info(log_message_formatter("set", f"{device}", property_, value),
+                stacklevel=2)
@@ -1,9 +1,12 @@
 import logging
 
-from typing import Union
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 from devices import PhilipsHueLamp, NestThermostat, Refrigerator, \
     SmartPlug, WaterHeater  # noqa: F401
+from devices.devices import device_class
+from helpers.ids import new_ids
+from helpers.versions import next_version
 # from devices.water_heater import water_heater
 
 SupportedDevices = Union[
@@ -16,6 +19,9 @@ SupportedDevices = Union[
     # water_heater
 ]
 
+# Configuration keys handled by create_many rather than by setters.
+_constructor_keys = ("class", "device_id")
+
 SupportedDevicesString = [
     "PhilipsHueLamp",
     "Refrigerator",
@@ -26,6 +32,8 @@ SupportedDevicesString = [
     # "water_heater"
 ]
 
+SupportedDeviceTypes = [cls._device_type for cls in SupportedDevices.__args__]
+
 
 def device_factory(name: str = "", config: dict = None,
                    logger: logging.Logger = None) -> SupportedDevices:
@@ -36,13 +44,82 @@ def device_factory(name: str = "", config: dict = None,
         name (str, optional): The name of the class to create. Defaults
         to "".
 
+    Raises:
+        ValueError: If no device class has the name.
+
     Returns:
         SupportedDevices: The class of device specified by name.
     """
-    if name in SupportedDevicesString:
-        device = eval(f"{name}(logger=logger)")
+    device = device_class(name)(logger=logger)
 
     if config is not None:
         device.__from_json__(config)
 
     return device
+
+
+def _setter_plan(cls: type, keys: Tuple[str, ...],
+                 logger: logging.Logger) -> List[Tuple[str, Callable]]:
+    """Matches the keys of a configuration to the setters of a class,
+    warning once about keys the class cannot set. The setters are
+    unwrapped, since a device under construction has no observers and
+    only needs its version bumped once. As in __from_json__, the
+    class's leading properties are set first.
+    """
+    plan = []
+    for key in sorted(keys, key=lambda k: k not in cls._leading_properties):
+        if key in _constructor_keys:
+            continue
+        setter = cls._setters.get(key)
+        if setter is not None:
+            plan.append((key, getattr(setter, "__wrapped__", setter)))
+        elif logger is not None:
+            logger.warning(
+                f"abort set -- 'set_{key}' not in {cls._device_type}")
+    return plan
+
+
+def create_many(configs: Iterable[dict],
+                logger: logging.Logger = None) -> List[SupportedDevices]:
+    """Constructs devices from configurations, as listed under
+    "devices" in location configuration files. Each configuration names
+    its class under "class".
+
+    Devices share the logger. Ids are allocated in a single block for
+    configurations without a device_id, and each distinct set of keys
+    is matched to a class's setters once, so that constructing large
+    fleets costs little more than running the setters.
+
+    Args:
+        configs (Iterable[dict]): The device configurations. They are
+        not modified.
+        logger (logging.Logger, optional): The logger for the devices.
+        Defaults to None.
+
+    Raises:
+        ValueError: If a configuration names no known device class.
+
+    Returns:
+        List[SupportedDevices]: The devices, in configuration order.
+    """
+    configs = list(configs)
+    missing = sum(1 for config in configs if config.get("device_id") is None)
+    ids = iter(new_ids(missing))
+    plans: Dict[Tuple[str, Tuple[str, ...]], tuple] = {}
+    devices = []
+    for config in configs:
+        keys = tuple(config)
+        plan_key = (config.get("class"), keys)
+        plan = plans.get(plan_key)
+        if plan is None:
+            cls = device_class(config.get("class"))
+            plan = plans[plan_key] = (cls, _setter_plan(cls, keys, logger))
+        cls, setters = plan
+        device_id = config.get("device_id")
+        device = cls(device_id=device_id if device_id is not None
+                     else next(ids), logger=logger)
+        for key, setter in setters:
+            setter(device, config[key])
+        device._version = next_version()
+        devices.append(device)
+    return devices
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from typing import List, Union
+
+# Allocators whose per-process state must be reset in forked children.
+_live_allocators = weakref.WeakSet()
+
+
+class IdAllocator:
+    """Base class for unique identifier allocators. Allocators are
+    thread-safe, and reset any per-process state after a fork so that
+    worker processes never hand out each other's identifiers.
+    """
+
+    def __init__(self):
+        self._reset()
+        _live_allocators.add(self)
+
+    def _reset(self):
+        """Resets per-process state. Called on construction and in the
+        child after a fork.
+        """
+        self._lock = threading.Lock()
+
+    def allocate(self) -> str:
+        """Allocates a single identifier.
+
+        Returns:
+            str: A new unique identifier.
+        """
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> List[str]:
+        """Allocates a block of identifiers at once. Intended for
+        constructing large fleets of devices.
+
+        Args:
+            count (int): The number of identifiers to allocate.
+
+        Returns:
+            List[str]: The new unique identifiers.
+        """
+        raise NotImplementedError
+
+
+class CounterAllocator(IdAllocator):
+    """Allocates identifiers from a monotonic counter prefixed with a
+    node number. Identifiers are 16 hexadecimal digits: 6 for the node
+    and 10 for the counter. The counter starts from the current time in
+    milliseconds. That only keeps a later process which reuses a
+    process id clear of its predecessor's identifiers if the
+    predecessor allocated no more than one per millisecond it ran, so
+    give each process a distinct node where that cannot be ruled out.
+
+    Parameters:
+        node (int, optional): The node number, e.g. a worker index.
+        Defaults to the process id, which is distinct for every live
+        worker process on a host.
+    """
+    _node_bits = 24
+    _counter_bits = 40
+
+    def __init__(self, node: Union[int, None] = None):
+        self._fixed_node = node
+        super().__init__()
+
+    def _reset(self):
+        super()._reset()
+        node = os.getpid() if self._fixed_node is None else self._fixed_node
+        self._prefix = f"{node & ((1 << self._node_bits) - 1):06X}"
+        self._next = (time.time_ns() // 1_000_000) \
+            % (1 << self._counter_bits)
+
+    def allocate_many(self, count: int) -> List[str]:
+        with self._lock:
+            start = self._next
+            self._next += count
+        prefix = self._prefix
+        mask = (1 << self._counter_bits) - 1
+        return [f"{prefix}{n & mask:010X}"
+                for n in range(start, start + count)]
+
+
+class RandomAllocator(IdAllocator):
+    """Allocates random 64-bit identifiers, as 16 hexadecimal digits.
+    Nothing is remembered, so uniqueness rests on the 64-bit keyspace:
+    among n identifiers the odds of any collision are about
+    n * n / 2 ** 65, roughly 3 in 100 million for a million devices.
+    """
+
+    def allocate_many(self, count: int) -> List[str]:
+        raw = os.urandom(8 * count)
+        return [f"{int.from_bytes(raw[i:i + 8], 'big'):016X}"
+                for i in range(0, len(raw), 8)]
+
+
+class TimeOrderedAllocator(IdAllocator):
+    """Allocates UUIDv7-style identifiers which sort by creation time.
+
+    The layout follows RFC 9562: a 48-bit millisecond timestamp, the
+    version, a 12-bit sequence used to keep identifiers monotonic
+    within a millisecond, the variant, then 62 bits holding the process
+    id and per-process random bits, so that worker processes on the
+    same host can never produce the same identifier.
+    """
+    _sequence_bits = 12
+    _pid_bits = 22
+
+    def _reset(self):
+        super()._reset()
+        pid = os.getpid() & ((1 << self._pid_bits) - 1)
+        random_bits = 62 - self._pid_bits
+        salt = int.from_bytes(os.urandom(8), "big") & ((1 << random_bits) - 1)
+        self._tail = (pid << random_bits) | salt
+        self._last_ms = 0
+        self._sequence = 0
+
+    def allocate_many(self, count: int) -> List[str]:
+        if count <= 0:
+            return []
+        result = []
+        sequence_limit = 1 << self._sequence_bits
+        tail = self._tail
+        with self._lock:
+            ms = max(time.time_ns() // 1_000_000, self._last_ms)
+            sequence = self._sequence + 1 if ms == self._last_ms else 0
+            for _ in range(count):
+                if sequence >= sequence_limit:
+                    # Borrow from the next millisecond to stay monotonic.
+                    ms += 1
+                    sequence = 0
+                value = (ms << 80) | (0x7 << 76) | (sequence << 64) \
+                    | (0b10 << 62) | tail
+                result.append(str(uuid.UUID(int=value)))
+                sequence += 1
+            self._last_ms = ms
+            self._sequence = sequence - 1
+        return result
+
+
+_allocator_modes = {
+    "counter": CounterAllocator,
+    "random": RandomAllocator,
+    "uuid7": TimeOrderedAllocator
+}
+
+_default_allocator: IdAllocator = CounterAllocator()
+
+
+def set_id_allocator(allocator: Union[str, IdAllocator] = "counter"):
+    """Selects the allocator used for new device and location ids.
+
+    Args:
+        allocator (Union[str, IdAllocator], optional): An allocator, or
+        one of "counter", "random" or "uuid7". Defaults to "counter".
+    """
+    global _default_allocator
+    if isinstance(allocator, str):
+        if allocator not in _allocator_modes:
+            raise ValueError(
+                f"{allocator} not in {list(_allocator_modes.keys())}")
+        allocator = _allocator_modes[allocator]()
+    _default_allocator = allocator
+
+
+def get_id_allocator() -> IdAllocator:
+    """Getter for the allocator used for new ids.
+
+    Returns:
+        IdAllocator: The current allocator.
+    """
+    return _default_allocator
+
+
+def new_id() -> str:
+    """Allocates a new unique id from the current allocator.
+
+    Returns:
+        str: The new id.
+    """
+    return _default_allocator.allocate()
+
+
+def new_ids(count: int) -> List[str]:
+    """Allocates a block of new unique ids from the current allocator.
+
+    Args:
+        count (int): The number of ids to allocate.
+
+    Returns:
+        List[str]: The new ids.
+    """
+    return _default_allocator.allocate_many(count)
+
+
+def _reset_after_fork():
+    for allocator in list(_live_allocators):
+        allocator._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,383 @@
+import json
+import logging
+import queue
+import struct
+import threading
+import time
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, \
+    Sequence, Union
+
+_MAGIC = b"SHJ1"
+_header = struct.Struct("<dHH")
+_length = struct.Struct("<I")
+_int = struct.Struct("<q")
+_float = struct.Struct("<d")
+
+
+class JournalEntry(NamedTuple):
+    """A recorded change of a device property."""
+    timestamp: float
+    device_id: str
+    property: str
+    old: Any
+    new: Any
+
+
+class Journal():
+    """A fixed-size ring buffer of device property changes. Timestamps
+    and property codes are kept in typed arrays and device ids and
+    values as references, so recording a change is O(1) and formats
+    nothing. Once the buffer is full the oldest changes are overwritten,
+    unless spill_path is given, in which case the buffer is appended to
+    that file before it wraps. Spilled changes are copied out of the
+    buffer and handed to a background thread, which encodes and writes
+    them, so recording never waits on the disk. If the thread falls
+    more than max_pending buffers behind, further spills are dropped
+    and counted as lost.
+
+    Parameters:
+        capacity (int, optional): The number of changes kept in memory.
+        Defaults to 65536.
+        ignored (Iterable[str], optional): Properties which are not
+        recorded. Defaults to last_connected, which every API read
+        updates.
+        spill_path (str, optional): A file to append changes to before
+        they are overwritten. Defaults to None.
+        max_pending (int, optional): The most spilled buffers waiting to
+        be written. Defaults to 4.
+    """
+
+    def __init__(self, capacity: int = 65536,
+                 ignored: Iterable[str] = ("last_connected",),
+                 spill_path: Union[str, None] = None, max_pending: int = 4):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1.")
+        self._capacity = capacity
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._properties = array("H", bytes(2 * capacity))
+        self._device_ids: List[str] = [None] * capacity
+        self._old: List[Any] = [None] * capacity
+        self._new: List[Any] = [None] * capacity
+        self._property_names: List[str] = []
+        self._property_codes: Dict[str, int] = {}
+        self._count = 0
+        self._spilled = 0
+        self._lost = 0
+        self._last = 0.0
+        self._lock = threading.Lock()
+        self.ignored = frozenset(ignored)
+        self._spill_path = spill_path
+        self._pending = queue.Queue(max_pending)
+        self._writer: Union[threading.Thread, None] = None
+        self._writer_lock = threading.Lock()
+        self._spill_error: Union[Exception, None] = None
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    @property
+    def capacity(self) -> int:
+        """Getter for the number of changes kept in memory.
+
+        Returns:
+            int: The capacity of the buffer.
+        """
+        return self._capacity
+
+    @property
+    def recorded(self) -> int:
+        """Getter for the number of changes recorded since creation.
+
+        Returns:
+            int: The total number of recorded changes.
+        """
+        return self._count
+
+    @property
+    def lost(self) -> int:
+        """Getter for the number of changes overwritten before they
+        were spilled, or dropped because too many spills were waiting
+        to be written.
+
+        Returns:
+            int: The number of lost changes.
+        """
+        return self._lost
+
+    def _code(self, property_: str) -> int:
+        with self._lock:
+            code = self._property_codes.get(property_)
+            if code is None:
+                code = len(self._property_names)
+                self._property_names.append(property_)
+                self._property_codes[property_] = code
+            return code
+
+    def record(self, device_id: str, property_: str, old: Any, new: Any):
+        """Records a change.
+
+        Args:
+            device_id (str): The identifier of the changed device.
+            property_ (str): The name of the changed property.
+            old (Any): The value before the change.
+            new (Any): The value after the change.
+        """
+        code = self._property_codes.get(property_)
+        if code is None:
+            code = self._code(property_)
+        now = time.time()
+        with self._lock:
+            count = self._count
+            if count - self._spilled >= self._capacity:
+                if self._spill_path is not None:
+                    self._spill(self._spill_path)
+                else:
+                    self._lost += 1
+            # Keep timestamps ordered even if the clock steps back, so
+            # that time windows can be found by binary search.
+            if now < self._last:
+                now = self._last
+            self._last = now
+            slot = count % self._capacity
+            self._timestamps[slot] = now
+            self._properties[slot] = code
+            self._device_ids[slot] = device_id
+            self._old[slot] = old
+            self._new[slot] = new
+            self._count = count + 1
+            if self._spill_path is None:
+                self._spilled = max(self._spilled,
+                                    self._count - self._capacity)
+
+    def _entry(self, position: int) -> JournalEntry:
+        slot = position % self._capacity
+        return JournalEntry(
+            self._timestamps[slot], self._device_ids[slot],
+            self._property_names[self._properties[slot]],
+            self._old[slot], self._new[slot])
+
+    def _bisect(self, low: int, high: int, timestamp: float) -> int:
+        # The first position in [low, high) recorded at or after
+        # timestamp.
+        timestamps, capacity = self._timestamps, self._capacity
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle % capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, device_id: Union[str, None] = None,
+                since: Union[float, None] = None,
+                until: Union[float, None] = None) -> List[JournalEntry]:
+        """The changes held in memory, oldest first.
+
+        Args:
+            device_id (Union[str, None], optional): Only changes of
+            this device. Defaults to None, for every device.
+            since (Union[float, None], optional): Only changes recorded
+            at or after this time.time() timestamp. Defaults to None.
+            until (Union[float, None], optional): Only changes recorded
+            before this timestamp. Defaults to None.
+
+        Returns:
+            List[JournalEntry]: The matching changes.
+        """
+        with self._lock:
+            low = max(0, self._count - self._capacity)
+            high = self._count
+            if since is not None:
+                low = self._bisect(low, high, since)
+            if until is not None:
+                high = self._bisect(low, high, until)
+            if device_id is None:
+                return [self._entry(n) for n in range(low, high)]
+            ids, capacity = self._device_ids, self._capacity
+            return [self._entry(n) for n in range(low, high)
+                    if ids[n % capacity] == device_id]
+
+    def spill(self, path: Union[str, None] = None) -> int:
+        """Appends the changes not yet spilled to a binary file, see
+        read_journal, and waits until every spill so far is written.
+
+        Args:
+            path (Union[str, None], optional): The file. Defaults to the
+            journal's spill_path.
+
+        Raises:
+            ValueError: If no path is given and the journal has none.
+            OSError: If a spill could not be written.
+
+        Returns:
+            int: The number of changes written.
+        """
+        path = path if path is not None else self._spill_path
+        if path is None:
+            raise ValueError("No spill path given.")
+        with self._lock:
+            batch = self._take_batch(path)
+        # Waits for room rather than dropping, as the caller is willing
+        # to wait for the disk.
+        self._start_writer()
+        self._pending.put(batch)
+        self.flush()
+        return len(batch[1])
+
+    def flush(self):
+        """Blocks until every spilled change has been written.
+
+        Raises:
+            OSError: If a spill could not be written.
+        """
+        if self._writer is not None and self._writer.is_alive():
+            self._pending.join()
+        error, self._spill_error = self._spill_error, None
+        if error is not None:
+            raise error
+
+    def _spill(self, path: str) -> int:
+        # Called with the lock held, from record, so never waits.
+        batch = self._take_batch(path)
+        self._start_writer()
+        try:
+            self._pending.put_nowait(batch)
+        except queue.Full:
+            self._lost += len(batch[1])
+        return len(batch[1])
+
+    def _take_batch(self, path: str) -> tuple:
+        # Copies the changes not yet spilled out of the ring, so that
+        # they can be encoded without the lock.
+        start = max(self._spilled, self._count - self._capacity)
+        end = self._count
+        self._spilled = end
+        return (path, _ring_slice(self._timestamps, start, end),
+                _ring_slice(self._device_ids, start, end),
+                [self._property_names[code] for code in
+                 _ring_slice(self._properties, start, end)],
+                _ring_slice(self._old, start, end),
+                _ring_slice(self._new, start, end))
+
+    def _start_writer(self):
+        # Also restarts the thread in a forked child, where it is gone.
+        if self._writer is None or not self._writer.is_alive():
+            with self._writer_lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(
+                        target=self._write_batches, name="journal-writer",
+                        daemon=True)
+                    self._writer.start()
+
+    def _write_batches(self):
+        while True:
+            batch = self._pending.get()
+            try:
+                _write_batch(*batch)
+            except Exception as e:
+                logging.getLogger(__name__).exception(
+                    "journal spill failed")
+                if self._spill_error is None:
+                    self._spill_error = e
+            finally:
+                self._pending.task_done()
+
+
+def _ring_slice(ring: Sequence, start: int, end: int) -> list:
+    """The items at positions [start, end) of a ring buffer, copied."""
+    capacity = len(ring)
+    if start >= end:
+        return []
+    first, last = start % capacity, (end - 1) % capacity + 1
+    if first < last:
+        return list(ring[first:last])
+    return list(ring[first:]) + list(ring[:last])
+
+
+def _write_batch(path: str, timestamps: List[float], device_ids: List[str],
+                 properties: List[str], old: List[Any], new: List[Any]):
+    """Encodes spilled changes and appends them to a journal file."""
+    buffer = bytearray()
+    for entry in zip(timestamps, device_ids, properties, old, new):
+        _encode_entry(buffer, JournalEntry(*entry))
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            f.write(_MAGIC)
+        f.write(buffer)
+
+
+def _encode_value(buffer: bytearray, value: Any):
+    if value is None:
+        buffer += b"N"
+    elif value is True or value is False:
+        buffer += b"T" if value else b"F"
+    elif type(value) is int and -2**63 <= value < 2**63:
+        buffer += b"i" + _int.pack(value)
+    elif type(value) is float:
+        buffer += b"d" + _float.pack(value)
+    else:
+        if type(value) is str:
+            tag, data = b"s", value.encode()
+        else:
+            tag, data = b"j", json.dumps(value).encode()
+        buffer += tag + _length.pack(len(data)) + data
+
+
+def _encode_entry(buffer: bytearray, entry: JournalEntry):
+    device_id = str(entry.device_id).encode()
+    property_ = entry.property.encode()
+    buffer += _header.pack(entry.timestamp, len(device_id), len(property_))
+    buffer += device_id + property_
+    _encode_value(buffer, entry.old)
+    _encode_value(buffer, entry.new)
+
+
+def _decode_value(data: bytes, offset: int) -> tuple:
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag in (b"T", b"F"):
+        return tag == b"T", offset
+    if tag == b"i":
+        return _int.unpack_from(data, offset)[0], offset + _int.size
+    if tag == b"d":
+        return _float.unpack_from(data, offset)[0], offset + _float.size
+    if tag in (b"s", b"j"):
+        length = _length.unpack_from(data, offset)[0]
+        offset += _length.size
+        text = data[offset:offset + length].decode()
+        return (text if tag == b"s" else json.loads(text)), offset + length
+    raise ValueError(f"Unknown value tag {tag!r} in journal file.")
+
+
+def read_journal(path: str) -> Iterator[JournalEntry]:
+    """Reads the changes spilled to a journal file, oldest first.
+
+    Args:
+        path (str): The file.
+
+    Raises:
+        ValueError: If the file is not a journal file.
+
+    Returns:
+        Iterator[JournalEntry]: The changes.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(_MAGIC):
+        raise ValueError(f"{path} is not a journal file.")
+    offset = len(_MAGIC)
+    while offset < len(data):
+        timestamp, id_length, property_length = \
+            _header.unpack_from(data, offset)
+        offset += _header.size
+        device_id = data[offset:offset + id_length].decode()
+        offset += id_length
+        property_ = data[offset:offset + property_length].decode()
+        offset += property_length
+        old, offset = _decode_value(data, offset)
+        new, offset = _decode_value(data, offset)
+        yield JournalEntry(timestamp, device_id, property_, old, new)
@@ -0,0 +1,149 @@
+import json
+import re
+
+from typing import Any, Iterator, TextIO
+
+_whitespace = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class JSONStream():
+    """Reads a JSON document incrementally from a text file, so that
+    only the value being decoded, rather than the whole file, is held
+    in memory.
+
+    Containers are walked with members (objects) and elements (arrays),
+    which yield before each member or element. The caller must consume
+    it, with value, members or elements, before resuming the iterator.
+    Complete values are decoded with json's raw_decode as soon as their
+    text has been read.
+
+    Parameters:
+        f (TextIO): The file to read.
+        chunk_size (int, optional): Characters read at a time. Defaults
+        to 65536.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 16):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Reads more of the file, dropping the text already consumed.
+        Reads at least as much as is buffered, so that decoding a large
+        value is retried a logarithmic number of times.
+
+        Returns:
+            bool: False if the end of the file was reached.
+        """
+        if self._eof:
+            return False
+        remaining = self._buffer[self._position:]
+        text = self._file.read(max(self._chunk_size, len(remaining)))
+        if not text:
+            self._eof = True
+        self._buffer = remaining + text
+        self._position = 0
+        return not self._eof
+
+    def _peek(self) -> str:
+        """Skips whitespace and returns the next character, or "" at
+        the end of the file.
+        """
+        while True:
+            buffer = self._buffer
+            position = _whitespace.match(buffer, self._position).end()
+            self._position = position
+            if position < len(buffer):
+                return buffer[position]
+            if not self._fill():
+                return ""
+
+    def _expect(self, characters: str) -> str:
+        character = self._peek()
+        if not character or character not in characters:
+            raise ValueError(
+                f"Expected one of {characters!r} but found {character!r}.")
+        self._position += 1
+        return character
+
+    def value(self) -> Any:
+        """Decodes the next complete value.
+
+        Raises:
+            ValueError: If the value is not valid JSON.
+
+        Returns:
+            Any: The decoded value.
+        """
+        self._peek()
+        while True:
+            try:
+                result, end = _decoder.raw_decode(
+                    self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number may continue past the end of the buffer.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return result
+
+    def members(self) -> Iterator[str]:
+        """Walks the object starting at the next value.
+
+        Raises:
+            ValueError: If the next value is not an object.
+
+        Returns:
+            Iterator[str]: The key of each member, yielded before its
+            value is read.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key but found {key!r}.")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def elements(self) -> Iterator[int]:
+        """Walks the array starting at the next value.
+
+        Raises:
+            ValueError: If the next value is not an array.
+
+        Returns:
+            Iterator[int]: The index of each element, yielded before it
+            is read.
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self._position += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self._expect(",]") == "]":
+                return
+
+    def items(self) -> Iterator[Any]:
+        """Decodes the elements of the array starting at the next value,
+        one at a time.
+
+        Returns:
+            Iterator[Any]: The decoded elements.
+        """
+        for _ in self.elements():
+            yield self.value()
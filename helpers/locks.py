@@ -0,0 +1,68 @@
+import threading
+
+from contextlib import contextmanager
+
+
+class RWLock():
+    """A reader-writer lock. Any number of readers may hold the lock at
+    once, while a writer holds it alone. Writers take priority: once a
+    writer is waiting, new readers wait behind it, so a steady stream of
+    GET requests cannot starve a POST.
+
+    The lock is not reentrant. A thread holding it must not acquire it
+    again, in either mode.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        """Blocks until the lock can be shared with other readers."""
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """Releases a lock taken with acquire_read."""
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        """Blocks until the lock is held by no other reader or writer.
+        """
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        """Releases a lock taken with acquire_write."""
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """Context manager holding the lock for reading."""
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """Context manager holding the lock for writing."""
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
@@ -0,0 +1,228 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import weakref
+
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Dict, List, Union
+
+# Pipelines by logger name, so each logger gets exactly one.
+_pipelines: Dict[str, "LogPipeline"] = {}
+_pipelines_lock = threading.Lock()
+_live_pipelines = weakref.WeakSet()
+_stop = object()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A queue handler which never blocks the logging thread. Records
+    which do not fit in the queue are dropped and counted.
+    """
+
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The writer thread is in the same process, so the record is
+        # formatted there rather than copied and formatted here.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingRotatingFileHandler(RotatingFileHandler):
+    """A size-rotated file handler which leaves flushing to its caller,
+    so that a batch of records reaches the disk in as few writes as the
+    stream buffer allows.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class StandardErrorHandler(logging.StreamHandler):
+    """A stream handler writing to whatever sys.stderr is when a record
+    is written, rather than when the handler was created, so that later
+    redirection, e.g. by a test runner, is honoured.
+    """
+
+    def __init__(self, level: int = logging.NOTSET):
+        logging.Handler.__init__(self, level)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+
+class LogPipeline():
+    """Moves log output off the logging thread. Records go into a
+    bounded queue through handler, and a background thread writes them
+    to the output handlers in batches, flushing once per batch.
+
+    Parameters:
+        handlers (List[logging.Handler]): The output handlers. Each
+        keeps its own level and formatter.
+        queue_size (int, optional): The most records waiting to be
+        written before new records are dropped. Defaults to 10000.
+        batch_size (int, optional): The most records written between
+        flushes. Defaults to 256.
+    """
+
+    def __init__(self, handlers: List[logging.Handler],
+                 queue_size: int = 10000, batch_size: int = 256):
+        self._handlers = list(handlers)
+        self._queue = queue.Queue(queue_size)
+        self._handler = DroppingQueueHandler(self._queue)
+        self._batch_size = batch_size
+        self._start()
+        _live_pipelines.add(self)
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def handler(self) -> DroppingQueueHandler:
+        """Getter for the handler to attach to loggers.
+
+        Returns:
+            DroppingQueueHandler: The queueing handler.
+        """
+        return self._handler
+
+    @property
+    def handlers(self) -> List[logging.Handler]:
+        """Getter for the output handlers.
+
+        Returns:
+            List[logging.Handler]: The handlers records are written to.
+        """
+        return self._handlers
+
+    @property
+    def dropped(self) -> int:
+        """Getter for the number of records dropped because the queue
+        was full.
+
+        Returns:
+            int: The number of dropped records.
+        """
+        return self._handler.dropped
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self._batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            for record in batch:
+                if record is _stop:
+                    continue
+                for handler in self._handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self._handlers:
+                try:
+                    handler.flush()
+                except (OSError, ValueError):
+                    # The stream was closed under us; keep writing to
+                    # the other handlers.
+                    pass
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is _stop:
+                return
+
+    def flush(self):
+        """Blocks until every queued record has been written."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Writes the queued records, stops the writer thread and closes
+        the output handlers.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_stop)
+            self._thread.join()
+        for handler in self._handlers:
+            handler.close()
+
+
+def attach_pipeline(logger: logging.Logger, handlers: List[logging.Handler],
+                    queue_size: int = 10000) -> "LogPipeline":
+    """Routes a logger through a pipeline to the given handlers, unless
+    it already has one. Repeated calls for the same logger return the
+    existing pipeline, so handlers are never stacked.
+
+    Args:
+        logger (logging.Logger): The logger.
+        handlers (List[logging.Handler]): The output handlers, used only
+        when the logger has no pipeline yet.
+        queue_size (int, optional): See LogPipeline. Defaults to 10000.
+
+    Returns:
+        LogPipeline: The logger's pipeline.
+    """
+    with _pipelines_lock:
+        pipeline = _pipelines.get(logger.name)
+        if pipeline is None:
+            pipeline = LogPipeline(handlers, queue_size)
+            _pipelines[logger.name] = pipeline
+            logger.addHandler(pipeline.handler)
+        return pipeline
+
+
+def get_pipeline(logger: logging.Logger) -> Union["LogPipeline", None]:
+    """Getter for the pipeline of a logger.
+
+    Args:
+        logger (logging.Logger): The logger.
+
+    Returns:
+        Union[LogPipeline, None]: The pipeline, or None if the logger
+        has none.
+    """
+    return _pipelines.get(logger.name)
+
+
+def flush_logs():
+    """Blocks until every pipeline has written its queued records."""
+    for pipeline in list(_pipelines.values()):
+        pipeline.flush()
+
+
+def _shutdown():
+    for pipeline in list(_pipelines.values()):
+        pipeline.close()
+
+
+def _restart_after_fork():
+    # The writer threads do not survive a fork.
+    for pipeline in list(_live_pipelines):
+        pipeline._queue = queue.Queue(pipeline._queue.maxsize)
+        pipeline._handler.queue = pipeline._queue
+        pipeline._start()
+
+
+atexit.register(_shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -3,14 +3,23 @@ import os
 
 from typing import Union
 
-from logging import getLogger, Formatter, FileHandler, StreamHandler, \
-    Logger, WARNING, DEBUG, ERROR  # noqa: F401
+from logging import getLogger, Formatter, Logger, DEBUG, ERROR
+
+from helpers.logpipeline import BatchingRotatingFileHandler, \
+    StandardErrorHandler, attach_pipeline, get_pipeline
 
 
 def create_logger(filename: str = "default_logger.log",
                   file_log_level: int = DEBUG,
-                  standard_out_log_level: int = ERROR) -> Logger:
-    """Create a logger.
+                  standard_out_log_level: int = ERROR,
+                  max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 3) -> Logger:
+    """Create a logger, or update the levels of the one already created
+    for the same file.
+
+    Records are queued and written to the file and standard output by a
+    background thread, see helpers.logpipeline, so logging never waits
+    on I/O. The file is rotated when it reaches max_bytes.
 
     Args:
         filename (str, optional): The name to give the logger file.
@@ -19,24 +28,37 @@ def create_logger(filename: str = "default_logger.log",
         file. Defaults to DEBUG.
         standard_out_log_level (int, optional): The debug level to
         print to standard output. Defaults to WARNING.
+        max_bytes (int, optional): The size at which the file is
+        rotated. Defaults to 10 MiB.
+        backup_count (int, optional): The number of rotated files to
+        keep. Defaults to 3.
 
     Returns:
         Logger: The logger.
     """
     log = getLogger(filename)
     log.setLevel(file_log_level)
-    formatter = Formatter(
-        '%(asctime)s - %(filename)s - %(lineno)s - %(levelname)s - %(message)s')
-    fh = FileHandler(filename)
+    pipeline = get_pipeline(log)
+    if pipeline is None:
+        formatter = Formatter(
+            '%(asctime)s - %(filename)s - %(lineno)s - %(levelname)s - '
+            '%(message)s')
+        directory = os.path.dirname(filename)
+        if directory:
+            # Log directories, e.g. logs/, are not kept under version
+            # control.
+            os.makedirs(directory, exist_ok=True)
+        fh = BatchingRotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count)
+        fh.setFormatter(formatter)
+
+        ch = StandardErrorHandler()
+        ch.setFormatter(formatter)
+        pipeline = attach_pipeline(log, [fh, ch])
+
+    fh, ch = pipeline.handlers
     fh.setLevel(file_log_level)
-    fh.setFormatter(formatter)
-
-    ch = StreamHandler()
     ch.setLevel(standard_out_log_level)
-    ch.setFormatter(formatter)
-    log.addHandler(fh)
-    log.addHandler(ch)
-
     return log
 
 
@@ -0,0 +1,294 @@
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+
+from typing import Callable, Dict, Hashable, List, Tuple, Union
+
+# Runs an expired timer's callback, see TimerScheduler.add_dispatch.
+Dispatch = Callable[[Hashable, Callable[[], None]], bool]
+
+# The process-wide scheduler, see get_scheduler.
+_scheduler: Union["TimerScheduler", None] = None
+_scheduler_lock = threading.Lock()
+
+# Cancelled entries stay in the heap until they reach the top, or until
+# there are more of them than live timers plus this many.
+_compact_slack = 64
+
+
+class TimerScheduler():
+    """Holds expiry deadlines for many timers in a binary heap, each
+    under a key so that it can be cancelled or rescheduled. Scheduling
+    and rescheduling cost O(log n) and cancelling O(1). Cancelled
+    entries are marked and dropped when they reach the top of the heap,
+    or all at once when they outnumber the live timers.
+
+    run_due pops only the timers which have expired, so its cost grows
+    with the number of expiring timers rather than the number held. Once
+    started, the scheduler's daemon thread sleeps until the earliest
+    deadline and calls run_due itself. Callbacks run outside the
+    scheduler's lock, through the first dispatch function which accepts
+    them, e.g. to hold the lock of whoever owns the timer while the
+    callback changes state.
+
+    Parameters:
+        clock (Callable[[], float], optional): The time source, in
+        seconds since the epoch. Defaults to time.time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        # Entries are [deadline, sequence, key, callback], with callback
+        # None once cancelled. The sequence keeps equal deadlines in
+        # scheduling order and stops comparisons reaching the key.
+        self._heap: List[list] = []
+        self._timers: Dict[Hashable, list] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # References to the dispatch functions, see add_dispatch.
+        self._dispatchers: Tuple[Callable[[], Union[Dispatch, None]], ...] \
+            = ()
+        self._thread: Union[threading.Thread, None] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def schedule(self, key: Hashable, deadline: float,
+                 callback: Callable[[], None]):
+        """Schedules a callback for a deadline, replacing any timer
+        already held under the key.
+
+        Args:
+            key (Hashable): The key of the timer.
+            deadline (float): When the timer expires, on the scheduler's
+            clock.
+            callback (Callable[[], None]): Called once the timer expires.
+        """
+        entry = [deadline, next(self._sequence), key, callback]
+        with self._lock:
+            previous = self._timers.pop(key, None)
+            if previous is not None:
+                previous[3] = None
+            self._timers[key] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                # The thread may be sleeping towards a later deadline.
+                self._wakeup.notify()
+            self._compact()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancels the timer held under a key, if any.
+
+        Args:
+            key (Hashable): The key of the timer.
+
+        Returns:
+            bool: Whether there was a timer to cancel.
+        """
+        with self._lock:
+            entry = self._timers.pop(key, None)
+            if entry is None:
+                return False
+            entry[3] = None
+            self._compact()
+            return True
+
+    def deadline(self, key: Hashable) -> Union[float, None]:
+        """Getter for the deadline of a timer.
+
+        Args:
+            key (Hashable): The key of the timer.
+
+        Returns:
+            Union[float, None]: The deadline, or None if there is no
+            timer under the key.
+        """
+        entry = self._timers.get(key)
+        return None if entry is None else entry[0]
+
+    def next_deadline(self) -> Union[float, None]:
+        """Getter for the earliest deadline of any timer.
+
+        Returns:
+            Union[float, None]: The deadline, or None if there are no
+            timers.
+        """
+        with self._lock:
+            return self._next_deadline()
+
+    def add_dispatch(self, dispatch: Dispatch):
+        """Adds a function expired timers may be run through, called as
+        dispatch(key, callback). It returns whether it accepted the
+        timer, in which case it must have called the callback. Dispatch
+        functions are tried in the order they were added, and callbacks
+        none accepts are called directly. Bound methods are held weakly,
+        so that the scheduler does not keep their objects alive.
+
+        Args:
+            dispatch (Dispatch): The function.
+        """
+        if inspect.ismethod(dispatch):
+            reference = weakref.WeakMethod(dispatch)
+        else:
+            def reference():
+                return dispatch
+        with self._lock:
+            self._dispatchers = tuple(
+                r for r in self._dispatchers if r() is not None) \
+                + (reference,)
+
+    def remove_dispatch(self, dispatch: Dispatch) -> bool:
+        """Removes a function added with add_dispatch.
+
+        Args:
+            dispatch (Dispatch): The function.
+
+        Returns:
+            bool: Whether the function had been added.
+        """
+        with self._lock:
+            dispatchers = self._dispatchers
+            self._dispatchers = tuple(
+                r for r in dispatchers if r() not in (None, dispatch))
+            return any(r() == dispatch for r in dispatchers)
+
+    def run_due(self, now: Union[float, None] = None) -> int:
+        """Runs the callbacks of every timer which has expired, in
+        deadline order. A callback which raises does not stop the
+        others, and the first exception is raised once all have run.
+
+        Args:
+            now (Union[float, None], optional): The current time.
+            Defaults to the scheduler's clock.
+
+        Returns:
+            int: The number of timers which expired.
+        """
+        now = self._clock() if now is None else now
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                _, _, key, callback = heapq.heappop(heap)
+                if callback is not None:
+                    del self._timers[key]
+                    due.append((key, callback))
+        dispatchers = self._dispatchers
+        error = None
+        for key, callback in due:
+            try:
+                for reference in dispatchers:
+                    dispatch = reference()
+                    if dispatch is not None and dispatch(key, callback):
+                        break
+                else:
+                    callback()
+            except Exception as e:
+                error = e if error is None else error
+        if error is not None:
+            raise error
+        return len(due)
+
+    def start(self):
+        """Starts the daemon thread which runs timers as they expire,
+        unless it is already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="timer-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Union[float, None] = None):
+        """Stops the daemon thread. Timers are kept, and run again once
+        the scheduler is restarted.
+
+        Args:
+            timeout (Union[float, None], optional): Seconds to wait for
+            the thread. Defaults to waiting until it exits.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._wakeup.notify()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _next_deadline(self) -> Union[float, None]:
+        heap = self._heap
+        while heap and heap[0][3] is None:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._timers) + _compact_slack:
+            self._heap = [entry for entry in self._heap
+                          if entry[3] is not None]
+            heapq.heapify(self._heap)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._stopping:
+                    deadline = self._next_deadline()
+                    now = self._clock()
+                    if deadline is not None and deadline <= now:
+                        break
+                    self._wakeup.wait(
+                        None if deadline is None else deadline - now)
+                if self._stopping:
+                    return
+            try:
+                self.run_due()
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "timer callback failed")
+
+    def _after_fork(self):
+        # Neither the lock's state nor the thread survives a fork.
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        running, self._thread = self._thread is not None, None
+        if running and not self._stopping:
+            self.start()
+
+
+def get_scheduler() -> TimerScheduler:
+    """Getter for the process-wide scheduler, which is created and
+    started on first use.
+
+    Returns:
+        TimerScheduler: The scheduler.
+    """
+    global _scheduler
+    scheduler = _scheduler
+    if scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TimerScheduler()
+                _scheduler.start()
+            scheduler = _scheduler
+    return scheduler
+
+
+def _restart_after_fork():
+    global _scheduler_lock
+    _scheduler_lock = threading.Lock()
+    if _scheduler is not None:
+        _scheduler._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
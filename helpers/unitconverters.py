@@ -1,50 +1,160 @@
-def kelvin_to_celsius(value: float = 0) -> float:
+import numpy as np
+
+from typing import Sequence, Union
+
+# A temperature, or many of them at once. The single-scale converters
+# are plain arithmetic, so they take floats and NumPy arrays alike.
+Temperatures = Union[float, np.ndarray]
+
+_scales = ("K", "C", "F")
+
+
+def kelvin_to_celsius(value: Temperatures = 0) -> Temperatures:
     """Converts a value from Kelvin temperature scale to Celsius
     temperature scale.
 
     Args:
-        value (float, optional): The value to convert. Defaults to 0.
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
 
     Returns:
-        float: The equivalent value in Celsius.
+        Temperatures: The equivalent value in Celsius.
     """
     return value - 273.15
 
 
-def celsius_to_kelvin(value: float = 0) -> float:
+def celsius_to_kelvin(value: Temperatures = 0) -> Temperatures:
     """Converts a value from Celsius temperature scale to Kelvin
     temperature scale.
 
     Args:
-        value (float, optional): The value to convert. Defaults to 0.
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
 
     Returns:
-        float: The equivalent value in Kelvin.
+        Temperatures: The equivalent value in Kelvin.
     """
     return value + 273.15
 
 
-def celsius_to_fahrenheit(value: float = 0) -> float:
+def celsius_to_fahrenheit(value: Temperatures = 0) -> Temperatures:
     """Converts a value from Celsius temperature scale to Fahrenheit
     temperature scale.
 
     Args:
-        value (float, optional): The value to convert. Defaults to 0.
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
 
     Returns:
-        float: The equivalent value in Fahrenheit.
+        Temperatures: The equivalent value in Fahrenheit.
     """
     return value * (9/5) + 32
 
 
-def fahrenheit_to_celsius(value: float = 0) -> float:
+def fahrenheit_to_celsius(value: Temperatures = 0) -> Temperatures:
     """Converts a value from Fahrenheit temperature scale to Celsius
     temperature scale.
 
     Args:
-        value (float, optional): The value to convert. Defaults to 0.
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
 
     Returns:
-        float: The equivalent value in Celsius.
+        Temperatures: The equivalent value in Celsius.
     """
     return (value - 32) * (5/9)
+
+
+def kelvin_to_fahrenheit(value: Temperatures = 0) -> Temperatures:
+    """Converts a value from Kelvin temperature scale to Fahrenheit
+    temperature scale in one call, rounding as Kelvin to Celsius to
+    Fahrenheit would.
+
+    Args:
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
+
+    Returns:
+        Temperatures: The equivalent value in Fahrenheit.
+    """
+    return (value - 273.15) * (9/5) + 32
+
+
+def fahrenheit_to_kelvin(value: Temperatures = 0) -> Temperatures:
+    """Converts a value from Fahrenheit temperature scale to Kelvin
+    temperature scale in one call, rounding as Fahrenheit to Celsius
+    to Kelvin would.
+
+    Args:
+        value (Temperatures, optional): The value to convert. Defaults
+        to 0.
+
+    Returns:
+        Temperatures: The equivalent value in Kelvin.
+    """
+    return (value - 32) * (5/9) + 273.15
+
+
+# The converter for each pair of scales, and the same arithmetic as
+# in-place ufunc steps for arrays, so both round identically.
+_converters = {
+    ("K", "C"): (kelvin_to_celsius, ((np.subtract, 273.15),)),
+    ("C", "K"): (celsius_to_kelvin, ((np.add, 273.15),)),
+    ("C", "F"): (celsius_to_fahrenheit,
+                 ((np.multiply, 9/5), (np.add, 32))),
+    ("F", "C"): (fahrenheit_to_celsius,
+                 ((np.subtract, 32), (np.multiply, 5/9))),
+    ("K", "F"): (kelvin_to_fahrenheit,
+                 ((np.subtract, 273.15), (np.multiply, 9/5), (np.add, 32))),
+    ("F", "K"): (fahrenheit_to_kelvin,
+                 ((np.subtract, 32), (np.multiply, 5/9), (np.add, 273.15)))
+}
+
+
+def convert(values: Union[Temperatures, Sequence[float]], from_scale: str,
+            to_scale: str, out: np.ndarray = None) -> Temperatures:
+    """Converts temperatures between the "K", "C" and "F" scales. A
+    float is converted by the matching single-value converter and
+    returned as a float. Anything else is converted as a NumPy array of
+    floats, in place in a single result array, with no per-value Python
+    work.
+
+    Args:
+        values (Union[Temperatures, Sequence[float]]): The temperatures
+        to convert.
+        from_scale (str): The scale of values.
+        to_scale (str): The scale to convert to.
+        out (np.ndarray, optional): An array to write the result to,
+        which may be values itself. Defaults to a new array.
+
+    Raises:
+        ValueError: If either scale is unknown.
+
+    Returns:
+        Temperatures: The converted temperatures.
+    """
+    if from_scale == to_scale:
+        if from_scale not in _scales:
+            raise ValueError(f"Unknown temperature scale {from_scale!r}.")
+        if out is not None:
+            out[...] = values
+            return out
+        kind = type(values)
+        return values if kind is float or kind is int \
+            else np.asarray(values, dtype=float)
+    try:
+        converter, steps = _converters[from_scale, to_scale]
+    except KeyError:
+        raise ValueError(f"Unknown temperature scales {from_scale!r} "
+                         f"and {to_scale!r}.") from None
+    kind = type(values)
+    if (kind is float or kind is int) and out is None:
+        return converter(values)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0 and out is None:
+        return float(converter(values))
+    (ufunc, constant), *rest = steps
+    result = ufunc(values, constant, out=out)
+    for ufunc, constant in rest:
+        ufunc(result, constant, out=result)
+    return result
@@ -0,0 +1,29 @@
+import itertools
+import threading
+
+# Process-wide, monotonically increasing version numbers. Every device
+# mutation takes a new number, so any two changes can be ordered.
+_counter = itertools.count(1)
+_current: int = 0
+_lock = threading.Lock()
+
+
+def next_version() -> int:
+    """Allocates the next version number.
+
+    Returns:
+        int: A version number greater than every one returned before.
+    """
+    global _current
+    with _lock:
+        _current = next(_counter)
+        return _current
+
+
+def current_version() -> int:
+    """The most recently allocated version number.
+
+    Returns:
+        int: The high-water mark, or 0 if no versions were allocated.
+    """
+    return _current
@@ -0,0 +1,2 @@
+# Need __init__.py file to tell Python this is a module.
+from simulation.thermal import ThermalSimulation  # noqa: F401
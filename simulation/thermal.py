@@ -0,0 +1,306 @@
+import math
+
+import numpy as np
+
+from typing import Callable, Dict, Iterable, List, Sequence, Union
+
+from devices import NestThermostat
+from helpers.locks import RWLock
+from helpers.unitconverters import convert
+
+# Minutes in a day, the period of the outdoor temperature cycle.
+DAY = 1440.0
+
+
+class ThermalSimulation():
+    """Simulates the ambient temperature of many thermostats at once.
+    Device state is held in NumPy arrays, in Kelvin, and every step
+    advances all of them with a handful of array operations.
+
+    Each step, the temperature drifts towards the outdoor temperature
+    in proportion to the difference, and the HVAC heats towards the
+    heating setpoint or cools towards the cooling setpoint at a fixed
+    rate, without overshooting. The outdoor temperature follows a daily
+    cycle, peaking mid-afternoon, plus a fixed offset per thermostat.
+
+    load reads the thermostats' state into the arrays and store writes
+    the ambient temperatures back through set_ambient_temperature, so
+    observers, versions and caches see the change. advance does both
+    around a run of steps. store also hands each thermostat whether it
+    is heating or cooling and its time to target, so those properties
+    are lookups until the thermostat next changes. Given lock_for, e.g.
+    HoneywellHome._lock_for, store makes its writes under the write
+    lock of each thermostat's location, as a patch would, so readers
+    never see a thermostat part way through an update.
+
+    Parameters:
+        thermostats (Sequence[NestThermostat]): The thermostats.
+        outdoor_temperature (float, optional): The mean outdoor
+        temperature, in Kelvin. Defaults to 283.15.
+        outdoor_swing (float, optional): Half the daily outdoor range,
+        in Kelvin. Defaults to 5.
+        outdoor_spread (float, optional): The standard deviation of the
+        per-thermostat outdoor offset, in Kelvin. Defaults to 0.
+        leak_rate (float, optional): The fraction of the indoor-outdoor
+        difference lost per minute. Defaults to 0.01.
+        heating_rate (float, optional): Kelvin per minute while heating.
+        Defaults to NestThermostat._degrees_per_minute.
+        cooling_rate (float, optional): Kelvin per minute while cooling.
+        Defaults to NestThermostat._degrees_per_minute.
+        start (float, optional): The minute of the day to start at.
+        Defaults to 0, midnight.
+        seed (int, optional): Seed for the outdoor offsets. Defaults to
+        None.
+        lock_for (Callable[[NestThermostat], RWLock], optional): Returns
+        the lock guarding a thermostat's state. Defaults to writing
+        without a lock, for thermostats no other thread uses.
+    """
+
+    def __init__(self, thermostats: Sequence[NestThermostat],
+                 outdoor_temperature: float = 283.15,
+                 outdoor_swing: float = 5.0, outdoor_spread: float = 0.0,
+                 leak_rate: float = 0.01,
+                 heating_rate: Union[float, None] = None,
+                 cooling_rate: Union[float, None] = None,
+                 start: float = 0.0, seed: Union[int, None] = None,
+                 lock_for: Callable[[NestThermostat], RWLock] = None):
+        self._thermostats = list(thermostats)
+        self._lock_for = lock_for
+        count = len(self._thermostats)
+        default_rate = NestThermostat._degrees_per_minute
+        self._outdoor_temperature = outdoor_temperature
+        self._outdoor_swing = outdoor_swing
+        self._outdoor_offset = np.random.default_rng(seed).normal(
+            0.0, outdoor_spread, count) if outdoor_spread else np.zeros(count)
+        self._leak_rate = np.full(count, leak_rate)
+        self._heating_rate = np.full(
+            count, default_rate if heating_rate is None else heating_rate)
+        self._cooling_rate = np.full(
+            count, default_rate if cooling_rate is None else cooling_rate)
+        self._minute = start
+        self._ambient = np.zeros(count)
+        self._heat_setpoint = np.full(count, -np.inf)
+        self._cool_setpoint = np.full(count, np.inf)
+        self._heating = np.zeros(count, dtype=bool)
+        self._cooling = np.zeros(count, dtype=bool)
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._thermostats)
+
+    @property
+    def minute(self) -> float:
+        """Getter for the simulated time.
+
+        Returns:
+            float: Minutes since midnight of the first day.
+        """
+        return self._minute
+
+    @property
+    def ambient(self) -> np.ndarray:
+        """Getter for the simulated ambient temperatures.
+
+        Returns:
+            np.ndarray: The temperatures, in Kelvin, in thermostat
+            order.
+        """
+        return self._ambient
+
+    @property
+    def heating(self) -> np.ndarray:
+        """Getter for which thermostats heated in the last step.
+
+        Returns:
+            np.ndarray: A boolean array, in thermostat order.
+        """
+        return self._heating
+
+    @property
+    def cooling(self) -> np.ndarray:
+        """Getter for which thermostats cooled in the last step.
+
+        Returns:
+            np.ndarray: A boolean array, in thermostat order.
+        """
+        return self._cooling
+
+    def outdoor(self, minute: Union[float, None] = None) -> np.ndarray:
+        """The outdoor temperature of every thermostat.
+
+        Args:
+            minute (Union[float, None], optional): The time, in minutes
+            since midnight of the first day. Defaults to now.
+
+        Returns:
+            np.ndarray: The temperatures, in Kelvin.
+        """
+        minute = self._minute if minute is None else minute
+        # Coldest at 03:00 and warmest at 15:00.
+        cycle = -math.cos(2 * math.pi * (minute - 180.0) / DAY)
+        return self._outdoor_temperature + self._outdoor_swing * cycle \
+            + self._outdoor_offset
+
+    def load(self):
+        """Reads the ambient temperatures, HVAC modes and setpoints of
+        the thermostats, e.g. after they were changed through the API.
+        """
+        thermostats = self._thermostats
+        count = len(thermostats)
+
+        def read(slot: str) -> np.ndarray:
+            return np.fromiter((getattr(t, slot) for t in thermostats),
+                               float, count)
+
+        self._ambient = read("_ambient_temperature")
+        setpoints = {}
+        modes = np.array([t._hvac_mode for t in thermostats], dtype=object)
+        heat = np.full(count, -np.inf)
+        cool = np.full(count, np.inf)
+        for mode, slots in NestThermostat._mode_setpoints.items():
+            selected = modes == mode
+            for setpoint, slot in zip((heat, cool), slots):
+                if slot is not None:
+                    if slot not in setpoints:
+                        setpoints[slot] = read(slot)
+                    setpoint[selected] = setpoints[slot][selected]
+        # A band given high-to-low still heats below and cools above it.
+        self._heat_setpoint = np.minimum(heat, cool)
+        self._cool_setpoint = np.where(np.isfinite(heat) & np.isfinite(cool),
+                                       np.maximum(heat, cool), cool)
+        can_heat = np.fromiter((t.can_heat for t in thermostats), bool, count)
+        can_cool = np.fromiter((t.can_cool for t in thermostats), bool, count)
+        self._heat_setpoint[~can_heat] = -np.inf
+        self._cool_setpoint[~can_cool] = np.inf
+        self._heating = self._ambient < self._heat_setpoint
+        self._cooling = self._ambient > self._cool_setpoint
+
+    def step(self, minutes: float = 1.0, steps: int = 1):
+        """Advances the simulation without touching the thermostats.
+
+        Args:
+            minutes (float, optional): The length of each step, in
+            minutes. Defaults to 1.
+            steps (int, optional): The number of steps. Defaults to 1.
+        """
+        ambient = self._ambient
+        heat_setpoint, cool_setpoint = self._heat_setpoint, \
+            self._cool_setpoint
+        leak = self._leak_rate * minutes
+        heat_step = self._heating_rate * minutes
+        cool_step = self._cooling_rate * minutes
+        for _ in range(steps):
+            ambient += leak * (self.outdoor() - ambient)
+            heating = ambient < heat_setpoint
+            cooling = ambient > cool_setpoint
+            ambient += np.where(
+                heating, np.minimum(heat_step, heat_setpoint - ambient), 0.0)
+            ambient -= np.where(
+                cooling, np.minimum(cool_step, ambient - cool_setpoint), 0.0)
+            self._minute += minutes
+        if steps:
+            self._heating, self._cooling = heating, cooling
+
+    def rate(self) -> np.ndarray:
+        """The rate of change of every thermostat's temperature, given
+        the outdoor temperature now and whether it heated or cooled in
+        the last step.
+
+        Returns:
+            np.ndarray: The rates, in Kelvin per minute.
+        """
+        return self._leak_rate * (self.outdoor() - self._ambient) \
+            + np.where(self._heating, self._heating_rate, 0.0) \
+            - np.where(self._cooling, self._cooling_rate, 0.0)
+
+    def time_to_target(self) -> np.ndarray:
+        """The time for every thermostat to reach the setpoint it is
+        heating or cooling towards at the current rate of change. It is
+        zero for thermostats which are within their setpoints and
+        infinite for those moving away from their setpoint.
+
+        Returns:
+            np.ndarray: The times, in minutes.
+        """
+        ambient = self._ambient
+        target = np.clip(ambient, self._heat_setpoint, self._cool_setpoint)
+        distance = target - ambient
+        rate = self.rate()
+        minutes = np.full(len(ambient), np.inf)
+        reaching = distance * rate > 0
+        minutes[reaching] = distance[reaching] / rate[reaching]
+        minutes[distance == 0] = 0.0
+        return minutes
+
+    def store(self, tolerance: float = 1e-6) -> int:
+        """Writes the simulated ambient temperatures back to the
+        thermostats, in each thermostat's temperature scale. Only
+        temperatures which moved by more than tolerance are written.
+        Every thermostat is then given whether it is heating or cooling
+        and the option of its time_to_target, computed for the whole
+        fleet at once, see NestThermostat._store_thermal_state, and
+        observers are only told of thermostats whose properties change.
+
+        Args:
+            tolerance (float, optional): The smallest change written, in
+            Kelvin. Defaults to 1e-6.
+
+        Returns:
+            int: The number of thermostats updated.
+        """
+        thermostats = self._thermostats
+        current = np.fromiter((t._ambient_temperature for t in thermostats),
+                              float, len(thermostats))
+        changed = np.flatnonzero(np.abs(self._ambient - current) > tolerance)
+        kelvin = self._ambient[changed]
+        # Converted to every scale up front, as a thermostat's scale is
+        # only read once its lock is held.
+        values = {scale: convert(kelvin, "K", scale).tolist()
+                  for scale in NestThermostat._temperature_scales}
+        positions = dict(zip(changed.tolist(), range(len(changed))))
+        options = np.searchsorted(NestThermostat._time_to_target_bounds,
+                                  self.time_to_target(), side="right")
+        states = list(zip(self._heating.tolist(), self._cooling.tolist(),
+                          options.tolist()))
+        if self._lock_for is None:
+            self._write(range(len(thermostats)), positions, values, states)
+            return len(changed)
+        # Each lock is taken once, for all of its thermostats.
+        groups = {}
+        for index, thermostat in enumerate(thermostats):
+            lock = self._lock_for(thermostat)
+            groups.setdefault(id(lock), (lock, []))[1].append(index)
+        for lock, indices in groups.values():
+            with lock.write():
+                self._write(indices, positions, values, states)
+        return len(changed)
+
+    def _write(self, indices: Iterable[int], positions: Dict[int, int],
+               values: Dict[str, List[float]], states: List[tuple]):
+        """Writes the ambient temperatures and thermal states of some
+        of the thermostats, for store.
+        """
+        thermostats = self._thermostats
+        for index in indices:
+            thermostat = thermostats[index]
+            position = positions.get(index)
+            if position is not None:
+                thermostat.set_ambient_temperature(
+                    values[thermostat._temperature_scale][position])
+            thermostat._store_thermal_state(*states[index])
+
+    def advance(self, minutes: float, step: float = 1.0) -> int:
+        """Reads the thermostats, simulates a period and writes the
+        ambient temperatures back.
+
+        Args:
+            minutes (float): The period to simulate, in minutes.
+            step (float, optional): The step length, in minutes.
+            Defaults to 1.
+
+        Returns:
+            int: The number of thermostats updated.
+        """
+        self.load()
+        self.step(step, int(round(minutes / step)))
+        return self.store()
@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import importlib
+import logging
+import os
+import pickle
+
+from typing import BinaryIO, Iterator, Tuple
+
+from devices.devices import device_classes
+from smarthome.loader import iter_locations
+from smarthome.location import Location
+
+# Bump when the layout of cache files changes.
+CACHE_FORMAT = 1
+
+# Modules, besides those of the device classes, whose code shapes the
+# state held in caches.
+_source_modules = (
+    "helpers.factories",
+    "helpers.unitconverters",
+    "smarthome.configcache",
+    "smarthome.loader",
+    "smarthome.location"
+)
+
+
+class _Pickler(pickle.Pickler):
+    """Stores loggers by reference, to be replaced on loading."""
+
+    def persistent_id(self, obj):
+        return "logger" if isinstance(obj, logging.Logger) else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f: BinaryIO, logger: logging.Logger = None):
+        super().__init__(f)
+        self._logger = logger
+
+    def persistent_load(self, persistent_id):
+        if persistent_id != "logger":
+            raise pickle.UnpicklingError(
+                f"Unknown persistent id {persistent_id!r}.")
+        return self._logger
+
+
+def code_version() -> str:
+    """A fingerprint of the code a cache depends on: the cache format,
+    the state layout of every device class, and the source of the
+    modules which turn configurations into device state, i.e. those
+    defining device classes and their bases, and _source_modules. Any
+    change to it makes existing caches stale.
+
+    Returns:
+        str: The fingerprint.
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    modules = set(_source_modules)
+    for name, cls in sorted(device_classes().items()):
+        digest.update(f"{cls.__module__}.{name}:"
+                      f"{','.join(cls._state_slots)};".encode())
+        modules.update(base.__module__ for base in cls.__mro__)
+    for module in sorted(modules):
+        digest.update(f"{module}:{_source_hash(module)};".encode())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash(module: str) -> str:
+    # Modules are not reloaded, so each is hashed once per process.
+    filename = getattr(importlib.import_module(module), "__file__", None)
+    # Built in modules, e.g. that of object, have no source.
+    return "" if filename is None else file_hash(filename)
+
+
+def file_hash(filename: str) -> str:
+    """The SHA-256 digest of a file, read in blocks.
+
+    Args:
+        filename (str): The file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(filename: str) -> str:
+    """The path of the compiled cache of a configuration file, which is
+    stored next to it.
+
+    Args:
+        filename (str): The configuration file.
+
+    Returns:
+        str: The cache file path.
+    """
+    return filename + ".cache"
+
+
+def _cache_key(filename: str) -> Tuple[str, str]:
+    return file_hash(filename), code_version()
+
+
+def _read_key(f: BinaryIO) -> Tuple[str, str]:
+    try:
+        return pickle.load(f)
+    except Exception:
+        # Unreadable or truncated caches are rebuilt.
+        return None
+
+
+def _read_locations(f: BinaryIO,
+                    logger: logging.Logger) -> Iterator[Location]:
+    while True:
+        try:
+            fields = pickle.load(f)
+        except EOFError:
+            return
+        location = Location(logger=logger)
+        location.__from_json__(fields)
+        for device in _Unpickler(f, location._logger).load():
+            location.append(device)
+        yield location
+
+
+def _write_locations(filename: str, path: str, key: Tuple[str, str],
+                     logger: logging.Logger) -> Iterator[Location]:
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            for location in iter_locations(filename, logger):
+                pickle.dump(
+                    {name: location._getters[name](location)
+                     for name in location._persistable},
+                    f, pickle.HIGHEST_PROTOCOL)
+                _Pickler(f, pickle.HIGHEST_PROTOCOL).dump(location._devices)
+                yield location
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def load_locations(filename: str, logger: logging.Logger = None,
+                   use_cache: bool = True) -> Iterator[Location]:
+    """Loads the locations of a configuration file from its compiled
+    cache, see cache_path. The cache holds every device's converted
+    state in pickled form, so devices are restored without parsing JSON
+    or running their setters. It is used only if both the hash of the
+    configuration file and code_version match the ones it was built
+    with. Otherwise the file is streamed with iter_locations and the
+    cache is rebuilt as locations are loaded.
+
+    Caches are pickles, so they must be as trusted as the code; they
+    are only ever read from next to the configuration file.
+
+    Args:
+        filename (str): The configuration file.
+        logger (logging.Logger, optional): The logger for locations and
+        devices. Defaults to None.
+        use_cache (bool, optional): Whether to read and write the
+        cache. Defaults to True.
+
+    Returns:
+        Iterator[Location]: The locations, each yielded once loaded.
+    """
+    if not use_cache:
+        yield from iter_locations(filename, logger)
+        return
+    path = cache_path(filename)
+    key = _cache_key(filename)
+    try:
+        f = open(path, "rb")
+    except OSError:
+        f = None
+    if f is not None:
+        with f:
+            if _read_key(f) == key:
+                yield from _read_locations(f, logger)
+                return
+    yield from _write_locations(filename, path, key, logger)
@@ -0,0 +1,168 @@
+from typing import Dict, ValuesView, Union
+
+from helpers.factories import SupportedDevices
+
+# Shared empty bucket for lookups that must not create one. Never
+# mutated.
+_empty: Dict[int, SupportedDevices] = {}
+
+
+class DeviceIndex():
+    """Hash indexes over a collection of devices, keyed by device_id,
+    device_type and location (room). Buckets are keyed by object
+    identity so that devices sharing an id are still tracked
+    separately. Type and room buckets are kept once created, and are
+    created by by_type and by_room when first looked up, so the views
+    they return stay live as devices come and go.
+    """
+    _indexed_properties = ("device_id", "device_type", "location")
+
+    def __init__(self):
+        self._by_id: Dict[str, Dict[int, SupportedDevices]] = {}
+        self._by_type: Dict[str, Dict[int, SupportedDevices]] = {}
+        self._by_room: Dict[str, Dict[int, SupportedDevices]] = {}
+
+    def __len__(self) -> int:
+        """The number of indexed devices.
+
+        Returns:
+            int: The number of devices.
+        """
+        return sum(len(bucket) for bucket in self._by_type.values())
+
+    @staticmethod
+    def _add(index: dict, key: str, device: SupportedDevices):
+        bucket = index.get(key)
+        if bucket is None:
+            index[key] = bucket = {}
+        bucket[id(device)] = device
+
+    @staticmethod
+    def _remove(index: dict, key: str, device: SupportedDevices,
+                prune: bool = False):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(id(device), None)
+            if prune and not bucket:
+                del index[key]
+
+    @staticmethod
+    def _bucket(index: dict, key: str) -> Dict[int, SupportedDevices]:
+        bucket = index.get(key)
+        if bucket is None:
+            index[key] = bucket = {}
+        return bucket
+
+    def _index_for(self, property_: str) -> dict:
+        if property_ == "device_id":
+            return self._by_id
+        elif property_ == "device_type":
+            return self._by_type
+        return self._by_room
+
+    def add(self, device: SupportedDevices):
+        """Adds a device to the indexes.
+
+        Args:
+            device (SupportedDevices): The device to add.
+        """
+        self._add(self._by_id, device.device_id, device)
+        self._add(self._by_type, device.device_type, device)
+        self._add(self._by_room, device.location, device)
+
+    def discard(self, device: SupportedDevices):
+        """Removes a device from the indexes, if present.
+
+        Args:
+            device (SupportedDevices): The device to remove.
+        """
+        self._remove(self._by_id, device.device_id, device, prune=True)
+        self._remove(self._by_type, device.device_type, device)
+        self._remove(self._by_room, device.location, device)
+
+    def update(self, device: SupportedDevices, property_: str,
+               old: str, new: str):
+        """Moves a device between buckets after an indexed property
+        changes. Changes to other properties are ignored.
+
+        Args:
+            device (SupportedDevices): The device that changed.
+            property_ (str): The name of the property that changed.
+            old (str): The previous value of the property.
+            new (str): The new value of the property.
+        """
+        if property_ not in self._indexed_properties:
+            return
+        index = self._index_for(property_)
+        self._remove(index, old, device, prune=index is self._by_id)
+        self._add(index, new, device)
+
+    def by_id(self, device_id: str) -> Union[SupportedDevices, None]:
+        """Looks up a device by its identifier. If several devices share
+        the id, the first one added is returned.
+
+        Args:
+            device_id (str): The id to look up.
+
+        Returns:
+            Union[SupportedDevices, None]: The device, or None.
+        """
+        bucket = self._by_id.get(device_id)
+        if not bucket:
+            return None
+        return next(iter(bucket.values()))
+
+    def by_type(self, device_type: str) -> ValuesView:
+        """A live view of the devices of a given type.
+
+        Args:
+            device_type (str): The device type, e.g. "Thermostat".
+
+        Returns:
+            ValuesView: The matching devices.
+        """
+        return self._bucket(self._by_type, device_type).values()
+
+    def by_room(self, room: str) -> ValuesView:
+        """A live view of the devices in a given room.
+
+        Args:
+            room (str): The room, i.e. the device location.
+
+        Returns:
+            ValuesView: The matching devices.
+        """
+        return self._bucket(self._by_room, room).values()
+
+    def find(self, property_: str, value: str) -> ValuesView:
+        """The devices whose indexed property currently has a value.
+        Unlike by_type and by_room, a lookup for a value never seen
+        creates no bucket, so the result is only live if a bucket
+        already existed. Suited to lookups on untrusted values, e.g.
+        from a request.
+
+        Args:
+            property_ (str): The indexed property, one of
+            _indexed_properties.
+            value (str): The value to match.
+
+        Returns:
+            ValuesView: The matching devices.
+        """
+        return self._index_for(property_).get(value, _empty).values()
+
+    def types(self) -> list:
+        """The device types currently indexed.
+
+        Returns:
+            list: The device types.
+        """
+        return [k for k, bucket in self._by_type.items() if bucket]
+
+    def rooms(self) -> list:
+        """The rooms currently indexed.
+
+        Returns:
+            list: The rooms.
+        """
+        return [k for k, bucket in self._by_room.items() if bucket]
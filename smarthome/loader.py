@@ -0,0 +1,53 @@
+import logging
+
+from typing import Iterator
+
+from helpers.factories import create_many
+from helpers.jsonstream import JSONStream
+from smarthome.location import Location
+
+
+def iter_locations(filename: str, logger: logging.Logger = None,
+                   batch_size: int = 1000) -> Iterator[Location]:
+    """Loads the locations of a configuration file one at a time,
+    streaming the file rather than reading it whole. Devices are built
+    in batches as they are read, so memory is bounded by the location
+    being loaded rather than by the file.
+
+    Args:
+        filename (str): The configuration file, holding a list of
+        locations.
+        logger (logging.Logger, optional): The logger for locations and
+        devices. Defaults to None.
+        batch_size (int, optional): Device configurations decoded before
+        they are built. Defaults to 1000.
+
+    Raises:
+        ValueError: If the file is not a list of location objects.
+
+    Returns:
+        Iterator[Location]: The locations, each yielded once loaded.
+    """
+    with open(filename) as f:
+        stream = JSONStream(f)
+        for _ in stream.elements():
+            location = Location(logger=logger)
+            # Devices share the location's logger, which defaults to
+            # the smart home log when logger is None.
+            device_logger = location._logger
+            fields = {}
+            for key in stream.members():
+                if key != "devices":
+                    fields[key] = stream.value()
+                    continue
+                batch = []
+                for config in stream.items():
+                    batch.append(config)
+                    if len(batch) >= batch_size:
+                        for device in create_many(batch, device_logger):
+                            location.append(device)
+                        batch = []
+                for device in create_many(batch, device_logger):
+                    location.append(device)
+            location.__from_json__(fields)
+            yield location
@@ -1,14 +1,19 @@
 import json
 import logging
-import time
 
-from typing import List, Union
+from typing import Any, Callable, List, Union, ValuesView
 
-from helpers.factories import SupportedDevices, device_factory
+from helpers.accessors import AccessorRegistry
+from helpers.factories import SupportedDevices, SupportedDeviceTypes, \
+    create_many
+from helpers.ids import new_id
+from helpers.locks import RWLock
 from helpers.misc import create_logger
+from helpers.versions import next_version
+from smarthome.index import DeviceIndex
 
 
-class Location():
+class Location(AccessorRegistry):
     """A class to represent a location on a Honeywell Home network.
     Configurations can be saved and reloaded through a config file.
 
@@ -23,7 +28,7 @@ class Location():
     def __init__(self, logger: logging.Logger = None):
         # TODO: Need to convert from pascalCase to snake_case on input.
         self.set_logger(logger)
-        self.set_location_id(hash(time.time()))
+        self.set_location_id(new_id())
         self.set_name("None")
         self.set_street_address("None")
         self.set_city("None")
@@ -32,6 +37,11 @@ class Location():
         self.set_zipcode("None")
 
         self._devices: List[SupportedDevices] = []
+        self._index = DeviceIndex()
+        self._observers = ()
+        self._version = next_version()
+        # Held by servers while reading or patching devices here.
+        self._lock = RWLock()
 
     def __from_json__(self, json_data: dict):
         """Sets the location information from a JSON-like object.
@@ -42,17 +52,15 @@ class Location():
         # Set up the device properties.
         available_devices = json_data.pop("devices", None)
         if available_devices is not None:
-            for config in available_devices:
-                device = device_factory(config.pop(
-                    "class"), config, self._logger)
-                self._devices.append(device)
+            for device in create_many(available_devices, self._logger):
+                self.append(device)
 
         # Set the home properties.
-        properties = dir(self)
-        for k in json_data.keys():
-            parameter = f"set_{k}"
-            if parameter in properties:
-                eval(f"self.{parameter}(json_data['{k}'])")
+        for k, v in json_data.items():
+            setter = self._setters.get(k)
+            if setter is not None:
+                setter(self, v)
+        self._version = next_version()
 
     def __getitem__(self, key: Union[str, int]) -> SupportedDevices:
         """Getter for items in the collection. Supports indexing by
@@ -65,15 +73,11 @@ class Location():
         Returns:
             SupportedDevices: The device(s) matching the criteria.
         """
-        # Search by device id
-
-        if isinstance(key, str) and key in ["Thermostat", "Light", "Plug",
-                                            "Refrigerator", "WaterHeater"]:
-            return [d for d in self._devices if d.device_type == key]
-        elif isinstance(key, str):
-            for device in self._devices:
-                if device.device_id == key:
-                    return device
+        # Search by device type, then by device id.
+        if isinstance(key, str):
+            if key in SupportedDeviceTypes or key in self._index.types():
+                return self._index.by_type(key)
+            return self._index.by_id(key)
         # Search by index.
         elif isinstance(key, int):
             return self._devices[key]
@@ -127,6 +131,87 @@ class Location():
             device (SupportedDevices): The device to add.
         """
         self._devices.append(device)
+        self._index.add(device)
+        device.add_observer(self._device_changed)
+        self._notify(device, "append")
+
+    def remove(self, device: SupportedDevices):
+        """Remove a device from the list of devices.
+
+        Args:
+            device (SupportedDevices): The device to remove.
+        """
+        self._devices.remove(device)
+        self._index.discard(device)
+        device.remove_observer(self._device_changed)
+        self._notify(device, "remove")
+
+    def add_observer(self, observer: Callable):
+        """Registers a callback to be notified when devices are added
+        to, removed from or changed in this location. The callback is
+        called as observer(location, device, event, property_, old, new)
+        where event is "append", "remove" or "change". property_, old
+        and new are only set for "change" events.
+
+        Args:
+            observer (Callable): The callback to register.
+        """
+        self._observers = self._observers + (observer,)
+
+    def remove_observer(self, observer: Callable):
+        """Unregisters a callback added with add_observer.
+
+        Args:
+            observer (Callable): The callback to remove.
+        """
+        self._observers = tuple(o for o in self._observers if o != observer)
+
+    def _notify(self, device: SupportedDevices, event: str,
+                property_: str = None, old: Any = None, new: Any = None):
+        self._version = next_version()
+        for observer in self._observers:
+            observer(self, device, event, property_, old, new)
+
+    def _device_changed(self, device: SupportedDevices, property_: str,
+                        old: Any, new: Any):
+        """Observer for devices in this location. Keeps the indexes up
+        to date when a device's id, type or room changes.
+        """
+        self._index.update(device, property_, old, new)
+        self._notify(device, "change", property_, old, new)
+
+    def by_id(self, device_id: str) -> Union[SupportedDevices, None]:
+        """Looks up a device in this location by id.
+
+        Args:
+            device_id (str): The id of the device.
+
+        Returns:
+            Union[SupportedDevices, None]: The device, or None.
+        """
+        return self._index.by_id(device_id)
+
+    def by_type(self, device_type: str) -> ValuesView:
+        """A live view of the devices of one type in this location.
+
+        Args:
+            device_type (str): The device type, e.g. "Thermostat".
+
+        Returns:
+            ValuesView: The matching devices.
+        """
+        return self._index.by_type(device_type)
+
+    def by_room(self, room: str) -> ValuesView:
+        """A live view of the devices in one room of this location.
+
+        Args:
+            room (str): The room, as stored in each device's location.
+
+        Returns:
+            ValuesView: The matching devices.
+        """
+        return self._index.by_room(room)
 
     @ property
     def city(self) -> str:
@@ -171,11 +256,11 @@ class Location():
         """
         return self._location_id
 
-    def set_location_id(self, location_id: int):
+    def set_location_id(self, location_id: str):
         """Setter for location_id.
 
         Args:
-            location_id (int): The value to set location_id to.
+            location_id (str): The value to set location_id to.
         """
         self._location_id = location_id
 
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import threading
+import unittest
+import logging
+
+from hamcrest import assert_that, equal_to, is_, contains_string
+from webservers import HoneywellHome
+from webservers.asgi import AsyncHoneywellHome
+
+
+def asgi_request(app, method, path, body=None, headers=None):
+    """Sends a single request to an ASGI app and collects the response.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode())
+                    for k, v in (headers or {}).items()]
+    }
+    if body is not None:
+        body = json.dumps(body).encode()
+    messages = [{"type": "http.request", "body": body or b""}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return (sent[0]["status"],
+            {k.decode(): v.decode() for k, v in sent[0]["headers"]},
+            b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+class TestAsyncHoneywellServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    def setUp(self):
+        self.home = HoneywellHome(config_filename="configs/default-home.json",
+                                  config_cache=False)
+        self.app = AsyncHoneywellHome(self.home)
+        self.client = self.home.test_client()
+
+    def assert_parity(self, method, path, body=None, headers=None):
+        flask_response = self.client.open(
+            path, method=method, json=body, headers=headers)
+        status, asgi_headers, asgi_body = asgi_request(
+            self.app, method, path, body, headers)
+        assert_that(status, is_(equal_to(flask_response.status_code)))
+        if status == 200:
+            assert_that(json.loads(asgi_body),
+                        is_(equal_to(flask_response.json)))
+        if "ETag" in flask_response.headers:
+            assert_that(asgi_headers["etag"],
+                        is_(equal_to(flask_response.headers["ETag"])))
+        return status, asgi_headers, asgi_body
+
+    def test_get_parity(self):
+        for path in ["/", "/locations", "/devices", "/devices/Thermostat",
+                     "/devices/Light", "/devices/Light/2345",
+                     "/devices/Thermostat/1234", "/devices/Plug/1234",
+                     "/devices/Light/missing", "/devices/Light/2345/x",
+                     "/missing", "/devices/bulk", "/devices?since=x"]:
+            self.assert_parity("GET", path)
+
+    def test_since_parity(self):
+        # Plugs and refrigerators randomize readings, so only compare
+        # which devices are returned.
+        flask_json = self.client.get("/devices?since=0").json
+        _, _, body = asgi_request(self.app, "GET", "/devices?since=0")
+        asgi_json = json.loads(body)
+        assert_that(asgi_json["version"], is_(equal_to(flask_json["version"])))
+        assert_that(set(asgi_json["devices"]),
+                    is_(equal_to(set(flask_json["devices"]))))
+
+    def test_conditional_get(self):
+        _, headers, _ = self.assert_parity("GET", "/devices/Light/2345")
+        status, _, body = self.assert_parity(
+            "GET", "/devices/Light/2345",
+            headers={"If-None-Match": headers["etag"]})
+        assert_that(status, is_(equal_to(304)))
+        assert_that(body, is_(equal_to(b"")))
+
+    def test_post_parity(self):
+        self.assert_parity("POST", "/devices/Light/2345",
+                           {"brightness": 0.25})
+        self.assert_parity("POST", "/devices/Light/missing", {})
+        self.assert_parity("POST", "/devices/Light/2345",
+                           {"device_id": "9999"})
+        self.assert_parity("GET", "/devices/Light/9999")
+        self.assert_parity("POST", "/devices", {})
+        self.assert_parity("POST", "/devices/stream", {})
+        status, _, body = asgi_request(
+            self.app, "POST", "/devices/bulk",
+            [{"selector": {"device_type": "Light"}, "patch": {"name": "A"}}])
+        assert_that(status, is_(equal_to(200)))
+        assert_that(json.loads(body)[0]["devices"]["9999"]["name"],
+                    is_(equal_to("A")))
+
+    def test_stream(self):
+        async def run():
+            received = asyncio.Queue()
+            disconnect = asyncio.Event()
+            scope = {"type": "http", "method": "GET",
+                     "path": "/devices/stream",
+                     "query_string": b"device_id=2345", "headers": []}
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                await received.put(message)
+
+            task = asyncio.ensure_future(self.app(scope, receive, send))
+            assert_that((await received.get())["status"], is_(equal_to(200)))
+            assert_that((await received.get())["body"].decode(),
+                        contains_string("connected"))
+
+            self.home.update_device("Light", "2345", {"name": "Streamed"})
+            frame = (await asyncio.wait_for(received.get(), 1))["body"]
+            assert_that(frame.decode(), contains_string("event: change"))
+            assert_that(frame.decode(), contains_string("Streamed"))
+
+            disconnect.set()
+            await asyncio.wait_for(task, 1)
+            assert_that(len(self.home._broadcaster), is_(equal_to(0)))
+
+        asyncio.run(run())
+
+    def test_post_off_loop(self):
+        # A POST waiting for a location's write lock must not stall the
+        # event loop.
+        async def run():
+            sent = []
+            scope = {"type": "http", "method": "POST",
+                     "path": "/devices/Light/2345", "query_string": b"",
+                     "headers": []}
+
+            async def receive():
+                return {"type": "http.request",
+                        "body": json.dumps({"name": "Waited"}).encode()}
+
+            async def send(message):
+                sent.append(message)
+
+            lamp = self.home.find_device("Light", "2345")
+            lock = self.home._lock_for(lamp)
+            with lock.read():
+                task = asyncio.ensure_future(self.app(scope, receive, send))
+                await asyncio.sleep(0.05)
+                assert_that(task.done(), is_(False))
+            await asyncio.wait_for(task, 1)
+            assert_that(sent[0]["status"], is_(equal_to(200)))
+            assert_that(lamp.name, is_(equal_to("Waited")))
+
+        asyncio.run(run())
+
+    def test_write_lock_does_not_stall_loop(self):
+        # While a writer holds a location's lock, streams, /metrics and
+        # cached GETs are still served, and only a cache miss waits.
+        home = HoneywellHome(config_filename="configs/simple.json",
+                             config_cache=False, stream_keepalive=0.01)
+        app = AsyncHoneywellHome(home)
+        lamp = home.find_device("Light", "1234")
+        lock = home._lock_for(lamp)
+        held, release = threading.Event(), threading.Event()
+
+        def writer():
+            with lock.write():
+                held.set()
+                release.wait(5)
+
+        async def request(path, query=b""):
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": b""}
+
+            async def send(message):
+                sent.append(message)
+
+            await app({"type": "http", "method": "GET", "path": path,
+                       "query_string": query, "headers": []},
+                      receive, send)
+            return sent[0]["status"]
+
+        async def stream():
+            chunks = asyncio.Queue()
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                await chunks.put(message.get("body", b""))
+
+            task = asyncio.ensure_future(app(
+                {"type": "http", "method": "GET", "path": "/devices/stream",
+                 "query_string": b"", "headers": []}, receive, send))
+            return task, chunks, disconnect
+
+        async def run():
+            assert_that(await request("/devices/Light/1234"),
+                        is_(equal_to(200)))
+            task, chunks, disconnect = await stream()
+            thread = threading.Thread(target=writer)
+            thread.start()
+            try:
+                held.wait(5)
+                assert_that(await asyncio.wait_for(
+                    request("/metrics"), 1), is_(equal_to(200)))
+                assert_that(await asyncio.wait_for(
+                    request("/devices/Light/1234"), 1), is_(equal_to(200)))
+                while b"keepalive" not in await asyncio.wait_for(
+                        chunks.get(), 1):
+                    pass
+                miss = asyncio.ensure_future(
+                    request("/devices", b"since=0"))
+                await asyncio.sleep(0.05)
+                assert_that(miss.done(), is_(False))
+            finally:
+                release.set()
+                thread.join(5)
+            assert_that(await asyncio.wait_for(miss, 1), is_(equal_to(200)))
+            disconnect.set()
+            await asyncio.wait_for(task, 1)
+
+        asyncio.run(run())
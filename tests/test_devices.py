@@ -1,9 +1,14 @@
 import os
+import time
 import unittest
 
+from datetime import datetime, timedelta
+
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL  # noqa: F401
-from hamcrest import assert_that, equal_to, is_, string_contains_in_order, not_
+from hamcrest import assert_that, equal_to, is_, string_contains_in_order, \
+    not_, same_instance
 
+from devices import WaterHeater
 from devices.devices import SmartDevice
 from helpers.misc import create_logger, path_relative_to_root
 
@@ -89,6 +94,27 @@ class TestDevices(unittest.TestCase):
         assert_that(api_keys, is_(
             equal_to(self.default_constructor._api_return_parameters)))
 
+    def test_timer_status(self):
+        """Test that a device timer turns the device off when it expires,
+        and that changing the status cancels it.
+        """
+        device = self.default_constructor
+        timeout = (datetime.now() + timedelta(seconds=0.05)).isoformat()
+        device.set_timer_timeout(timeout)
+        assert_that(device.status, is_(equal_to("timer")))
+        assert_that(device.timer_timeout, is_(equal_to(timeout)))
+        stop = time.monotonic() + 5
+        while device.status == "timer" and time.monotonic() < stop:
+            time.sleep(0.01)
+        assert_that(device.status, is_(equal_to("off")))
+        assert_that(device.timer_timeout, is_(equal_to(None)))
+
+        device.set_timer_timeout(
+            (datetime.now() + timedelta(minutes=5)).isoformat())
+        device.set_status("on")
+        assert_that(device.timer_timeout, is_(equal_to(None)))
+        assert_that(device.status, is_(equal_to("on")))
+
     def test_set_location(self):
         """Test ability to set location.
         """
@@ -96,6 +122,37 @@ class TestDevices(unittest.TestCase):
         assert_that(self.default_constructor.location,
                     is_(equal_to("New Location")))
 
+    def test_compact_layout(self):
+        """Test that devices have no instance dictionary and share
+        common values.
+        """
+        assert_that(hasattr(self.default_constructor, "__dict__"),
+                    is_(False))
+        self.default_constructor.set_location("".join(["Hall", "way"]))
+        assert_that(self.default_constructor._location,
+                    is_(same_instance(self.non_default_constructor._location)))
+        assert_that(self.default_constructor._software_version, is_(
+            same_instance(self.non_default_constructor._software_version)))
+
+        heater = WaterHeater(logger=self._logger)
+        heater.set_location("".join(["Hall", "way"]))
+        heater.set_name("".join(["Device", "1"]))
+        assert_that(heater._location,
+                    is_(same_instance(self.non_default_constructor._location)))
+        assert_that(heater._name,
+                    is_(same_instance(self.non_default_constructor._name)))
+
+    def test_water_heater_timer(self):
+        """Test that water heaters share the device timer handling.
+        """
+        heater = WaterHeater(logger=self._logger)
+        heater.set_timer_timeout(
+            (datetime.now() + timedelta(minutes=5)).isoformat())
+        assert_that(heater.status, is_(equal_to("timer")))
+        heater.set_status("on")
+        assert_that(heater.timer_timeout, is_(equal_to(None)))
+        assert_that(heater.status, is_(equal_to("on")))
+
 
 if __name__ == "__main__":
     unittest.main()
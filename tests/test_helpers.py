@@ -1,14 +1,23 @@
+import io
 import os
 import json
 import logging
+import threading
 import unittest
 
-from hamcrest import assert_that, close_to, is_, equal_to, \
-    string_contains_in_order
+from hamcrest import assert_that, close_to, is_, equal_to, instance_of, \
+    less_than, same_instance, string_contains_in_order
+
+import numpy as np
 
 from helpers.unitconverters import (celsius_to_fahrenheit, celsius_to_kelvin,
-                                    kelvin_to_celsius, fahrenheit_to_celsius)
+                                    kelvin_to_celsius, fahrenheit_to_celsius,
+                                    convert)
 
+from helpers.jsonstream import JSONStream
+from helpers.logpipeline import DroppingQueueHandler, LogPipeline, \
+    flush_logs, get_pipeline
+from helpers.devicelog import log_get, log_set, set_hot_path_quiet
 from helpers.misc import create_logger, log_message_formatter, json_from_file, \
     path_relative_to_root, get_device_translations  # noqa: F401
 
@@ -72,6 +81,29 @@ class TestTemperatureConverters(unittest.TestCase):
                 kelvin_to_celsius(k), is_(close_to(c, self._tolerance))
             )
 
+    def test_convert(self):
+        """Test conversion of scalars and arrays between any scales.
+        """
+        temps = {"K": self._temps_k, "C": self._temps_c, "F": self._temps_f}
+        for from_scale, values in temps.items():
+            for to_scale, expected in temps.items():
+                converted = convert(values, from_scale, to_scale)
+                assert_that(converted, is_(instance_of(np.ndarray)))
+                assert_that(np.allclose(converted, expected, rtol=0,
+                                        atol=1e-9), is_(True))
+                # Scalars stay floats and round like the arrays.
+                scalar = convert(float(values[3]), from_scale, to_scale)
+                assert_that(scalar, is_(instance_of(float)))
+                assert_that(scalar, is_(equal_to(converted[3])))
+
+        readings = np.array(self._temps_k, dtype=float)
+        assert_that(convert(readings, "K", "F", out=readings),
+                    is_(same_instance(readings)))
+        assert_that(readings.tolist(), is_(equal_to(
+            convert(self._temps_k, "K", "F").tolist())))
+        with self.assertRaises(ValueError):
+            convert(1.0, "K", "R")
+
 
 class TestMiscellaneousFunctions(unittest.TestCase):
     @classmethod
@@ -94,20 +126,59 @@ class TestMiscellaneousFunctions(unittest.TestCase):
             filename="test-logger.log",
             file_log_level=file_level,
             standard_out_log_level=stream_level)
-        file_handlers = [
-            h for h in logger.handlers if isinstance(h, logging.FileHandler)]
-        stream_handlers = [
-            h for h in logger.handlers if isinstance(h, logging.StreamHandler)]
-        assert_that(len(file_handlers), is_(equal_to(1)))
-        assert_that(file_handlers[0].level, is_(equal_to(file_level)))
-        # File handler is subclass of stream handler.
-        assert_that(len(stream_handlers), is_(equal_to(2)))
-        assert_that(stream_handlers[1].level, is_(equal_to(stream_level)))
-
-        # TODO: Finish writing this test. Possibly check that creating a
-        # second logger does not interfere with the first.
+        # Records go through a single queue handler to the writer
+        # thread's file and stream handlers.
+        assert_that(len(logger.handlers), is_(equal_to(1)))
+        assert_that(logger.handlers[0],
+                    is_(instance_of(DroppingQueueHandler)))
+        fh, ch = get_pipeline(logger).handlers
+        assert_that(fh, is_(instance_of(logging.FileHandler)))
+        assert_that(fh.level, is_(equal_to(file_level)))
+        assert_that(ch.level, is_(equal_to(stream_level)))
 
-        pass
+        # Creating it again updates the levels without stacking handlers.
+        logger = create_logger(
+            filename="test-logger.log",
+            file_log_level=logging.DEBUG,
+            standard_out_log_level=stream_level)
+        assert_that(len(logger.handlers), is_(equal_to(1)))
+        assert_that(fh.level, is_(equal_to(logging.DEBUG)))
+
+        flush_logs()
+        start = os.path.getsize(fh.baseFilename)
+        logger.debug("create logger marker")
+        flush_logs()
+        with open(fh.baseFilename) as f:
+            f.seek(start)
+            assert_that(f.read().count("create logger marker"),
+                        is_(equal_to(1)))
+
+    def test_log_pipeline_drops_when_full(self):
+        """Tests that a full queue drops records instead of blocking.
+        """
+        release = threading.Event()
+
+        class _BlockingHandler(_RecordingHandler):
+            def emit(self, record):
+                release.wait()
+                super().emit(record)
+
+        handler = _BlockingHandler()
+        pipeline = LogPipeline([handler], queue_size=2, batch_size=1)
+        logger = logging.getLogger("test-log-pipeline")
+        logger.propagate = False
+        logger.addHandler(pipeline.handler)
+        try:
+            for n in range(10):
+                logger.error("record %d", n)
+            release.set()
+            pipeline.flush()
+        finally:
+            logger.removeHandler(pipeline.handler)
+            pipeline.close()
+        written = len(handler.records)
+        assert_that(written, is_(less_than(10)))
+        assert_that(written + pipeline.dropped, is_(equal_to(10)))
 
     def test_log_message_formatter(self):
         """Tests logger message formatting.
@@ -147,6 +218,72 @@ class TestMiscellaneousFunctions(unittest.TestCase):
         """
         pass
 
+    def test_json_stream(self):
+        """Tests incremental decoding across small read chunks.
+        """
+        document = [{"name": "a", "devices": [{"n": 12345}, {"n": 1.5e3}]},
+                    {"devices": [], "name": "b\\u00e9", "x": [True, None]}]
+        stream = JSONStream(io.StringIO(json.dumps(document, indent=2)),
+                            chunk_size=3)
+        result = []
+        for _ in stream.elements():
+            location = {}
+            for key in stream.members():
+                if key == "devices":
+                    location[key] = list(stream.items())
+                else:
+                    location[key] = stream.value()
+            result.append(location)
+        assert_that(result, is_(equal_to(document)))
+
+        with self.assertRaises(ValueError):
+            list(JSONStream(io.StringIO('[1, 2')).items())
+
+
+class _RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestDeviceLog(unittest.TestCase):
+    def setUp(self):
+        self.handler = _RecordingHandler()
+        self.logger = logging.getLogger("test-device-log")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        set_hot_path_quiet(False)
+
+    def test_disabled_levels_are_skipped(self):
+        """Tests that get events are dropped above DEBUG while set
+        events are still written at INFO.
+        """
+        self.logger.setLevel(logging.INFO)
+        log_get(self.logger, "[device_id: 1234]", "name")
+        log_set(self.logger, "[device_id: 1234]", "name", "abcd")
+        assert_that(len(self.handler.records), is_(equal_to(1)))
+        assert_that(self.handler.records[0].getMessage(),
+                    string_contains_in_order("set", "1234", "name", "'abcd'"))
+
+    def test_hot_path_quiet(self):
+        """Tests that hot path quiet mode drops get events only.
+        """
+        self.logger.setLevel(logging.DEBUG)
+        log_get(self.logger, "[device_id: 1234]", "name")
+        set_hot_path_quiet(True)
+        log_get(self.logger, "[device_id: 1234]", "name")
+        log_set(self.logger, "[device_id: 1234]", "temperature", 20, "C")
+        messages = [r.getMessage() for r in self.handler.records]
+        assert_that(len(messages), is_(equal_to(2)))
+        assert_that(messages[1], string_contains_in_order(
+            "set", "temperature", "20 C"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,95 @@
+import os
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to, is_, has_length
+
+from helpers.ids import CounterAllocator, RandomAllocator, \
+    TimeOrderedAllocator, set_id_allocator, get_id_allocator, new_id
+
+
+class TestIdAllocators(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._allocators = [CounterAllocator, RandomAllocator,
+                           TimeOrderedAllocator]
+        cls._count = 10000
+
+    def test_unique_within_process(self):
+        """Tests that single and bulk allocations never repeat.
+        """
+        for allocator_class in self._allocators:
+            allocator = allocator_class()
+            ids = [allocator.allocate() for _ in range(self._count)]
+            ids += allocator.allocate_many(self._count)
+            assert_that(len(set(ids)), is_(equal_to(2 * self._count)))
+
+    def test_unique_across_threads(self):
+        """Tests that concurrent allocation never repeats.
+        """
+        for allocator_class in self._allocators:
+            allocator = allocator_class()
+            results = []
+
+            def worker():
+                results.extend(allocator.allocate_many(1000))
+                results.extend(allocator.allocate() for _ in range(1000))
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert_that(len(set(results)), is_(equal_to(16000)))
+
+    def test_time_ordered(self):
+        """Tests that time-ordered ids sort in allocation order.
+        """
+        allocator = TimeOrderedAllocator()
+        ids = allocator.allocate_many(5000)
+        ids += [allocator.allocate() for _ in range(100)]
+        assert_that(ids, is_(equal_to(sorted(ids))))
+
+    def test_counter_node_prefix(self):
+        """Tests that counter ids carry the node prefix.
+        """
+        ids = CounterAllocator(node=0xABC).allocate_many(3)
+        for id_ in ids:
+            assert_that(id_, has_length(16))
+            assert_that(id_[:6], is_(equal_to("000ABC")))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_unique_across_processes(self):
+        """Tests that a forked worker does not repeat the parent's ids.
+        """
+        for allocator_class in self._allocators:
+            allocator = allocator_class()
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                os.write(write_fd, "\n".join(
+                    allocator.allocate_many(1000)).encode())
+                os._exit(0)
+            os.close(write_fd)
+            parent_ids = allocator.allocate_many(1000)
+            with os.fdopen(read_fd) as f:
+                child_ids = f.read().split("\n")
+            os.waitpid(pid, 0)
+            assert_that(len(set(parent_ids + child_ids)), is_(equal_to(2000)))
+
+    def test_set_id_allocator(self):
+        """Tests selecting the allocator by mode name.
+        """
+        previous = get_id_allocator()
+        try:
+            set_id_allocator("uuid7")
+            assert_that(new_id(), has_length(36))
+            with self.assertRaises(ValueError):
+                set_id_allocator("sequential")
+        finally:
+            set_id_allocator(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
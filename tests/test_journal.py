@@ -0,0 +1,110 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+from hamcrest import assert_that, contains_exactly, equal_to, is_
+
+from devices import PhilipsHueLamp
+from devices.devices import set_change_journal
+from helpers import journal as journal_module
+from helpers.journal import Journal, read_journal
+
+
+class TestJournal(unittest.TestCase):
+    _logger = logging.getLogger("test-journal")
+
+    def test_query_by_device(self):
+        journal = Journal(capacity=8)
+        journal.record("a", "name", "x", "y")
+        journal.record("b", "name", "x", "z")
+        journal.record("a", "status", "off", "on")
+        entries = journal.entries(device_id="a")
+        assert_that([(e.property, e.old, e.new) for e in entries],
+                    contains_exactly(("name", "x", "y"),
+                                     ("status", "off", "on")))
+
+    def test_query_by_time(self):
+        journal = Journal(capacity=8)
+        for n in range(6):
+            journal.record("a", "brightness", n, n + 1)
+        timestamps = [e.timestamp for e in journal.entries()]
+        window = journal.entries(since=timestamps[2], until=timestamps[4])
+        assert_that(window, is_(equal_to(
+            [e for e in journal.entries()
+             if timestamps[2] <= e.timestamp < timestamps[4]])))
+
+    def test_overwrites_oldest(self):
+        journal = Journal(capacity=4)
+        for n in range(10):
+            journal.record("a", "brightness", n, n + 1)
+        assert_that(len(journal), is_(equal_to(4)))
+        assert_that(journal.lost, is_(equal_to(6)))
+        assert_that([e.old for e in journal.entries()],
+                    contains_exactly(6, 7, 8, 9))
+
+    def test_spill_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "journal.bin")
+            journal = Journal(capacity=4, spill_path=path)
+            values = [None, True, 3, 2.5, "on", [255, 0, 0]]
+            for n, value in enumerate(values * 2):
+                journal.record(f"{n:08d}", "value", value, n)
+            written = journal.spill()
+            assert_that(journal.lost, is_(equal_to(0)))
+            assert_that(written, is_(equal_to(4)))
+            entries = list(read_journal(path))
+        assert_that([e.old for e in entries], is_(equal_to(values * 2)))
+        assert_that([e.device_id for e in entries], is_(equal_to(
+            [f"{n:08d}" for n in range(12)])))
+
+    def test_record_during_spill(self):
+        write_batch = journal_module._write_batch
+        started, release = threading.Event(), threading.Event()
+
+        def slow_write_batch(*batch):
+            started.set()
+            release.wait(5)
+            write_batch(*batch)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(journal_module, "_write_batch",
+                                  slow_write_batch):
+            path = os.path.join(directory, "journal.bin")
+            journal = Journal(capacity=4, spill_path=path)
+            for n in range(5):
+                journal.record("a", "brightness", n, n + 1)
+            assert_that(started.wait(5), is_(True))
+            begin = time.perf_counter()
+            for n in range(5, 8):
+                journal.record("a", "brightness", n, n + 1)
+            elapsed = time.perf_counter() - begin
+            release.set()
+            journal.spill()
+            entries = list(read_journal(path))
+        assert_that(elapsed < 1, is_(True))
+        assert_that(journal.lost, is_(equal_to(0)))
+        assert_that([e.old for e in entries], is_(equal_to(list(range(8)))))
+
+    def test_device_changes_recorded(self):
+        journal = Journal()
+        set_change_journal(journal)
+        try:
+            lamp = PhilipsHueLamp(name="before", logger=self._logger)
+            lamp.set_name("after")
+            lamp.__api__()
+        finally:
+            set_change_journal(None)
+        lamp.set_name("unrecorded")
+        # Construction and last_connected updates are not recorded.
+        assert_that(journal.entries(), contains_exactly(
+            (journal.entries()[0].timestamp, lamp.device_id, "name",
+             "before", "after")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,15 +1,24 @@
 import os
 import random
+import shutil
+import tempfile
 import unittest
 import json
 
+from unittest import mock
+
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL  # noqa: F401
 # from typing import List
 from hamcrest import assert_that, equal_to, is_, same_instance  # noqa: F401
 
 from smarthome import Location
 
-from helpers.factories import device_factory
+from devices import SmartPlug
+from devices.devices import device_class
+from helpers.factories import create_many, device_factory
+from smarthome import configcache
+from smarthome.configcache import cache_path, load_locations
+from smarthome.loader import iter_locations
 from helpers.misc import json_from_file, create_logger, path_relative_to_root
 
 
@@ -68,6 +77,52 @@ class TestLocation(unittest.TestCase):
         # Test __len__ and append
         assert_that(len(self.default_constructor), is_(equal_to(num_devices)))
 
+        # Devices built in a tight loop must still get unique ids.
+        device_ids = {d.device_id for d in self.default_constructor._devices}
+        assert_that(len(device_ids), is_(equal_to(num_devices)))
+
+    def test_indexes(self):
+        """
+        Tests that id, type and room lookups follow device changes.
+        """
+        location = self.default_constructor
+        thermostat = device_factory("NestThermostat",
+                                    config={"location": "Office",
+                                            "device_id": "t1"},
+                                    logger=location._logger)
+        lamp = device_factory("PhilipsHueLamp",
+                              config={"location": "Office"},
+                              logger=location._logger)
+        location.append(thermostat)
+        location.append(lamp)
+
+        thermostats = location["Thermostat"]
+        office = location.by_room("Office")
+        hallway = location.by_room("Hallway")
+        assert_that(location["t1"], is_(same_instance(thermostat)))
+        assert_that(len(thermostats), is_(equal_to(1)))
+        assert_that(len(office), is_(equal_to(2)))
+        assert_that(len(location["Plug"]), is_(equal_to(0)))
+
+        thermostat.set_device_id("t2")
+        thermostat.set_location("Hallway")
+        assert_that(location["t1"], is_(None))
+        assert_that(location["t2"], is_(same_instance(thermostat)))
+        # Views are live, including those looked up before any device
+        # had the key.
+        assert_that(len(office), is_(equal_to(1)))
+        assert_that(list(hallway), is_(equal_to([thermostat])))
+
+        lamp.set_device_type("Lamp")
+        assert_that(len(location["Light"]), is_(equal_to(0)))
+        assert_that(list(location["Lamp"]), is_(equal_to([lamp])))
+
+        location.remove(thermostat)
+        assert_that(len(thermostats), is_(equal_to(0)))
+        assert_that(location["t2"], is_(None))
+        thermostat.set_location("Office")
+        assert_that(len(office), is_(equal_to(1)))
+
     def test__from_json__(self):
         """
         Tests ability to write configuration and restore from file.
@@ -90,6 +145,98 @@ class TestLocation(unittest.TestCase):
         assert_that(len(location_from_file["Light"]), is_(equal_to(1)))
         assert_that(len(location_from_file["Plug"]), is_(equal_to(1)))
 
+    def test_create_many(self):
+        """Tests bulk construction from device configurations.
+        """
+        configs = [
+            {"class": "NestThermostat", "name": "t", "device_id": "t1"},
+            {"class": "PhilipsHueLamp", "name": "l", "brightness": 0.25},
+            {"class": "PhilipsHueLamp", "name": "m", "brightness": 0.75},
+            {"class": "SmartPlug", "is_on": True, "unknown": 1}
+        ]
+        devices = create_many(configs, self._debug_logger)
+        assert_that([type(d).__name__ for d in devices], is_(equal_to(
+            [config["class"] for config in configs])))
+        assert_that(devices[0].device_id, is_(equal_to("t1")))
+        assert_that([d.brightness for d in devices[1:3]],
+                    is_(equal_to([0.25, 0.75])))
+        assert_that(devices[3].is_on, is_(True))
+        assert_that(len({d.device_id for d in devices}), is_(equal_to(4)))
+        # The configurations are left as they were.
+        assert_that(configs[0]["class"], is_(equal_to("NestThermostat")))
+
+        assert_that(device_class("SmartPlug"), is_(same_instance(SmartPlug)))
+        with self.assertRaises(ValueError):
+            create_many([{"class": "Toaster"}])
+
+    def test_thermostat_setpoints(self):
+        """Tests that thermostat temperatures given before their
+        temperature scale are read in that scale, however the
+        configuration is loaded.
+        """
+        filename = path_relative_to_root("configs/default-home.json")
+        location = Location(logger=self._debug_logger)
+        location.__from_json__(json_from_file(filename)[0])
+        streamed = next(iter_locations(filename, self._debug_logger))
+        for loaded in [location, streamed]:
+            thermostat = loaded["1234"]
+            assert_that(thermostat.temperature_scale, is_(equal_to("F")))
+            assert_that([round(t, 6) for t in (
+                thermostat.target_temperature_high,
+                thermostat.target_temperature_low,
+                thermostat.eco_temperature_high,
+                thermostat.eco_temperature_low,
+                thermostat.locked_temp_max,
+                thermostat.locked_temp_min)],
+                is_(equal_to([75, 70, 76, 74, 72, 71])))
+
+    def test_config_cache(self):
+        """Tests that locations are restored from the compiled cache,
+        and that the cache is rebuilt when the file changes.
+        """
+        def summary(locations):
+            return [(location.name, [(type(d).__name__, d.device_id,
+                                      d.name, d.location)
+                                     for d in location._devices])
+                    for location in locations]
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "home.json")
+            shutil.copy(path_relative_to_root("configs/default-home.json"),
+                        filename)
+            loaded = list(load_locations(filename, self._debug_logger))
+            assert_that(os.path.exists(cache_path(filename)), is_(True))
+
+            with mock.patch("smarthome.configcache.iter_locations",
+                            side_effect=AssertionError("cache not used")):
+                cached = list(load_locations(filename, self._debug_logger))
+            assert_that(summary(cached), is_(equal_to(summary(loaded))))
+            thermostat = next(iter(cached[0]["Thermostat"]))
+            assert_that(thermostat.software_version,
+                        is_(equal_to("2021.07.28")))
+            assert_that(thermostat._logger,
+                        is_(same_instance(self._debug_logger)))
+
+            with open(filename) as f:
+                config = json.load(f)
+            config[0]["name"] = "changed"
+            with open(filename, "w") as f:
+                json.dump(config, f)
+            rebuilt = list(load_locations(filename, self._debug_logger))
+            assert_that(rebuilt[0].name, is_(equal_to("changed")))
+
+            # Changing the code which builds devices, even without
+            # changing their slots, makes the cache stale.
+            source_hash = configcache._source_hash
+            with mock.patch("smarthome.configcache._source_hash",
+                            side_effect=lambda module: "edited"
+                            if module == "helpers.unitconverters"
+                            else source_hash(module)), \
+                    mock.patch("smarthome.configcache.iter_locations",
+                               wraps=iter_locations) as streamed:
+                list(load_locations(filename, self._debug_logger))
+            assert_that(streamed.call_count, is_(equal_to(1)))
+
 
 if __name__ == "__main__":
     unittest.main()
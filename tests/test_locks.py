@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to, is_
+
+from helpers.locks import RWLock
+
+
+class TestRWLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = RWLock()
+
+    def test_readers_share(self):
+        inside = threading.Barrier(3, timeout=1)
+
+        def reader():
+            with self.lock.read():
+                # Only passes if all three readers hold the lock at once.
+                inside.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_that(inside.broken, is_(equal_to(False)))
+
+    def test_writer_excludes_readers(self):
+        events = []
+
+        def read():
+            with self.lock.read():
+                events.append("read")
+
+        self.lock.acquire_write()
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(0.05)
+        events.append("write done")
+        self.lock.release_write()
+        reader.join(1)
+        assert_that(events, is_(equal_to(["write done", "read"])))
+
+    def test_waiting_writer_blocks_new_readers(self):
+        events = []
+        self.lock.acquire_read()
+
+        def writer():
+            with self.lock.write():
+                events.append("write")
+
+        def reader():
+            with self.lock.read():
+                events.append("read")
+
+        writing = threading.Thread(target=writer)
+        writing.start()
+        while not self.lock._writers_waiting:
+            pass
+        reading = threading.Thread(target=reader)
+        reading.start()
+        reading.join(0.05)
+        assert_that(events, is_(equal_to([])))
+        self.lock.release_read()
+        writing.join(1)
+        reading.join(1)
+        assert_that(events, is_(equal_to(["write", "read"])))
@@ -0,0 +1,135 @@
+import logging
+import threading
+import unittest
+
+from hamcrest import assert_that, close_to, equal_to, greater_than, is_, \
+    less_than
+
+from devices import NestThermostat
+from helpers.locks import RWLock
+from simulation import ThermalSimulation
+
+
+class TestThermalSimulation(unittest.TestCase):
+    def setUp(self):
+        logger = logging.getLogger("test-simulation")
+        self.thermostats = []
+        for mode in ["heat", "cool", "heat-cool", "eco", "off"]:
+            thermostat = NestThermostat(logger=logger)
+            thermostat.set_temperature_scale("C")
+            thermostat.set_hvac_mode(mode)
+            thermostat.set_target_temperature_low(18)
+            thermostat.set_target_temperature_high(22)
+            thermostat.set_eco_temperature_low(10)
+            thermostat.set_eco_temperature_high(30)
+            thermostat.set_ambient_temperature(25)
+            self.thermostats.append(thermostat)
+
+    def test_setpoints(self):
+        """Tests that each mode settles where its setpoints say.
+        """
+        simulation = ThermalSimulation(
+            self.thermostats, outdoor_temperature=273.15 + 5,
+            outdoor_swing=0.0)
+        simulation.advance(24 * 60)
+        heat, cool, heat_cool, eco, off = [
+            t.ambient_temperature for t in self.thermostats]
+        assert_that(heat, is_(close_to(22, 1e-6)))
+        # Cooling alone cannot stop the house cooling below its target.
+        assert_that(cool, is_(close_to(5, 0.1)))
+        assert_that(heat_cool, is_(close_to(18, 1e-6)))
+        assert_that(eco, is_(close_to(10, 1e-6)))
+        assert_that(off, is_(close_to(5, 0.1)))
+        assert_that(simulation.heating.tolist(), is_(equal_to(
+            [True, False, True, True, False])))
+
+    def test_cooling(self):
+        """Tests that cooling pulls the temperature down to the target
+        at the cooling rate.
+        """
+        thermostat = self.thermostats[1]
+        simulation = ThermalSimulation(
+            [thermostat], outdoor_temperature=273.15 + 35,
+            outdoor_swing=0.0, leak_rate=0.0, cooling_rate=0.5)
+        simulation.step(steps=4)
+        assert_that(simulation.ambient[0] - 273.15, is_(close_to(23, 1e-9)))
+        assert_that(bool(simulation.cooling[0]), is_(True))
+        simulation.step(steps=100)
+        assert_that(simulation.store(), is_(equal_to(1)))
+        assert_that(thermostat.ambient_temperature, is_(close_to(18, 1e-9)))
+
+    def test_thermal_state(self):
+        """Tests that a tick hands thermostats their HVAC state and time
+        to target, until they next change.
+        """
+        heat, cool = self.thermostats[:2]
+        heat.set_ambient_temperature(10)
+        ThermalSimulation([heat], outdoor_temperature=273.15 + 30,
+                          outdoor_swing=0.0).advance(1)
+        # About 11 K away, at a little over 1 K a minute.
+        assert_that(heat.is_heating, is_(True))
+        assert_that(heat.time_to_target, is_(equal_to("~15")))
+        assert_that(heat.time_to_target_training, is_(equal_to("ready")))
+
+        simulation = ThermalSimulation(
+            [cool], outdoor_temperature=273.15 + 45, outdoor_swing=0.0,
+            leak_rate=0.1)
+        changes = []
+        cool.add_observer(lambda *change: changes.append(change[1]))
+        simulation.advance(1)
+        # The leak outpaces cooling, so the target is never reached.
+        assert_that(cool.is_cooling, is_(True))
+        assert_that(cool.time_to_target, is_(equal_to("120")))
+        assert_that(changes, is_(equal_to(
+            ["ambient_temperature", "thermal_state"])))
+
+        del changes[:]
+        simulation.store()
+        assert_that(changes, is_(equal_to([])))
+        cool.set_hvac_mode("off")
+        assert_that(cool.is_cooling, is_(False))
+        assert_that(cool.time_to_target_training, is_(equal_to("training")))
+
+    def test_store_locking(self):
+        """Tests that store writes under each thermostat's lock, taking
+        each lock once.
+        """
+        locks = [RWLock(), RWLock()]
+        taken = []
+
+        def lock_for(thermostat):
+            taken.append(thermostat)
+            return locks[self.thermostats.index(thermostat) % 2]
+
+        simulation = ThermalSimulation(
+            self.thermostats, outdoor_temperature=273.15 + 5,
+            outdoor_swing=0.0, lock_for=lock_for)
+        simulation.step(steps=60)
+        expected = simulation.ambient - 273.15
+        writer = threading.Thread(target=simulation.store)
+        with locks[0].read():
+            writer.start()
+            writer.join(0.05)
+            assert_that(writer.is_alive(), is_(True))
+            # The scale is read once the lock is held.
+            self.thermostats[0].set_temperature_scale("K")
+        writer.join(5)
+        assert_that(self.thermostats[0].ambient_temperature,
+                    is_(close_to(expected[0] + 273.15, 1e-9)))
+        assert_that([t.ambient_temperature for t in self.thermostats[1:]],
+                    is_(equal_to(expected[1:].tolist())))
+        assert_that(len(taken), is_(equal_to(len(self.thermostats))))
+
+    def test_outdoor_cycle(self):
+        """Tests that the outdoor temperature peaks in the afternoon.
+        """
+        simulation = ThermalSimulation(self.thermostats, seed=1,
+                                       outdoor_spread=2.0)
+        night = simulation.outdoor(3 * 60)
+        afternoon = simulation.outdoor(15 * 60)
+        assert_that(float(min(afternoon - night)), is_(greater_than(9.99)))
+        assert_that(float(max(afternoon - night)), is_(less_than(10.01)))
+
+
+if __name__ == "__main__":
+    unittest.main()
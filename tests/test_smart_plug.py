@@ -1,11 +1,12 @@
 import unittest
 import json
+import logging
 import os
 
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL  # noqa F401
 
 from hamcrest import assert_that, close_to, contains_string, equal_to, is_,\
-    is_not, string_contains_in_order
+    is_not, string_contains_in_order, instance_of, same_instance
 
 from devices import SmartPlug
 from helpers.misc import create_logger
@@ -25,6 +26,12 @@ class TestSmartPlug(unittest.TestCase):
         assert_that(self.sp.is_on, is_(equal_to(True)))
         assert_that(self.sp.name, is_(equal_to("plug")))
 
+    def test_positional_logger(self):
+        logger = logging.getLogger("test-smart-plug")
+        plug = SmartPlug(logger)
+        assert_that(plug._logger, is_(same_instance(logger)))
+        assert_that(plug.device_id, is_(instance_of(str)))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,16 @@
 import unittest
 import json
 import os
+import time
+
+from datetime import datetime, timedelta
+
+from unittest import mock
 
 from logging import DEBUG, INFO, WARNING, ERROR, CRITICAL  # noqa: F401
 
 from hamcrest import assert_that, close_to, contains_string, equal_to, is_,\
-    is_not, string_contains_in_order
+    is_not, greater_than, less_than_or_equal_to, string_contains_in_order
 
 from devices.thermostats import NestThermostat
 from helpers.misc import create_logger, path_relative_to_root
@@ -144,6 +149,32 @@ class TestNestThermostat(unittest.TestCase):
             assert_that(self.default_constructor.fan_timer_duration,
                         is_(duration))
 
+    def test_fan_timer(self):
+        """Tests that the fan timer turns off when it times out, and can
+        be started and stopped.
+        """
+        thermostat = self.default_constructor
+        changes = []
+        thermostat.add_observer(lambda *change: changes.append(change[1:]))
+        thermostat.set_fan_timer_timeout(
+            (datetime.now() + timedelta(seconds=0.05)).isoformat())
+        assert_that(thermostat.fan_timer_active, is_(True))
+        stop = time.monotonic() + 5
+        while thermostat.fan_timer_active and time.monotonic() < stop:
+            time.sleep(0.01)
+        assert_that(thermostat.fan_timer_active, is_(False))
+        assert_that(changes[-1], is_(equal_to(
+            ("fan_timer_active", True, False))))
+
+        thermostat.set_fan_timer_active(True)
+        assert_that(thermostat.fan_timer_active, is_(True))
+        assert_that(datetime.fromisoformat(thermostat.fan_timer_timeout),
+                    is_(greater_than(datetime.now())))
+        thermostat.set_fan_timer_active(False)
+        assert_that(thermostat.fan_timer_active, is_(False))
+        assert_that(datetime.fromisoformat(thermostat.fan_timer_timeout),
+                    is_(less_than_or_equal_to(datetime.now())))
+
     def test_set_has_fan(self):
         """Tests ability to set whether system has fan.
         """
@@ -255,6 +286,98 @@ class TestNestThermostat(unittest.TestCase):
             assert_that(self.default_constructor.temperature_scale,
                         is_(equal_to(scale)))
 
+    def test_time_to_target(self):
+        """Tests that the HVAC state follows the setpoints of the mode
+        without a simulation.
+        """
+        thermostat = self.default_constructor
+        thermostat.set_temperature_scale("C")
+        thermostat.set_target_temperature_low(18)
+        thermostat.set_target_temperature_high(22)
+        thermostat.set_ambient_temperature(20)
+        expected = {"heat": (22, True, False, "<5"),
+                    "cool": (18, False, True, "<5"),
+                    "heat-cool": (18, False, False, "~0"),
+                    "off": (20, False, False, "~0")}
+        for mode, expectation in expected.items():
+            target, heating, cooling, time_to_target = expectation
+            thermostat.set_hvac_mode(mode)
+            assert_that(thermostat.target_temperature,
+                        is_(close_to(target, 1e-9)))
+            assert_that(thermostat.is_heating, is_(heating))
+            assert_that(thermostat.is_cooling, is_(cooling))
+            assert_that(thermostat.time_to_target,
+                        is_(equal_to(time_to_target)))
+            assert_that(thermostat.time_to_target_training,
+                        is_(equal_to("training")))
+
+        thermostat.set_hvac_mode("heat-cool")
+        thermostat.set_ambient_temperature(-10)
+        assert_that(thermostat.target_temperature, is_(close_to(18, 1e-9)))
+        assert_that(thermostat.time_to_target, is_(equal_to("~15")))
+
+    def test_thermal_state_not_settable(self):
+        """Tests that the simulated HVAC state cannot be set through
+        the API, and that reading the HVAC state changes nothing.
+        """
+        thermostat = self.default_constructor
+        thermostat.set_hvac_mode("off")
+        assert_that("thermal_state" in NestThermostat._setters, is_(False))
+        version = thermostat._version
+        thermostat.__from_json__({"thermal_state": [True, False, 3]})
+        assert_that(thermostat.is_heating, is_(False))
+        assert_that(thermostat.time_to_target, is_(equal_to("~0")))
+        assert_that(thermostat._thermal_state, is_(None))
+        assert_that(thermostat._version, is_(equal_to(version)))
+
+    def test_temperature_views(self):
+        """Tests that temperatures read back in the current scale after
+        the scale changes, and that serializing does no conversions.
+        """
+        thermostat = self.default_constructor
+        thermostat.set_temperature_scale("C")
+        thermostat.set_hvac_mode("heat")
+        thermostat.set_target_temperature_high(22)
+        thermostat.set_ambient_temperature(20)
+        thermostat.set_locked_temp_max(25)
+        thermostat.set_temperature_scale("F")
+        assert_that(thermostat.target_temperature, is_(close_to(71.6, 1e-9)))
+        assert_that(thermostat.ambient_temperature, is_(close_to(68, 1e-9)))
+        assert_that(thermostat.locked_temp_max, is_(close_to(77, 1e-9)))
+        thermostat.set_hvac_mode("off")
+        assert_that(thermostat.target_temperature, is_(close_to(68, 1e-9)))
+
+        converters = ["convert", "kelvin_to_celsius", "kelvin_to_fahrenheit"]
+        patches = [mock.patch(f"devices.thermostats.{name}",
+                              side_effect=AssertionError(name))
+                   for name in converters]
+        for patch in patches:
+            patch.start()
+        try:
+            data = thermostat.__as_json__(thermostat._api_return_parameters)
+        finally:
+            for patch in patches:
+                patch.stop()
+        assert_that(data["ambient_temperature"], is_(close_to(68, 1e-9)))
+
+    def test__properties__(self):
+        """Tests that saved properties skip unit variants and can be
+        used to restore an equivalent thermostat.
+        """
+        self.default_constructor.__from_json__(
+            dict(self._json_file_parameters))
+        properties = self.default_constructor.__properties__()
+
+        for name in properties.keys():
+            assert_that(name[-2:], is_not(equal_to("_c")))
+            assert_that(name[-2:], is_not(equal_to("_f")))
+        assert_that(properties["has_fan"], is_(True))
+        assert_that(properties["sunlight_correction_enabled"], is_(False))
+
+        restored = NestThermostat(logger=self._logger)
+        restored.__from_json__(dict(properties))
+        assert_that(restored.__properties__(), is_(equal_to(properties)))
+
 
 if __name__ == "__main__":
     unittest.main()
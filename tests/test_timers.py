@@ -0,0 +1,114 @@
+import gc
+import threading
+import unittest
+
+from hamcrest import assert_that, equal_to, is_
+
+from helpers.timers import TimerScheduler
+
+
+class TestTimerScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.scheduler = TimerScheduler(clock=lambda: self.now)
+        self.expired = []
+
+    def schedule(self, key, deadline):
+        self.scheduler.schedule(key, deadline,
+                                lambda: self.expired.append(key))
+
+    def test_run_due(self):
+        for key, deadline in [("c", 30), ("a", 10), ("b", 20), ("d", 20)]:
+            self.schedule(key, deadline)
+        self.now = 20
+        assert_that(self.scheduler.run_due(), is_(equal_to(3)))
+        # Equal deadlines expire in the order they were scheduled.
+        assert_that(self.expired, is_(equal_to(["a", "b", "d"])))
+        assert_that(len(self.scheduler), is_(equal_to(1)))
+        assert_that(self.scheduler.next_deadline(), is_(equal_to(30)))
+        assert_that(self.scheduler.run_due(), is_(equal_to(0)))
+
+    def test_cancel_and_reschedule(self):
+        self.schedule("a", 10)
+        self.schedule("b", 10)
+        self.schedule("a", 50)
+        assert_that(self.scheduler.cancel("b"), is_(True))
+        assert_that(self.scheduler.cancel("b"), is_(False))
+        assert_that(self.scheduler.deadline("a"), is_(equal_to(50)))
+        assert_that(self.scheduler.next_deadline(), is_(equal_to(50)))
+        assert_that(self.scheduler.run_due(now=49), is_(equal_to(0)))
+        assert_that(self.scheduler.run_due(now=50), is_(equal_to(1)))
+        assert_that(self.expired, is_(equal_to(["a"])))
+
+    def test_compaction(self):
+        for n in range(1000):
+            self.schedule(n, n)
+        for n in range(1, 1000):
+            self.scheduler.cancel(n)
+        assert_that(len(self.scheduler._heap) < 200, is_(True))
+        self.now = 1000
+        assert_that(self.scheduler.run_due(), is_(equal_to(1)))
+        assert_that(self.expired, is_(equal_to([0])))
+
+    def test_failing_callback(self):
+        def fail():
+            raise RuntimeError("timer")
+
+        self.scheduler.schedule("fail", 1, fail)
+        self.schedule("ok", 2)
+        with self.assertRaises(RuntimeError):
+            self.scheduler.run_due(now=2)
+        assert_that(self.expired, is_(equal_to(["ok"])))
+
+    def test_dispatch(self):
+        runs = []
+
+        class Owner():
+            def __init__(self, name, keys):
+                self.name, self.keys = name, keys
+
+            def dispatch(self, key, callback):
+                if key not in self.keys:
+                    return False
+                runs.append((self.name, key))
+                callback()
+                return True
+
+        first, second = Owner("first", {"a"}), Owner("second", {"b"})
+        self.scheduler.add_dispatch(first.dispatch)
+        self.scheduler.add_dispatch(second.dispatch)
+        for key in "abc":
+            self.schedule(key, 1)
+        self.scheduler.run_due(now=1)
+        assert_that(runs, is_(equal_to([("first", "a"), ("second", "b")])))
+        assert_that(self.expired, is_(equal_to(["a", "b", "c"])))
+
+        # Owners are held weakly, and can be removed.
+        assert_that(self.scheduler.remove_dispatch(first.dispatch),
+                    is_(True))
+        assert_that(self.scheduler.remove_dispatch(first.dispatch),
+                    is_(False))
+        del second
+        gc.collect()
+        del runs[:]
+        self.schedule("b", 2)
+        self.scheduler.run_due(now=2)
+        assert_that(runs, is_(equal_to([])))
+        assert_that(self.expired[-1], is_(equal_to("b")))
+
+    def test_thread(self):
+        scheduler = TimerScheduler()
+        fired = threading.Event()
+        scheduler.start()
+        try:
+            # Sleeping towards the later timer must not delay this one.
+            scheduler.schedule("late", scheduler._clock() + 60, fired.set)
+            scheduler.schedule("soon", scheduler._clock() + 0.01, fired.set)
+            assert_that(fired.wait(5), is_(True))
+            assert_that("late" in scheduler, is_(True))
+        finally:
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,22 @@
-# import json
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
 import logging
 
+from datetime import datetime, timedelta
+
 from hamcrest import assert_that, equal_to, close_to, is_, is_not, \
-    instance_of, same_instance, contains_string  # noqa: F401
+    instance_of, same_instance, contains_string, greater_than  # noqa: F401
+from helpers.misc import path_relative_to_root
+from smarthome.configcache import cache_path
 from webservers import HoneywellHome
+from webservers.metrics import Histogram
+from webservers.stream import Subscription
 
 
 class TestHoneywellServer(unittest.TestCase):
@@ -32,9 +44,9 @@ class TestHoneywellServer(unittest.TestCase):
         ]
 
         cls.server_default_constructor = HoneywellHome(
-            config_filename="configs/default-home.json")
+            config_filename="configs/default-home.json", config_cache=False)
         cls.server_nondefault_constructor = HoneywellHome(
-            config_filename="configs/simple.json")
+            config_filename="configs/simple.json", config_cache=False)
 
         logging.disable(logging.WARNING)
 
@@ -45,6 +57,38 @@ class TestHoneywellServer(unittest.TestCase):
         assert_that(len(self.server_default_constructor._locations),
                     is_(equal_to(2)))
 
+    def test_no_config_cache_by_default(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "home.json")
+            shutil.copy(path_relative_to_root("configs/default-home.json"),
+                        filename)
+            HoneywellHome(config_filename=filename)
+            assert_that(os.path.exists(cache_path(filename)), is_(False))
+
+    def test_background_load(self):
+        """Tests that a configuration loaded in the background matches
+        one loaded in memory.
+        """
+        server = HoneywellHome(config_filename="configs/default-home.json",
+                               config_cache=False,
+                               background_load=True)
+        assert_that(server.wait_loaded(timeout=5), is_(True))
+        with open("configs/default-home.json") as f:
+            in_memory = HoneywellHome()
+            in_memory.__from_json__(json.load(f))
+
+        def summary(home):
+            locations = json.loads(home.test_client().get("/locations").data)
+            return [(location["street_address"],
+                     [(d["class"], d["name"], d["location"])
+                      for d in location["devices"]])
+                    for location in locations]
+
+        assert_that(summary(server), is_(equal_to(summary(in_memory))))
+        thermostats = json.loads(
+            server.test_client().get("/devices/Thermostat").data)
+        assert_that(list(thermostats), is_(equal_to(["1234"])))
+
     def test_responses(self):
         for get_route in self._get_routes:
             with self.server_default_constructor.test_client() as c:
@@ -59,5 +103,311 @@ class TestHoneywellServer(unittest.TestCase):
     def test_response_data(self):
         pass
 
+    def test_device_index(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            resp = c.get("/devices/Light/1234")
+            assert_that(resp.json["device_id"], is_(equal_to("1234")))
+            assert_that(c.get("/devices/Plug/1234").status_code,
+                        is_(equal_to(404)))
+
+            resp = c.post("/devices/Light/1234", json={"device_id": "9999"})
+            assert_that(resp.status_code, is_(equal_to(404)))
+            assert_that(c.get("/devices/Light/9999").status_code,
+                        is_(equal_to(200)))
+
+            location = server._locations[0]
+            device = location["9999"]
+            location.remove(device)
+            assert_that(c.get("/devices/Light/9999").status_code,
+                        is_(equal_to(404)))
+            assert_that(c.get("/devices/Light").json, is_(equal_to({})))
+
+            location.append(device)
+            assert_that(server.location_of(device),
+                        is_(same_instance(location)))
+            assert_that(list(c.get("/devices/Light").json.keys()),
+                        is_(equal_to(["9999"])))
+
+    def test_response_cache(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            first = c.get("/devices/Light/1234")
+            etag = first.headers["ETag"]
+            assert_that(etag, is_not(equal_to(None)))
+            assert_that(c.get("/devices/Light/1234").headers["ETag"],
+                        is_(equal_to(etag)))
+
+            resp = c.get("/devices/Light/1234",
+                         headers={"If-None-Match": etag})
+            assert_that(resp.status_code, is_(equal_to(304)))
+            assert_that(resp.data, is_(equal_to(b"")))
+
+            type_etag = c.get("/devices/Light").headers["ETag"]
+            c.post("/devices/Light/1234", json={"name": "Renamed"})
+            resp = c.get("/devices/Light/1234",
+                         headers={"If-None-Match": etag})
+            assert_that(resp.status_code, is_(equal_to(200)))
+            assert_that(resp.json["name"], is_(equal_to("Renamed")))
+            resp = c.get("/devices/Light",
+                         headers={"If-None-Match": type_etag})
+            assert_that(resp.status_code, is_(equal_to(200)))
+            assert_that(resp.json["1234"]["name"], is_(equal_to("Renamed")))
+
+    def test_delta_sync(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            resp = c.get("/devices?since=0")
+            assert_that(set(resp.json["devices"].keys()),
+                        is_(equal_to(set(c.get("/devices").json.keys()))))
+            version = resp.json["version"]
+
+            resp = c.get(f"/devices?since={version}")
+            assert_that(resp.json["devices"], is_(equal_to({})))
+            assert_that(resp.json["version"], is_(equal_to(version)))
+
+            c.post("/devices/Light/1234", json={"name": "Renamed"})
+            resp = c.get(f"/devices?since={version}")
+            assert_that(list(resp.json["devices"].keys()),
+                        is_(equal_to(["1234"])))
+            assert_that(resp.json["version"], is_(greater_than(version)))
+            version = resp.json["version"]
+
+            location = server._locations[0]
+            location.remove(location["1234"])
+            resp = c.get(f"/devices?since={version}")
+            assert_that(resp.json["devices"], is_(equal_to({})))
+            assert_that(resp.json["removed"], is_(equal_to(["1234"])))
+
+            assert_that(c.get("/devices?since=x").status_code,
+                        is_(equal_to(400)))
+
+    def test_bulk_update(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            resp = c.post("/devices/bulk", json=[
+                {"selector": {"device_type": "Light", "location": "Desk"},
+                 "patch": {"brightness": 0.3}},
+                {"device_id": "2345", "patch": {"location": "Kitchen"}},
+                {"device_id": "2345", "device_type": "Light",
+                 "patch": {"name": "Wrong type"}},
+                {"selector": {"color": "red"}, "patch": {}},
+                {"patch": {}}
+            ])
+            assert_that(resp.status_code, is_(equal_to(200)))
+            results = resp.json
+            assert_that([r["status"] for r in results],
+                        is_(equal_to([200, 200, 404, 400, 400])))
+            assert_that(results[0]["devices"]["1234"]["brightness"],
+                        is_(close_to(0.3, 1e-9)))
+            assert_that(list(results[1]["devices"].keys()),
+                        is_(equal_to(["2345"])))
+            assert_that(len(server.select({"location": "Kitchen"})),
+                        is_(equal_to(1)))
+
+            resp = c.post("/devices/bulk", json={"operations": [
+                {"selector": {"location": "Kitchen"},
+                 "patch": {"location": "Desk"}}]})
+            assert_that(list(resp.json[0]["devices"].keys()),
+                        is_(equal_to(["2345"])))
+            assert_that(c.post("/devices/bulk", json={}).status_code,
+                        is_(equal_to(400)))
+
+    def test_bulk_update_failing_setter(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            resp = c.post("/devices/bulk", json=[
+                {"device_id": "2345", "patch": {"location": "Kitchen"}},
+                {"device_id": "1234", "patch": {"brightness": "abc"}},
+                {"selector": {"device_type": "Light"},
+                 "patch": {"brightness": "abc"}},
+                {"device_id": "1234", "patch": {"brightness": 0.4}}
+            ])
+            assert_that(resp.status_code, is_(equal_to(200)))
+            results = resp.json
+            assert_that([r["status"] for r in results],
+                        is_(equal_to([200, 400, 400, 200])))
+            assert_that(results[1]["error"], contains_string("1234"))
+            assert_that(results[2]["devices"], is_(equal_to({})))
+            assert_that(results[3]["devices"]["1234"]["brightness"],
+                        is_(close_to(0.4, 1e-9)))
+            assert_that(server.find_device("Plug", "2345").location,
+                        is_(equal_to("Kitchen")))
+
+    def test_stream(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False,
+                               stream_keepalive=0.01)
+        with server.test_client() as c:
+            resp = c.get("/devices/stream?device_type=Light", buffered=False)
+            assert_that(resp.mimetype, is_(equal_to("text/event-stream")))
+            chunks = (chunk.decode() for chunk in resp.response)
+            assert_that(next(chunks), contains_string("connected"))
+            assert_that(len(server._broadcaster), is_(equal_to(1)))
+
+            c.post("/devices/Plug/2345", json={"name": "Ignored"})
+            c.post("/devices/Light/1234", json={"name": "First"})
+            c.post("/devices/Light/1234", json={"name": "Second"})
+            frame = next(chunks)
+            assert_that(frame, contains_string("event: change"))
+            assert_that(frame, contains_string("Second"))
+            assert_that(frame, is_not(contains_string("First")))
+            assert_that(frame, is_not(contains_string("Ignored")))
+            assert_that(next(chunks), contains_string("keepalive"))
+
+            server._broadcaster.sample()
+            assert_that(next(chunks), contains_string("event: sample"))
+
+            # Samples wait for a device's update to finish.
+            lamp = server.find_device("Light", "1234")
+            sampler = threading.Thread(target=server._broadcaster.sample)
+            with server._lock_for(lamp).write():
+                sampler.start()
+                sampler.join(0.05)
+                assert_that(sampler.is_alive(), is_(True))
+            sampler.join(5)
+            assert_that(next(chunks), contains_string("event: sample"))
+            resp.close()
+            assert_that(len(server._broadcaster), is_(equal_to(0)))
+
+    def test_device_timers(self):
+        """Tests that a timer runs under the lock of the server holding
+        its device, however many servers there are, and that a closed
+        server no longer runs timers.
+        """
+        servers = [HoneywellHome(config_filename="configs/simple.json",
+                                 config_cache=False) for _ in range(2)]
+        plug = servers[0].find_device("Plug", "2345")
+        lock = servers[0]._lock_for(plug)
+        timeout = (datetime.now() + timedelta(seconds=0.05)).isoformat()
+        with lock.read():
+            plug.set_timer_timeout(timeout)
+            time.sleep(0.2)
+            assert_that(plug.status, is_(equal_to("timer")))
+        stop = time.monotonic() + 5
+        while plug.status == "timer" and time.monotonic() < stop:
+            time.sleep(0.01)
+        assert_that(plug.status, is_(equal_to("off")))
+
+        servers[0].close()
+        with lock.read():
+            plug.set_timer_timeout(
+                (datetime.now() + timedelta(seconds=0.05)).isoformat())
+            stop = time.monotonic() + 5
+            while plug.status == "timer" and time.monotonic() < stop:
+                time.sleep(0.01)
+            assert_that(plug.status, is_(equal_to("off")))
+
+    def test_subscription_bound(self):
+        subscription = Subscription(max_pending=2)
+        for key in range(3):
+            subscription.offer(key, f"{key}")
+        subscription.offer(2, "2b")
+        assert_that(subscription.dropped, is_(equal_to(1)))
+        assert_that(subscription.get(0), is_(equal_to(["1", "2b"])))
+        assert_that(subscription.get(0), is_(equal_to([])))
+
+    def test_concurrent_consistency(self):
+        # A thermostat's target temperature is given in its temperature
+        # scale, so readers must never see a new scale with the old
+        # temperature.
+        patches = [{"temperature_scale": "C", "target_temperature_high": 20},
+                   {"temperature_scale": "F", "target_temperature_high": 86}]
+        consistent = {"C": 20, "F": 86}
+        server = HoneywellHome(config_filename="configs/default-home.json",
+                               config_cache=False)
+        server.apply_patch(server.find_device("Thermostat", "1234"),
+                           patches[0])
+        subscription = server._broadcaster.subscribe(
+            device_types=["Thermostat"])
+        torn, reads = [], [0]
+        stop = threading.Event()
+
+        def check(data):
+            expected = consistent[data["temperature_scale"]]
+            if abs(data["target_temperature"] - expected) > 1e-6:
+                torn.append(data)
+
+        def writer():
+            n = 0
+            while not stop.is_set():
+                server.update_device("Thermostat", "1234", patches[n % 2])
+                n += 1
+
+        def reader():
+            with server.test_client() as c:
+                while not stop.is_set():
+                    check(c.get("/devices/Thermostat/1234").json)
+                    check(c.get("/devices/Thermostat").json["1234"])
+                    reads[0] += 1
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            threads = [threading.Thread(target=writer) for _ in range(2)] \
+                + [threading.Thread(target=reader) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.5)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        frames = subscription.get(0)
+        server._broadcaster.unsubscribe(subscription)
+        for frame in frames:
+            check(json.loads(frame.split("data: ", 1)[1]))
+        assert_that(reads[0], is_(greater_than(0)))
+        assert_that(torn, is_(equal_to([])))
+
+    def test_metrics(self):
+        server = HoneywellHome(config_filename="configs/simple.json",
+                               config_cache=False)
+        with server.test_client() as c:
+            c.get("/devices/Light/1234")
+            c.get("/devices/Light/1234")
+            c.get("/devices/Light/missing")
+            c.post("/devices/Light/1234", json={"name": "Metered"})
+            resp = c.get("/metrics")
+        assert_that(resp.mimetype, is_(equal_to("text/plain")))
+        text = resp.data.decode()
+        route = 'route="/devices/<device_type>/<device_id>"'
+        assert_that(text, contains_string(
+            f'honeywell_requests_total{{{route},status="200"}} 3'))
+        assert_that(text, contains_string(
+            f'honeywell_requests_total{{{route},status="404"}} 1'))
+        assert_that(text, contains_string(
+            f'honeywell_request_duration_seconds_count{{{route}}} 4'))
+        assert_that(text, contains_string(
+            f'honeywell_response_size_bytes_bucket{{{route},le="+Inf"}}'))
+        for stage in ("lookup", "serialize", "encode"):
+            assert_that(text, contains_string(
+                f'honeywell_stage_duration_seconds_count{{{route},'
+                f'stage="{stage}"}}'))
+
+        disabled = HoneywellHome(config_filename="configs/simple.json",
+                                 config_cache=False,
+                                 metrics=False)
+        with disabled.test_client() as c:
+            c.get("/devices/Light/1234")
+            assert_that(c.get("/metrics").data.decode(),
+                        is_not(contains_string("honeywell_requests_total{")))
+
+    def test_histogram(self):
+        histogram = Histogram([1, 2])
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        assert_that(histogram.cumulative(), is_(equal_to(
+            [("1", 2), ("2", 3), ("+Inf", 4)])))
+        assert_that(histogram.count, is_(equal_to(4)))
+        assert_that(histogram.sum, is_(close_to(6, 1e-9)))
+
     def test_post(self):
         pass
@@ -0,0 +1,351 @@
+import asyncio
+import contextvars
+import json
+import logging
+import sys
+import time
+
+from typing import Awaitable, Callable, Dict, List, Tuple, Union
+from urllib.parse import parse_qs
+
+import flask
+
+from helpers.misc import path_relative_to_root
+from webservers.cache import CachedResponse
+from webservers.honeywell import HoneywellHome
+from webservers.metrics import current_route
+
+Scope = dict
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+
+class AsyncHoneywellHome():
+    """An ASGI application serving the HoneywellHome API from the same
+    locations, indexes and response cache as a HoneywellHome.
+
+    Requests are handled on the event loop rather than on a thread
+    each, so idle pollers and /devices/stream clients only cost a
+    coroutine. Nothing which takes a location's lock runs on the loop,
+    since a lock held by, or queued for, a writer, e.g. a patch, an
+    expiring timer or a simulation, would stall every connection. GETs
+    answered from the response cache take no locks and are served on
+    the loop; cache misses, polls with since, and POSTs run on the
+    loop's default executor.
+
+    Parameters:
+        home (HoneywellHome, optional): The server to share state with.
+        Defaults to a new HoneywellHome built from config_filename and
+        logger.
+        config_filename (str, optional): The configuration to load when
+        no home is given.
+        logger (logging.Logger, optional): The logger for a new home.
+    """
+
+    def __init__(self, home: HoneywellHome = None, config_filename=None,
+                 logger: logging.Logger = None):
+        if home is None:
+            home = HoneywellHome(config_filename, logger=logger)
+        self._home = home
+
+    @property
+    def home(self) -> HoneywellHome:
+        """Getter for the HoneywellHome holding the served state.
+
+        Returns:
+            HoneywellHome: The shared server.
+        """
+        return self._home
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._home.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send):
+        start = time.perf_counter()
+        method = scope["method"]
+        parts = [p for p in scope["path"].split("/") if p]
+        query = parse_qs(scope.get("query_string", b"").decode())
+        headers = dict(scope.get("headers", ()))
+        route = _route_template(parts)
+        current_route.set(route)
+        metrics = self._home._metrics
+
+        if parts == ["devices", "stream"]:
+            if method != "GET":
+                return await _send_status(send, 405)
+            metrics.observe_request(route, 200, time.perf_counter() - start)
+            return await self._stream(query, receive, send)
+        if parts == ["metrics"]:
+            if method != "GET":
+                return await _send_status(send, 405)
+            return await _send_body(send, 200, metrics.render().encode(),
+                                    b"text/plain; version=0.0.4")
+
+        body, response = b"", None
+        if method == "POST":
+            body = await _read_body(receive)
+        else:
+            response = self._respond(method, parts, query, body,
+                                     cached_only=True)
+        if response is None:
+            # The executor thread does not inherit the request's context
+            # variables, e.g. current_route, so run it in a copy.
+            response = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, self._respond,
+                method, parts, query, body)
+        status, result = response
+
+        size = 0
+        if isinstance(result, CachedResponse):
+            status = await _send_entry(
+                send, result, headers.get(b"if-none-match"))
+            size = len(result.body) if status == 200 else 0
+        elif result is None:
+            await _send_status(send, status)
+        else:
+            await _send_body(send, status, result)
+            size = len(result)
+        metrics.observe_request(
+            route, status, time.perf_counter() - start, size)
+
+    def _respond(self, method: str, parts: List[str],
+                 query: Dict[str, List[str]], body: bytes,
+                 cached_only: bool = False) -> Union[
+                     Tuple[int, Union[CachedResponse, bytes, None]], None]:
+        """Dispatches a request and encodes the result.
+
+        Args:
+            cached_only (bool, optional): Whether to return None rather
+            than take any lock, see _dispatch. Defaults to False.
+
+        Returns:
+            Union[Tuple[int, Union[CachedResponse, bytes, None]], None]:
+            The status and either a cache entry, an encoded body, or
+            None for an empty error response.
+        """
+        # Encode with the app's JSON settings, so that cache entries are
+        # shared with the Flask routes.
+        with self._home.app_context():
+            response = self._dispatch(method, parts, query, body,
+                                      cached_only)
+            if response is None:
+                return None
+            status, result = response
+            if result is not None and not isinstance(result, CachedResponse):
+                with self._home._metrics.timed("encode"):
+                    result = flask.json.dumps(result).encode()
+        return status, result
+
+    def _dispatch(self, method: str, parts: List[str],
+                  query: Dict[str, List[str]], body: bytes,
+                  cached_only: bool = False) -> Union[
+                      Tuple[int, Union[CachedResponse, dict, list, None]],
+                      None]:
+        """Routes a request to the shared HoneywellHome.
+
+        Args:
+            cached_only (bool, optional): Whether to return None for
+            requests which would take a lock, i.e. POSTs, polls with
+            since and cache misses, rather than handle them. Defaults to
+            False.
+
+        Returns:
+            Union[Tuple[int, Union[CachedResponse, dict, list, None]],
+            None]: The status and either a cache entry, data to encode,
+            or None for an empty error response.
+        """
+        home = self._home
+        # A GET of /devices/bulk falls through to the device type route,
+        # as it does in Flask.
+        if len(parts) == 3 or parts == ["devices", "bulk"]:
+            allowed = ("GET", "POST")
+        else:
+            allowed = ("GET",)
+        if method not in allowed:
+            return 405, None
+
+        if parts in ([], ["locations"]):
+            return _found(home._locations_entry(cached_only))
+        if parts == ["devices"]:
+            if "since" not in query:
+                return _found(home._devices_entry(cached_only))
+            if cached_only:
+                return None
+            try:
+                return 200, home._devices_since(int(query["since"][-1]))
+            except ValueError:
+                return 400, None
+        if parts[0] != "devices" or len(parts) > 3:
+            return 404, None
+
+        if method == "POST":
+            if cached_only:
+                return None
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return 400, None
+            if parts[1] == "bulk":
+                if isinstance(data, dict):
+                    data = data.get("operations")
+                if not isinstance(data, list):
+                    return 400, None
+                return 200, home.apply_bulk(data)
+            result = home.update_device(parts[1], parts[2], data)
+            return (404, None) if result is None else (200, result)
+
+        if len(parts) == 2:
+            return _found(home._device_type_entry(parts[1], cached_only))
+        device = home.find_device(parts[1], parts[2])
+        if device is None:
+            return 404, None
+        return _found(home._device_entry(device, cached_only))
+
+    async def _stream(self, query: Dict[str, List[str]], receive: Receive,
+                      send: Send):
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The loop has already shut down.
+                pass
+
+        broadcaster = self._home._broadcaster
+        subscription = broadcaster.subscribe(
+            device_ids=query.get("device_id"),
+            device_types=query.get("device_type"), waker=wake)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/event-stream"),
+                                    (b"cache-control", b"no-cache")]})
+            await _send_chunk(send, ": connected\n\n")
+            while not subscription.closed:
+                waiter = asyncio.ensure_future(ready.wait())
+                await asyncio.wait({waiter, disconnected},
+                                   timeout=self._home._stream_keepalive,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if disconnected.done():
+                    break
+                ready.clear()
+                frames = subscription.get(0)
+                await _send_chunk(
+                    send, "".join(frames) if frames else ": keepalive\n\n")
+        finally:
+            broadcaster.unsubscribe(subscription)
+            disconnected.cancel()
+
+
+def _found(entry: Union[CachedResponse, None]) -> Union[
+        Tuple[int, CachedResponse], None]:
+    return None if entry is None else (200, entry)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def _wait_for_disconnect(receive: Receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_chunk(send: Send, text: str):
+    await send({"type": "http.response.body", "body": text.encode(),
+                "more_body": True})
+
+
+async def _send_status(send: Send, status: int):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-length", b"0")]})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _send_body(send: Send, status: int, body: bytes,
+                     content_type: bytes = b"application/json"):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _route_template(parts: List[str]) -> str:
+    """The Flask rule matching a path, used to label metrics."""
+    path = "/" + "/".join(parts)
+    if path in _static_routes:
+        return path
+    if parts[0] != "devices" or not 2 <= len(parts) <= 3:
+        return "unmatched"
+    if len(parts) == 2:
+        return "/devices/<device_type>"
+    return "/devices/<device_type>/<device_id>"
+
+
+_static_routes = {"/", "/locations", "/devices", "/metrics",
+                  "/devices/bulk", "/devices/stream"}
+
+
+def _etag_matches(etag: str, if_none_match: Union[bytes, None]) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.decode().split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag.strip('"') == etag:
+            return True
+    return False
+
+
+async def _send_entry(send: Send, entry: CachedResponse,
+                      if_none_match: Union[bytes, None]) -> int:
+    etag = f'"{entry.etag}"'.encode()
+    if _etag_matches(entry.etag, if_none_match):
+        await send({"type": "http.response.start", "status": 304,
+                    "headers": [(b"etag", etag)]})
+        await send({"type": "http.response.body", "body": b""})
+        return 304
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length",
+                             str(len(entry.body)).encode()),
+                            (b"etag", etag)]})
+    await send({"type": "http.response.body", "body": entry.body})
+    return 200
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("Serving the ASGI app requires uvicorn: "
+                 "pip install uvicorn")
+    if len(sys.argv) > 1:
+        config = sys.argv[1]
+    else:
+        config = "configs/default-home.json"
+    # Force file to be relative to project root.
+    app = AsyncHoneywellHome(config_filename=path_relative_to_root(config))
+    uvicorn.run(app)
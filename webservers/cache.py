@@ -0,0 +1,86 @@
+import hashlib
+import time
+
+from typing import Any, Dict, Hashable, NamedTuple, Union
+
+
+class CachedResponse(NamedTuple):
+    """A pre-encoded response body and the state it was rendered from.
+
+    Attributes:
+        version (Hashable): The version key the body was rendered at.
+        etag (str): The entity tag for the body.
+        body (bytes): The encoded JSON body.
+        expires (Union[float, None]): The monotonic time after which the
+        body must be rendered again, or None if it only changes with
+        the version key.
+    """
+    version: Hashable
+    etag: str
+    body: bytes
+    expires: Union[float, None]
+
+
+class ResponseCache():
+    """Stores encoded response bodies per route. An entry is reused
+    while the version key supplied on lookup matches the one it was
+    stored with and, for entries with a time to live, until it expires.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, CachedResponse] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, route: Hashable,
+               version: Hashable) -> Union[CachedResponse, None]:
+        """Looks up a still valid entry for a route.
+
+        Args:
+            route (Hashable): The key identifying the route.
+            version (Hashable): The current version key of the data the
+            route serves.
+
+        Returns:
+            Union[CachedResponse, None]: The entry, or None if there is
+            no entry or it is stale.
+        """
+        entry = self._entries.get(route)
+        if entry is None or entry.version != version:
+            return None
+        if entry.expires is not None and entry.expires <= time.monotonic():
+            return None
+        return entry
+
+    def store(self, route: Hashable, version: Hashable, body: bytes,
+              ttl: Union[float, None] = None) -> CachedResponse:
+        """Stores an encoded body for a route.
+
+        Args:
+            route (Hashable): The key identifying the route.
+            version (Hashable): The version key the body was rendered at.
+            body (bytes): The encoded body.
+            ttl (Union[float, None], optional): Seconds the body stays
+            valid for regardless of version. Defaults to None.
+
+        Returns:
+            CachedResponse: The stored entry.
+        """
+        etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        expires = None if ttl is None else time.monotonic() + ttl
+        entry = CachedResponse(version, etag, body, expires)
+        self._entries[route] = entry
+        return entry
+
+    def invalidate(self, route: Any = None):
+        """Drops the entry for a route, or every entry if no route is
+        given.
+
+        Args:
+            route (Any, optional): The route to drop. Defaults to None.
+        """
+        if route is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(route, None)
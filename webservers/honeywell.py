@@ -1,76 +1,708 @@
+import logging
 import sys
+import threading
+import time
 import flask
 
-from flask import jsonify, abort, request
+from flask import abort, request
 
-from typing import List
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple, \
+    Union
 
 from smarthome import Location
-from helpers.misc import json_from_file, path_relative_to_root
+from smarthome.index import DeviceIndex
+from smarthome.configcache import load_locations
+from helpers.factories import SupportedDevices
+from helpers.locks import RWLock
+from helpers.misc import path_relative_to_root
+from helpers.timers import get_scheduler
+from helpers.versions import current_version, next_version
+from webservers.cache import CachedResponse, ResponseCache
+from webservers.metrics import Metrics, NullMetrics, current_route
+from webservers.stream import Broadcaster
 
 
 class HoneywellHome(flask.Flask):
-    def __init__(self, config_filename=None):
+    """A Flask server emulating the Honeywell Home API.
+
+    GET responses are served from a cache of encoded JSON bodies which
+    is keyed by version counters, so a change only re-renders the
+    routes that include the changed device. Responses carry an ETag
+    and conditional requests are answered with 304 Not Modified.
+
+    Clients can also poll /devices?since=<version> to receive only the
+    devices changed or removed after a version, along with the version
+    to pass on their next poll.
+
+    Scenes are applied with a single POST to /devices/bulk, see
+    apply_bulk.
+
+    Each location has a reader-writer lock. Responses are rendered
+    under read locks, so GETs never block each other, while every POST
+    applies its whole patch to a device under the write lock, so no
+    response or stream event shows a partly applied update. Fan and
+    device timers which expire on the server's devices are applied
+    under the same lock, see helpers.timers, until the server is
+    closed.
+
+    /devices/stream pushes device changes as Server-Sent Events. It
+    accepts repeated device_id and device_type arguments to select
+    devices, and streams periodic samples if stream_sample_interval is
+    set.
+
+    Configuration files are streamed one location at a time, and each
+    location is served as soon as it is loaded. With background_load,
+    loading runs on a thread so the server can start at once. A compiled
+    cache of the loaded devices is kept next to the file, see
+    smarthome.configcache, so later starts skip parsing and setters.
+
+    /metrics reports per-route request counts, latency and response
+    size histograms, and the time spent looking up devices, serializing
+    them and encoding JSON, in the Prometheus text format.
+
+    Parameters:
+        config_filename (str, optional): The configuration to load.
+        logger (logging.Logger, optional): The logger for locations and
+        devices.
+        cache_ttl (Dict[str, Union[float, None]], optional): Cache time
+        to live, in seconds, per device type. Overrides the _cache_ttl
+        of the device classes, which is set for devices that return a
+        new reading on every read.
+        stream_sample_interval (float, optional): Seconds between
+        samples on /devices/stream. Defaults to None, for changes only.
+        stream_keepalive (float, optional): Seconds between keepalive
+        comments on idle streams. Defaults to 15.
+        metrics (bool, optional): Whether to record metrics. Defaults to
+        True.
+        background_load (bool, optional): Whether to load
+        config_filename on a background thread. Defaults to False.
+        config_cache (bool, optional): Whether to load from and keep a
+        compiled cache of config_filename, written next to it. Defaults
+        to False.
+    """
+
+    def __init__(self, config_filename=None, logger: logging.Logger = None,
+                 cache_ttl: Dict[str, Union[float, None]] = None,
+                 stream_sample_interval: Union[float, None] = None,
+                 stream_keepalive: float = 15.0, metrics: bool = True,
+                 background_load: bool = False, config_cache: bool = False):
         super().__init__(__name__)
+        self._logger = logger
         self._locations: List[Location] = []
+        # Server-wide indexes over the devices in every location.
+        self._index = DeviceIndex()
+        self._device_locations: Dict[int, Location] = {}
+        self._type_versions: Dict[str, int] = {}
+        # Devices in the order they last changed, keyed by id(device),
+        # holding (version, device, removed).
+        self._changes: OrderedDict = OrderedDict()
+        self._changes_lock = threading.Lock()
+        # Guards devices which are not in any location.
+        self._unplaced_lock = RWLock()
+        self._patching = threading.local()
+        self._cache = ResponseCache()
+        self._cache_ttl = {} if cache_ttl is None else dict(cache_ttl)
+        self._broadcaster = Broadcaster(
+            self.devices, self._lock_for,
+            sample_interval=stream_sample_interval)
+        self._stream_keepalive = stream_keepalive
+        self._metrics = Metrics() if metrics else NullMetrics()
+        self._loaded = threading.Event()
+        self._loaded.set()
+        self._config_cache = config_cache
+        get_scheduler().add_dispatch(self._run_timer)
+        self.before_request(self._start_request)
+        self.after_request(self._finish_request)
+        self.route("/metrics")(self.metrics)
         self.route("/")(self.by_location)
         self.route("/locations")(self.by_location)
         self.route("/devices")(self.by_device)
+        self.route("/devices/bulk", methods=["POST"])(self.bulk_update)
+        self.route("/devices/stream")(self.stream)
         self.route("/devices/<device_type>")(self.by_device_type)
         self.route("/devices/<device_type>/<device_id>",
                    methods=["GET", "POST"])(self.by_device_id)
 
         if config_filename is not None:
-            self.__from_json__(json_from_file(config_filename))
+            self.load_config(config_filename, background=background_load)
+
+    def load_config(self, filename: str, background: bool = False):
+        """Streams the locations in a configuration file onto the
+        server, see smarthome.configcache.load_locations. Each location
+        is served as soon as it is loaded.
+
+        Args:
+            filename (str): The configuration file.
+            background (bool, optional): Whether to load on a background
+            thread and return at once. Errors are then logged rather
+            than raised. Defaults to False.
+        """
+        self._loaded.clear()
+        if not background:
+            self._load(filename)
+            return
+
+        def load():
+            try:
+                self._load(filename)
+            except Exception:
+                if self._logger is not None:
+                    self._logger.exception(f"abort load -- {filename}.")
+
+        threading.Thread(target=load, name="config-loader",
+                         daemon=True).start()
+
+    def _load(self, filename: str):
+        try:
+            for location in load_locations(filename, self._logger,
+                                           self._config_cache):
+                self.add_location(location)
+        finally:
+            self._loaded.set()
+
+    @property
+    def loaded(self) -> bool:
+        """Getter for whether the configuration has finished loading.
+
+        Returns:
+            bool: False while a configuration is being loaded.
+        """
+        return self._loaded.is_set()
+
+    def wait_loaded(self, timeout: Union[float, None] = None) -> bool:
+        """Blocks until the configuration has finished loading.
+
+        Args:
+            timeout (Union[float, None], optional): The most seconds to
+            wait. Defaults to None, to wait indefinitely.
+
+        Returns:
+            bool: Whether loading finished.
+        """
+        return self._loaded.wait(timeout)
 
     def __from_json__(self, config: dict):
         for location in config:
-            new_location = Location()
+            new_location = Location(logger=self._logger)
             new_location.__from_json__(location)
-            self._locations.append(new_location)
+            self.add_location(new_location)
+
+    def add_location(self, location: Location):
+        """Adds a location to the server and indexes its devices.
+
+        Args:
+            location (Location): The location to add.
+        """
+        self._locations.append(location)
+        for device in location._devices:
+            self._index_device(location, device)
+        location.add_observer(self._location_changed)
+
+    def _index_device(self, location: Location, device: SupportedDevices):
+        self._index.add(device)
+        self._device_locations[id(device)] = location
+        self._type_versions[device.device_type] = \
+            self._record_change(device)
+
+    def _record_change(self, device: SupportedDevices,
+                       removed: bool = False) -> int:
+        """Moves a device to the end of the change log.
+
+        Args:
+            device (SupportedDevices): The device which changed.
+            removed (bool, optional): Whether the device was removed
+            from the server. Defaults to False.
+
+        Returns:
+            int: The version of the change.
+        """
+        key = id(device)
+        with self._changes_lock:
+            # Allocated under the lock so the log stays in version order.
+            version = next_version()
+            self._changes[key] = (version, device, removed)
+            self._changes.move_to_end(key)
+        return version
+
+    def _location_changed(self, location: Location,
+                          device: SupportedDevices, event: str,
+                          property_: str, old: Any, new: Any):
+        """Observer for locations. Keeps the server-wide indexes up to
+        date as devices are added, removed and changed.
+        """
+        if event == "append":
+            self._index.add(device)
+            self._device_locations[id(device)] = location
+        elif event == "remove":
+            self._index.discard(device)
+            self._device_locations.pop(id(device), None)
+        else:
+            self._index.update(device, property_, old, new)
+        version = self._record_change(device, removed=event == "remove")
+        if property_ == "device_type":
+            self._type_versions[old] = version
+        self._type_versions[device.device_type] = version
+        if event == "change" \
+                and getattr(self._patching, "device", None) is device:
+            # Published once the whole patch is applied.
+            self._patching.changed = True
+        else:
+            self._broadcaster.publish(device, "remove" if event == "remove"
+                                      else "change")
+
+    def location_of(self, device: SupportedDevices) -> Location:
+        """Getter for the location holding a device.
+
+        Args:
+            device (SupportedDevices): The device.
+
+        Returns:
+            Location: The location the device belongs to.
+        """
+        return self._device_locations.get(id(device))
+
+    def devices(self) -> List[SupportedDevices]:
+        """Getter for every device on the server.
+
+        Returns:
+            List[SupportedDevices]: The devices, by location.
+        """
+        return [device for location in self._locations
+                for device in location._devices]
+
+    def _lock_for(self, device: SupportedDevices) -> RWLock:
+        """Getter for the lock guarding a device's state.
+
+        Args:
+            device (SupportedDevices): The device.
+
+        Returns:
+            RWLock: The lock of the device's location.
+        """
+        location = self.location_of(device)
+        return self._unplaced_lock if location is None else location._lock
+
+    def close(self):
+        """Stops running device timers under the server's locks, and
+        closes every stream subscription.
+        """
+        get_scheduler().remove_dispatch(self._run_timer)
+        self._broadcaster.close()
+
+    def _run_timer(self, key: Hashable, callback: Callable[[], None]) \
+            -> bool:
+        """Runs an expired device timer under the write lock of the
+        device's location, like a patch, if the device is on this
+        server.
+
+        Args:
+            key (Hashable): The timer key, (id(device), timer name).
+            callback (Callable[[], None]): The expiry callback.
+
+        Returns:
+            bool: Whether the timer was run.
+        """
+        location = self._device_locations.get(key[0])
+        if location is None:
+            return False
+        with location._lock.write():
+            callback()
+        return True
+
+    def _device_json(self, device: SupportedDevices) -> dict:
+        with self._lock_for(device).read():
+            return device.__as_json__(device._api_return_parameters)
+
+    def apply_patch(self, device: SupportedDevices, patch: dict) -> dict:
+        """Applies a patch to a device atomically. Readers see the
+        device either before or after the whole patch, and stream
+        subscribers get a single event once it is applied.
+
+        Args:
+            device (SupportedDevices): The device to update.
+            patch (dict): The properties to set.
+
+        Returns:
+            dict: The device's API response after the patch.
+        """
+        with self._lock_for(device).write():
+            self._patching.device, self._patching.changed = device, False
+            try:
+                # __from_json__ may consume keys, so give it a copy.
+                device.__from_json__(dict(patch))
+            finally:
+                self._patching.device = None
+                # A setter which raises leaves the keys set before it
+                # applied, so subscribers still need to hear of them.
+                if self._patching.changed:
+                    self._broadcaster.publish(device)
+            return device.__as_json__(device._api_return_parameters)
 
     def __to_json__(self):
         result = []
         for location in self._locations:
-            result.append(location.__to_json__())
+            with location._lock.read():
+                result.append(location.__to_json__())
         return result
 
+    def _type_ttl(self, device_type: str) -> Union[float, None]:
+        """The cache time to live for responses containing a device
+        type.
+        """
+        if device_type in self._cache_ttl:
+            return self._cache_ttl[device_type]
+        for device in self._index.find("device_type", device_type):
+            return device._cache_ttl
+        return None
+
+    def _ttl(self, device_types: Iterable[str]) -> Union[float, None]:
+        """The shortest cache time to live of a group of device types.
+        """
+        ttls = [t for t in map(self._type_ttl, device_types)
+                if t is not None]
+        return min(ttls) if ttls else None
+
+    def _locations_version(self) -> tuple:
+        return tuple(location._version for location in self._locations)
+
+    def _cached_entry(self, route: Hashable, version: Hashable,
+                      render: Callable[[], Any],
+                      ttl: Union[float, None] = None,
+                      cached_only: bool = False) -> Union[CachedResponse,
+                                                          None]:
+        """Looks up a route in the response cache, rendering and
+        encoding it only if the cached body is stale. Lookups take no
+        locks; rendering takes the read locks of the devices rendered.
+
+        Args:
+            route (Hashable): The key identifying the route.
+            version (Hashable): The current version key of the data.
+            Must be read before rendering.
+            render (Callable[[], Any]): Builds the JSON-serializable
+            response data.
+            ttl (Union[float, None], optional): Seconds the body stays
+            valid regardless of version. Defaults to None.
+            cached_only (bool, optional): Whether to return None rather
+            than render a stale body. Defaults to False.
+
+        Returns:
+            Union[CachedResponse, None]: The current entry for the
+            route, or None if it is stale and cached_only is set.
+        """
+        entry = self._cache.lookup(route, version)
+        if entry is None and not cached_only:
+            with self._metrics.timed("serialize"):
+                data = render()
+            with self._metrics.timed("encode"):
+                body = flask.json.dumps(data).encode()
+            entry = self._cache.store(route, version, body, ttl)
+        return entry
+
+    # The entries of the cached routes, see _cached_entry.
+
+    def _locations_entry(self, cached_only: bool = False) -> Union[
+            CachedResponse, None]:
+        return self._cached_entry(
+            "locations", self._locations_version(), self.__to_json__,
+            self._ttl(self._index.types()), cached_only)
+
+    def _devices_entry(self, cached_only: bool = False) -> Union[
+            CachedResponse, None]:
+        return self._cached_entry(
+            "devices", self._locations_version(), self._by_device,
+            self._ttl(self._index.types()), cached_only)
+
+    def _device_type_entry(self, device_type: str,
+                           cached_only: bool = False) -> Union[
+                               CachedResponse, None]:
+        return self._cached_entry(
+            ("devices", device_type),
+            self._type_versions.get(device_type, 0),
+            lambda: self._by_device_type(device_type),
+            self._type_ttl(device_type), cached_only)
+
+    def _device_entry(self, device: SupportedDevices,
+                      cached_only: bool = False) -> Union[
+                          CachedResponse, None]:
+        return self._cached_entry(
+            ("devices", device.device_type, device.device_id),
+            device._version,
+            lambda: self._device_json(device),
+            self._type_ttl(device.device_type), cached_only)
+
+    def _respond(self, entry: CachedResponse) -> flask.Response:
+        """Builds the response for a cache entry, answering conditional
+        requests with 304 Not Modified.
+
+        Args:
+            entry (CachedResponse): The cache entry.
+
+        Returns:
+            flask.Response: The response.
+        """
+        if request.if_none_match.contains(entry.etag):
+            response = self.response_class(status=304)
+        else:
+            response = self.response_class(
+                entry.body, mimetype="application/json")
+        response.set_etag(entry.etag)
+        return response
+
+    def _json_response(self, data: Any) -> flask.Response:
+        with self._metrics.timed("encode"):
+            body = flask.json.dumps(data)
+        return self.response_class(body, mimetype="application/json")
+
+    def _start_request(self):
+        request.environ["honeywell.start"] = time.perf_counter()
+        rule = request.url_rule
+        current_route.set("unmatched" if rule is None else rule.rule)
+
+    def _finish_request(self, response: flask.Response) -> flask.Response:
+        start = request.environ.get("honeywell.start")
+        if start is not None:
+            self._metrics.observe_request(
+                current_route.get(), response.status_code,
+                time.perf_counter() - start, response.content_length)
+        return response
+
+    def metrics(self):
+        return self.response_class(self._metrics.render(),
+                                   mimetype="text/plain; version=0.0.4")
+
     def by_location(self):
-        return jsonify(self.__to_json__())
+        return self._respond(self._locations_entry())
 
     def _by_device(self):
         devices = {}
         for location in self._locations:
-            for device in location._devices:
-                devices[device.device_id] = device.__as_json__(
-                    device._api_return_parameters)
+            with location._lock.read():
+                for device in location._devices:
+                    devices[device.device_id] = device.__as_json__(
+                        device._api_return_parameters)
         return devices
 
     def _by_device_type(self, device_type):
-        devices = self._by_device()
-        return {k: v for k, v in devices.items()
-                if v["device_type"] == device_type}
+        return {device.device_id: self._device_json(device)
+                for device in list(self._index.find("device_type",
+                                                    device_type))}
+
+    def changes_since(self, since: int) -> Tuple[
+            int, List[SupportedDevices], List[SupportedDevices]]:
+        """Finds the devices which changed after a version. Only the
+        tail of the change log newer than the version is visited, so
+        the cost depends on the number of changes rather than the
+        number of devices.
+
+        Args:
+            since (int): The version the caller last synchronized at.
+
+        Returns:
+            Tuple[int, List[SupportedDevices], List[SupportedDevices]]:
+            The version to synchronize from next, the changed devices
+            and the removed devices, most recently changed first.
+        """
+        # Read first, so that a change made during the scan is sent
+        # again on the next poll rather than missed.
+        high_water = current_version()
+        changed, removed = [], []
+        with self._metrics.timed("lookup"), self._changes_lock:
+            for version, device, gone in reversed(self._changes.values()):
+                if version <= since:
+                    break
+                (removed if gone else changed).append(device)
+        return high_water, changed, removed
+
+    def _devices_since(self, since: int) -> dict:
+        high_water, changed, removed = self.changes_since(since)
+        with self._metrics.timed("serialize"):
+            return {
+                "version": high_water,
+                "devices": {device.device_id: self._device_json(device)
+                            for device in changed},
+                "removed": [device.device_id for device in removed]
+            }
 
     def by_device(self):
-        return jsonify(self._by_device())
+        since = request.args.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                abort(400)
+            return self._json_response(self._devices_since(since))
+        return self._respond(self._devices_entry())
 
     def by_device_type(self, device_type):
-        return jsonify(self._by_device_type(device_type))
+        return self._respond(self._device_type_entry(device_type))
 
-    def by_device_id(self, device_type, device_id):
+    def find_device(self, device_type: str,
+                    device_id: str) -> Union[SupportedDevices, None]:
+        """Looks up a device by type and id.
 
+        Args:
+            device_type (str): The device type.
+            device_id (str): The device id.
+
+        Returns:
+            Union[SupportedDevices, None]: The device, or None if there
+            is no device with that id and type.
+        """
+        with self._metrics.timed("lookup"):
+            device = self._index.by_id(device_id)
+        if device is None or device.device_type != device_type:
+            return None
+        return device
+
+    def update_device(self, device_type: str, device_id: str,
+                      patch: dict) -> Union[dict, None]:
+        """Applies a patch to a device, see apply_patch.
+
+        Args:
+            device_type (str): The device type.
+            device_id (str): The device id.
+            patch (dict): The properties to set.
+
+        Returns:
+            Union[dict, None]: The device's API response, or None if the
+            device was not found or the patch changed its type or id.
+        """
+        device = self.find_device(device_type, device_id)
+        if device is None:
+            return None
+        result = self.apply_patch(device, patch)
+        if result["device_type"] != device_type \
+                or result["device_id"] != device_id:
+            return None
+        return result
+
+    def by_device_id(self, device_type, device_id):
         if request.method == "POST":
-            for location in self._locations:
-                for device in location._devices:
-                    if device["device_id"] == device_id:
-                        device.__from_json__(request.json)
+            result = self.update_device(device_type, device_id, request.json)
+            if result is None:
+                abort(404)
+            return self._json_response(result)
+
+        device = self.find_device(device_type, device_id)
+        if device is None:
+            abort(404)
+        return self._respond(self._device_entry(device))
+
+    # Device properties a bulk selector may filter on, each indexed
+    # by DeviceIndex to narrow down the candidates.
+    _selector_properties = ("device_type", "location")
+
+    def select(self, selector: dict) -> List[SupportedDevices]:
+        """Finds the devices matching every property in a selector,
+        e.g. {"device_type": "Light", "location": "Kitchen"}. Only the
+        smallest matching index bucket is scanned.
+
+        Args:
+            selector (dict): Device properties mapped to the values to
+            match. Keys must be in _selector_properties.
+
+        Raises:
+            ValueError: If the selector is empty or has unsupported
+            keys.
+
+        Returns:
+            List[SupportedDevices]: The matching devices.
+        """
+        unsupported = [k for k in selector
+                       if k not in self._selector_properties]
+        if not selector or unsupported:
+            raise ValueError(
+                f"selector keys must be in {list(self._selector_properties)}")
+        with self._metrics.timed("lookup"):
+            # Selectors come from requests, so look up without creating
+            # index buckets.
+            candidates = min((self._index.find(k, v)
+                              for k, v in selector.items()), key=len)
+            return [device for device in candidates
+                    if all(device._getters[k](device) == v
+                           for k, v in selector.items())]
+
+    def _apply_operation(self, operation: dict) -> dict:
+        if not isinstance(operation, dict) \
+                or not isinstance(operation.get("patch"), dict):
+            return {"status": 400, "error": "operation requires a patch"}
+
+        if "device_id" in operation:
+            device = self._index.by_id(operation["device_id"])
+            if device is None or operation.get(
+                    "device_type", device.device_type) != device.device_type:
+                return {"status": 404, "error": "device not found"}
+            devices = [device]
+        elif isinstance(operation.get("selector"), dict):
+            try:
+                devices = self.select(operation["selector"])
+            except ValueError as e:
+                return {"status": 400, "error": str(e)}
+        else:
+            return {"status": 400,
+                    "error": "operation requires a device_id or selector"}
+
+        # devices is a copy, so patches which move devices between
+        # index buckets do not disturb the iteration.
+        results, errors = {}, []
+        for device in devices:
+            try:
+                result = self.apply_patch(device, operation["patch"])
+            except Exception as e:
+                errors.append(f"{device.device_id}: {e!r}")
+            else:
+                results[result["device_id"]] = result
+        if errors:
+            return {"status": 400, "error": "; ".join(errors),
+                    "devices": results}
+        return {"status": 200, "devices": results}
+
+    def apply_bulk(self, operations: List[dict]) -> List[dict]:
+        """Applies a batch of device updates. Each operation is either
+        {"device_id": ..., "patch": {...}}, optionally with a
+        "device_type" which must match, or {"selector": {...},
+        "patch": {...}} to update every device matched by select.
+        Operations are applied in order and a failing operation does
+        not stop the rest. Nor does a device whose setter raises stop
+        the rest of its operation's devices, although the keys of its
+        patch set before the failure stay applied.
+
+        Args:
+            operations (List[dict]): The operations to apply.
+
+        Returns:
+            List[dict]: One result per operation, holding an HTTP-style
+            "status" and either the updated "devices" or an "error",
+            or both if only some of an operation's devices failed.
+        """
+        return [self._apply_operation(operation) for operation in operations]
+
+    def bulk_update(self):
+        operations = request.json
+        if isinstance(operations, dict):
+            operations = operations.get("operations")
+        if not isinstance(operations, list):
+            abort(400)
+        return self._json_response(self.apply_bulk(operations))
+
+    def stream(self):
+        subscription = self._broadcaster.subscribe(
+            device_ids=request.args.getlist("device_id"),
+            device_types=request.args.getlist("device_type"))
 
-        devices = self._by_device_type(device_type)
-        for k, v in devices.items():
-            if v["device_id"] == device_id:
-                return v
+        def events():
+            try:
+                yield ": connected\n\n"
+                while not subscription.closed:
+                    frames = subscription.get(self._stream_keepalive)
+                    yield "".join(frames) if frames else ": keepalive\n\n"
+            finally:
+                self._broadcaster.unsubscribe(subscription)
 
-        abort(404)
+        return self.response_class(
+            events(), mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+import contextlib
+import threading
+import time
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Sequence, Tuple
+
+# The route template of the request being served, used to label stage
+# timings recorded deep inside the handlers.
+current_route: ContextVar = ContextVar("current_route", default="unmatched")
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576,
+                4194304)
+STAGES = ("lookup", "serialize", "encode")
+
+
+class Histogram():
+    """A fixed-bucket histogram. The bucket array is allocated once and
+    observations only increment a slot, so recording costs a binary
+    search and two additions. Observations are not locked: under the
+    GIL a concurrent increment can very rarely be lost, which is
+    acceptable for monitoring.
+
+    Parameters:
+        bounds (Sequence[float]): The upper bounds of the buckets, in
+        increasing order. A final +Inf bucket is added.
+    """
+    __slots__ = ("_bounds", "_counts", "_sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = tuple(bounds)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        """Records an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._sum += value
+
+    @property
+    def count(self) -> int:
+        """Getter for the number of observations.
+
+        Returns:
+            int: The number of observations.
+        """
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        """Getter for the sum of the observations.
+
+        Returns:
+            float: The sum of every observed value.
+        """
+        return self._sum
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """The cumulative bucket counts, as Prometheus reports them.
+
+        Returns:
+            List[Tuple[str, int]]: Each bucket's "le" label and the
+            number of observations less than or equal to its bound.
+        """
+        result, total = [], 0
+        for bound, count in zip(self._bounds + (float("inf"),),
+                                self._counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf")
+                           else f"{bound:g}", total))
+        return result
+
+
+class RouteMetrics():
+    """The metrics recorded for a single route."""
+    __slots__ = ("statuses", "latency", "size", "stages")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.stages = {stage: Histogram(LATENCY_BUCKETS)
+                       for stage in STAGES}
+
+
+class Metrics():
+    """Per-route request counts, latency and response size histograms,
+    and the time spent in each stage of building a response. Stages are
+    "lookup" (finding devices), "serialize" (__as_json__) and "encode"
+    (JSON encoding).
+
+    Parameters:
+        prefix (str, optional): The prefix for metric names. Defaults
+        to "honeywell".
+    """
+
+    def __init__(self, prefix: str = "honeywell"):
+        self._prefix = prefix
+        self._routes: Dict[str, RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def route(self, route: str) -> RouteMetrics:
+        """Getter for the metrics of a route, created on first use.
+
+        Args:
+            route (str): The route template, e.g. "/devices/<device_type>".
+
+        Returns:
+            RouteMetrics: The route's metrics.
+        """
+        metrics = self._routes.get(route)
+        if metrics is None:
+            with self._lock:
+                metrics = self._routes.setdefault(route, RouteMetrics())
+        return metrics
+
+    def observe_request(self, route: str, status: int, seconds: float,
+                        size: int = None):
+        """Records a served request.
+
+        Args:
+            route (str): The route template.
+            status (int): The response status code.
+            seconds (float): The time taken to build the response.
+            size (int, optional): The body size in bytes, if known.
+        """
+        metrics = self.route(route)
+        statuses = metrics.statuses
+        statuses[status] = statuses.get(status, 0) + 1
+        metrics.latency.observe(seconds)
+        if size is not None:
+            metrics.size.observe(size)
+
+    def observe_stage(self, stage: str, seconds: float):
+        """Records time spent in a stage of the current request.
+
+        Args:
+            stage (str): One of STAGES.
+            seconds (float): The time spent.
+        """
+        self.route(current_route.get()).stages[stage].observe(seconds)
+
+    def timed(self, stage: str) -> "StageTimer":
+        """Times a block of code as a stage of the current request.
+
+        Args:
+            stage (str): One of STAGES.
+
+        Returns:
+            StageTimer: A context manager recording the stage on exit.
+        """
+        return StageTimer(self, stage)
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition
+        format.
+
+        Returns:
+            str: The metrics page.
+        """
+        name = self._prefix
+        routes = sorted(self._routes.items())
+        lines = [
+            f"# HELP {name}_requests_total Requests served.",
+            f"# TYPE {name}_requests_total counter"
+        ]
+        for route, metrics in routes:
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'{name}_requests_total{{route="{route}",'
+                             f'status="{status}"}} {count}')
+
+        def histogram(metric, help_, labelled):
+            lines.append(f"# HELP {metric} {help_}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, hist in labelled:
+                if not hist.count:
+                    continue
+                for le, count in hist.cumulative():
+                    lines.append(
+                        f'{metric}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {hist.sum:.9g}")
+                lines.append(f"{metric}_count{{{labels}}} {hist.count}")
+
+        histogram(f"{name}_request_duration_seconds",
+                  "Time to build responses.",
+                  [(f'route="{r}"', m.latency) for r, m in routes])
+        histogram(f"{name}_response_size_bytes", "Response body sizes.",
+                  [(f'route="{r}"', m.size) for r, m in routes])
+        histogram(f"{name}_stage_duration_seconds",
+                  "Time spent in each stage of building responses.",
+                  [(f'route="{r}",stage="{s}"', m.stages[s])
+                   for r, m in routes for s in STAGES])
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer():
+    """Context manager recording the time spent in a block as a stage.
+    """
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics: Metrics, stage: str):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.observe_stage(
+            self._stage, time.perf_counter() - self._start)
+
+
+class NullMetrics(Metrics):
+    """Metrics which record nothing, for servers with instrumentation
+    turned off.
+    """
+    _timer = contextlib.nullcontext()
+
+    def observe_request(self, route: str, status: int, seconds: float,
+                        size: int = None):
+        pass
+
+    def observe_stage(self, stage: str, seconds: float):
+        pass
+
+    def timed(self, stage: str) -> contextlib.nullcontext:
+        return self._timer
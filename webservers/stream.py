@@ -0,0 +1,231 @@
+import threading
+
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Union
+
+import flask
+
+from helpers.factories import SupportedDevices
+from helpers.locks import RWLock
+
+
+class Subscription():
+    """A single stream client. Pending events are held per device, so a
+    device which changes again before the client reads only sends its
+    latest state. When more than max_pending devices are waiting, the
+    oldest is dropped and counted in dropped.
+
+    Parameters:
+        device_ids (Iterable[str], optional): Only receive events for
+        these devices. Defaults to every device.
+        device_types (Iterable[str], optional): Only receive events for
+        these device types. Defaults to every type.
+        max_pending (int, optional): The most devices with unread
+        events. Defaults to 256.
+        waker (Callable[[], None], optional): Called from the publishing
+        thread whenever an event is queued or the subscription closes,
+        for readers which wait on an event loop instead of blocking in
+        get. Defaults to None.
+    """
+
+    def __init__(self, device_ids: Iterable[str] = None,
+                 device_types: Iterable[str] = None, max_pending: int = 256,
+                 waker: Callable[[], None] = None):
+        self._device_ids = frozenset(device_ids) if device_ids else None
+        self._device_types = frozenset(device_types) if device_types else None
+        self._max_pending = max_pending
+        self._pending: OrderedDict = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._waker = waker
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        """Getter for whether the subscription was closed.
+
+        Returns:
+            bool: True once close has been called.
+        """
+        return self._closed
+
+    def wants(self, device: SupportedDevices) -> bool:
+        """Whether the subscription selects a device.
+
+        Args:
+            device (SupportedDevices): The device.
+
+        Returns:
+            bool: True if events for the device should be sent.
+        """
+        return (self._device_ids is None
+                or device._device_id in self._device_ids) \
+            and (self._device_types is None
+                 or device._type in self._device_types)
+
+    def offer(self, key: int, frame: str):
+        """Queues an event, replacing any unread event for the same
+        device.
+
+        Args:
+            key (int): The key of the device the event is for.
+            frame (str): The encoded event.
+        """
+        with self._condition:
+            if key not in self._pending \
+                    and len(self._pending) >= self._max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[key] = frame
+            self._condition.notify()
+        if self._waker is not None:
+            self._waker()
+
+    def get(self, timeout: Union[float, None] = None) -> List[str]:
+        """Waits for and takes every pending event.
+
+        Args:
+            timeout (Union[float, None], optional): The most seconds to
+            wait. Defaults to waiting until an event arrives.
+
+        Returns:
+            List[str]: The encoded events, oldest first. Empty if the
+            wait timed out or the subscription was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._pending or self._closed, timeout)
+            frames = list(self._pending.values())
+            self._pending.clear()
+        return frames
+
+    def close(self):
+        """Closes the subscription and wakes any waiting reader."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._waker is not None:
+            self._waker()
+
+
+class Broadcaster():
+    """Fans device events out to stream subscribers. Each event is
+    encoded once, as a Server-Sent Events frame, however many
+    subscribers receive it.
+
+    With a sample interval, a single background thread also publishes a
+    "sample" event for every subscribed device at that interval, for
+    devices whose readings change without a setter being called.
+
+    Parameters:
+        devices (Callable[[], Iterable[SupportedDevices]]): Returns the
+        devices to sample.
+        lock_for (Callable[[SupportedDevices], RWLock], optional):
+        Returns the lock guarding a device's state, whose read lock is
+        held while a sample is taken, so that samples never catch a
+        device part way through an update. Defaults to sampling without
+        a lock.
+        sample_interval (Union[float, None], optional): Seconds between
+        samples, or None to only publish changes. Defaults to None.
+        max_pending (int, optional): The queue bound for new
+        subscriptions. Defaults to 256.
+    """
+
+    def __init__(self, devices: Callable[[], Iterable[SupportedDevices]],
+                 lock_for: Callable[[SupportedDevices], RWLock] = None,
+                 sample_interval: Union[float, None] = None,
+                 max_pending: int = 256):
+        self._devices = devices
+        self._lock_for = lock_for
+        self._sample_interval = sample_interval
+        self._max_pending = max_pending
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._sampler: Union[threading.Thread, None] = None
+        self._stopped = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, device_ids: Iterable[str] = None,
+                  device_types: Iterable[str] = None,
+                  waker: Callable[[], None] = None) -> Subscription:
+        """Adds a subscriber.
+
+        Args:
+            device_ids (Iterable[str], optional): Only receive events for
+            these devices. Defaults to every device.
+            device_types (Iterable[str], optional): Only receive events
+            for these device types. Defaults to every type.
+            waker (Callable[[], None], optional): See Subscription.
+            Defaults to None.
+
+        Returns:
+            Subscription: The new subscription.
+        """
+        subscription = Subscription(device_ids, device_types,
+                                    self._max_pending, waker)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+            if self._sample_interval is not None and self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample_loop, name="stream-sampler",
+                    daemon=True)
+                self._sampler.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Removes and closes a subscriber.
+
+        Args:
+            subscription (Subscription): The subscription to remove.
+        """
+        with self._lock:
+            self._subscribers = tuple(
+                s for s in self._subscribers if s is not subscription)
+        subscription.close()
+
+    def publish(self, device: SupportedDevices, event: str = "change"):
+        """Sends a device's current state to the subscribers selecting
+        it. Nothing is encoded if no subscriber selects the device.
+
+        Args:
+            device (SupportedDevices): The device.
+            event (str, optional): The event name. "remove" events only
+            carry the device id and type. Defaults to "change".
+        """
+        subscribers = [s for s in self._subscribers if s.wants(device)]
+        if not subscribers:
+            return
+        if event == "remove":
+            data = {"device_id": device.device_id,
+                    "device_type": device.device_type}
+        else:
+            data = device.__as_json__(device._api_return_parameters)
+        frame = f"event: {event}\ndata: {flask.json.dumps(data)}\n\n"
+        key = id(device)
+        for subscriber in subscribers:
+            subscriber.offer(key, frame)
+
+    def sample(self):
+        """Publishes a sample event for every subscribed device."""
+        if not self._subscribers:
+            return
+        for device in list(self._devices()):
+            if self._lock_for is None:
+                self.publish(device, "sample")
+                continue
+            with self._lock_for(device).read():
+                self.publish(device, "sample")
+
+    def _sample_loop(self):
+        while not self._stopped.wait(self._sample_interval):
+            self.sample()
+
+    def close(self):
+        """Stops the sampler and closes every subscription."""
+        self._stopped.set()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, ()
+        for subscriber in subscribers:
+            subscriber.close()